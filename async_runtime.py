@@ -0,0 +1,102 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class AsyncRunner:
+    """Event loop hosted on a background thread
+
+    The GUI and batch jobs submit coroutines from any thread and get back a
+    concurrent.futures.Future, so many requests can be in flight while only
+    this one thread does the network I/O.
+    """
+
+    def __init__(self):
+        self._loop = None
+        self._thread = None
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self):
+        """The running event loop, started on first use"""
+        with self._lock:
+            if self._loop is None:
+                ready = threading.Event()
+                self._thread = threading.Thread(target=self._run_loop, args=(ready,),
+                                                name="async-runner", daemon=True)
+                self._thread.start()
+                ready.wait()
+            return self._loop
+
+    def _run_loop(self, ready):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        ready.set()
+        self._loop.run_forever()
+
+    def submit(self, coro):
+        """Schedule a coroutine on the loop; cancelling the future cancels the task"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout=None):
+        """Run a coroutine on the loop and wait for its result"""
+        return self.submit(coro).result(timeout)
+
+    def set_thread_pool_size(self, size):
+        """Give asyncio.to_thread() work a pool of size threads, or of
+        Python's default size when size is None
+
+        The swap happens on the loop, so no call lands on a pool that is
+        shutting down; work already running on the old pool finishes there.
+        """
+        loop = self.loop
+        executor = ThreadPoolExecutor(size, thread_name_prefix="async-runner-worker")
+
+        def swap():
+            previous, self._executor = self._executor, executor
+            loop.set_default_executor(executor)
+            if previous is not None:
+                previous.shutdown(wait=False)
+        loop.call_soon_threadsafe(swap)
+
+    def stop(self):
+        """Stop the loop and wait for its thread to exit"""
+        with self._lock:
+            if self._loop is None:
+                return
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+            self._loop = None
+            self._thread = None
+
+
+_runner = None
+_runner_lock = threading.Lock()
+
+def get_runner():
+    """Return the runner shared by the whole process"""
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = AsyncRunner()
+        return _runner
+
+
+async def _run_all(model, inputs, concurrency, kwargs):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_one(input_data):
+        async with semaphore:
+            return await model.arun_model(input_data, **kwargs)
+
+    return await asyncio.gather(*(run_one(item) for item in inputs), return_exceptions=True)
+
+def run_batch(model, inputs, concurrency=16, **kwargs):
+    """Run model.arun_model over inputs with at most concurrency requests in flight
+
+    Returns a future resolving to one result per input, in order; failed
+    inputs hold their exception instead of a result.
+    """
+    return get_runner().submit(_run_all(model, list(inputs), concurrency, kwargs))
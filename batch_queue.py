@@ -0,0 +1,216 @@
+import itertools
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+
+from async_runtime import get_runner
+from cancellation import CancelledError, CancelToken, DeadlineExceededError
+from event_log import sample_rate
+
+# Item states
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+# Files processed at once unless the caller asks otherwise
+BATCH_CONCURRENCY = 4
+# Share of ordinary batch items recorded in the event log; failures and
+# slow items are always recorded
+BATCH_SAMPLE_RATE = 0.1
+
+
+class QueueItem:
+    """One file in a BatchQueue and what became of it"""
+
+    def __init__(self, item_id, path):
+        self.id = item_id
+        self.path = path
+        self.status = QUEUED
+        # The model that ran the item
+        self.model = None
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.error = None
+
+    @property
+    def latency(self):
+        """Seconds the item has been (or was) running, or None if it has not started"""
+        if self.started is None:
+            return None
+        return (self.finished or time.monotonic()) - self.started
+
+
+class BatchQueue:
+    """Runs many files through one model on the shared event loop
+
+    At most concurrency files are in flight; files added while the queue
+    runs are picked up by the running workers, and start() tops the
+    workers up again. Every change to an item records its id, so a GUI can
+    fetch just the changed items with drain_changes() on its own schedule.
+    """
+
+    def __init__(self, runner=None):
+        self.runner = runner or get_runner()
+        self.items = OrderedDict()
+        self._ids = itertools.count(1)
+        self._pending = deque()
+        self._changed = set()
+        self._lock = threading.Lock()
+        self._workers = 0
+        self._concurrency = BATCH_CONCURRENCY
+        self._timeout = None
+        self._model = None
+        self._token = None
+        # Tokens of workers retired by start(), and how many of each are
+        # still finishing an item, so cancel() reaches them too
+        self._retired = {}
+
+    @property
+    def model(self):
+        """The model the queue last ran with"""
+        return self._model
+
+    @property
+    def running(self):
+        with self._lock:
+            return self._workers > 0
+
+    def add(self, paths):
+        """Queue files; returns the new items"""
+        with self._lock:
+            added = []
+            for path in paths:
+                item = QueueItem(next(self._ids), path)
+                self.items[item.id] = item
+                self._pending.append(item)
+                self._changed.add(item.id)
+                added.append(item)
+        return added
+
+    @property
+    def concurrency(self):
+        return self._concurrency
+
+    def start(self, model, concurrency=None, timeout=None):
+        """Process queued items with model, adding workers up to concurrency
+
+        Workers still running for another model finish their current item
+        with it and take no more.
+        """
+        with self._lock:
+            if self._workers == 0 or self._model is not model or self._token.cancelled:
+                # Workers holding the old token retire uncounted
+                if self._workers and not self._token.cancelled:
+                    self._retired[self._token] = self._workers
+                self._token = CancelToken()
+                self._workers = 0
+            self._model = model
+            self._concurrency = concurrency or BATCH_CONCURRENCY
+            self._timeout = timeout
+            token = self._token
+            count = max(0, min(self._concurrency, len(self._pending)) - self._workers)
+            self._workers += count
+        for _ in range(count):
+            self.runner.submit(self._worker(model, token, timeout))
+
+    def resize(self, concurrency):
+        """Change how many items run at once, even while the queue runs
+
+        Extra workers start at once; surplus ones retire as their current
+        item finishes.
+        """
+        with self._lock:
+            self._concurrency = concurrency
+            running = self._workers > 0 and not self._token.cancelled
+            model, timeout = self._model, self._timeout
+        if running:
+            self.start(model, concurrency, timeout)
+
+    def cancel(self):
+        """Stop running items and mark the queued ones cancelled"""
+        with self._lock:
+            tokens = [self._token, *self._retired]
+            self._retired = {}
+            while self._pending:
+                item = self._pending.popleft()
+                item.status = CANCELLED
+                self._changed.add(item.id)
+        for token in tokens:
+            if token is not None:
+                token.cancel()
+
+    def retry(self):
+        """Queue failed and cancelled items again"""
+        with self._lock:
+            for item in self.items.values():
+                if item.status in (FAILED, CANCELLED):
+                    item.status = QUEUED
+                    item.started = item.finished = item.error = None
+                    self._pending.append(item)
+                    self._changed.add(item.id)
+
+    def clear_finished(self):
+        """Forget items that are done; returns their ids"""
+        with self._lock:
+            finished = [item_id for item_id, item in self.items.items() if item.status == DONE]
+            for item_id in finished:
+                del self.items[item_id]
+                self._changed.discard(item_id)
+        return finished
+
+    def drain_changes(self):
+        """Items changed since the last call"""
+        with self._lock:
+            changed = [self.items[item_id] for item_id in self._changed if item_id in self.items]
+            self._changed = set()
+        return changed
+
+    def counts(self):
+        with self._lock:
+            return Counter(item.status for item in self.items.values())
+
+    def _next_item(self, token):
+        # Retire the worker under the lock so start() always sees how many
+        # are left to pick up newly queued files
+        with self._lock:
+            if token is not self._token:
+                # Started for an earlier model or run, and no longer counted
+                if token in self._retired:
+                    self._retired[token] -= 1
+                    if not self._retired[token]:
+                        del self._retired[token]
+                return None
+            if self._pending and not token.cancelled and self._workers <= self._concurrency:
+                item = self._pending.popleft()
+                item.status = RUNNING
+                item.model = self._model
+                item.started = time.monotonic()
+                self._changed.add(item.id)
+                return item
+            self._workers -= 1
+            return None
+
+    async def _worker(self, model, token, timeout):
+        # Big batches would otherwise flood the event log with routine calls
+        sample_rate.set(BATCH_SAMPLE_RATE)
+        while True:
+            item = self._next_item(token)
+            if item is None:
+                return
+            try:
+                result = await model.arun_model(item.path, cancel_token=token, timeout=timeout)
+            except DeadlineExceededError:
+                status, result, error = FAILED, None, "Timed out"
+            except CancelledError:
+                status, result, error = CANCELLED, None, None
+            except Exception as e:
+                status, result, error = FAILED, None, f"{type(e).__name__}: {e}"
+            else:
+                status, error = DONE, None
+            with self._lock:
+                item.status, item.result, item.error = status, result, error
+                item.finished = time.monotonic()
+                self._changed.add(item.id)
@@ -0,0 +1,112 @@
+import threading
+import time
+
+
+class CancelledError(Exception):
+    """Raised when a model call is cancelled before it finishes"""
+
+
+class DeadlineExceededError(CancelledError, TimeoutError):
+    """Raised when a model call runs past its deadline"""
+
+
+class CancelToken:
+    """Cancellation flag with an optional deadline, shared by every step of a request
+
+    Callbacks registered with add_callback() run once when the token is
+    cancelled or its deadline passes; models use them to close the HTTP
+    connection of a request that is still in flight.
+    """
+
+    def __init__(self, timeout=None, parent=None):
+        self.deadline = None if timeout is None else time.monotonic() + timeout
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+        self._expired = False
+        self._timer = None
+        self._parent = parent
+        self._detach = None
+
+        if parent is not None:
+            # A child token also stops when its parent does
+            if parent.deadline is not None:
+                self.deadline = parent.deadline if self.deadline is None else min(self.deadline, parent.deadline)
+            self._detach = parent.add_callback(self._cancel_from_parent)
+
+        if self.deadline is not None and not self._event.is_set():
+            self._timer = threading.Timer(max(self.remaining(), 0), self._expire)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self):
+        """Cancel the token and run its callbacks"""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"[LOG] Cancel callback failed: {e}")
+
+    def _expire(self):
+        self._expired = True
+        self.cancel()
+
+    def _cancel_from_parent(self):
+        self._expired = self._parent._expired
+        self.cancel()
+
+    def remaining(self):
+        """Seconds left before the deadline, or None without a deadline"""
+        if self.deadline is None:
+            return None
+        return max(self.deadline - time.monotonic(), 0.0)
+
+    def check(self):
+        """Raise if the token was cancelled or its deadline has passed"""
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self._expire()
+        if self._event.is_set():
+            if self._expired:
+                raise DeadlineExceededError("The request ran past its deadline.")
+            raise CancelledError("The request was cancelled.")
+
+    def wait(self, timeout=None):
+        """Block until the token is cancelled or timeout passes; True if cancelled"""
+        return self._event.wait(timeout)
+
+    def add_callback(self, callback):
+        """Run callback on cancellation; returns a function that unregisters it"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return lambda: self._remove_callback(callback)
+        callback()
+        return lambda: None
+
+    def _remove_callback(self, callback):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def release(self):
+        """Stop the deadline timer and detach from the parent token"""
+        if self._timer is not None:
+            self._timer.cancel()
+        if self._detach is not None:
+            self._detach()
+            self._detach = None
@@ -0,0 +1,306 @@
+import configparser
+import importlib.util
+import os
+import threading
+
+# Settings file read at startup and watched for changes while the GUI runs
+CONFIG_FILE = "ai_studio.ini"
+# KEY=value lines, such as HF_TOKEN, copied into the environment at startup
+ENV_FILE = "tokencode.env"
+# Environment variables named AI_STUDIO_<SECTION>_<NAME> override the file
+ENV_PREFIX = "AI_STUDIO_"
+
+
+class ConfigError(ValueError):
+    """Raised when a configuration file or variable has invalid values"""
+
+
+class Setting:
+    """One typed setting: its section.name key, type, default and lower bound"""
+
+    def __init__(self, key, kind, default, minimum=None, live=True, help=""):
+        self.key = key
+        self.kind = kind
+        self.default = default
+        self.minimum = minimum
+        # Whether a change applies while the program runs, or on restart
+        self.live = live
+        self.help = help
+
+    @property
+    def env_name(self):
+        return ENV_PREFIX + self.key.replace(".", "_").upper()
+
+    def parse(self, text):
+        """The value text stands for; raises ConfigError if it is invalid"""
+        text = text.strip()
+        try:
+            if self.kind is bool:
+                if text.lower() not in configparser.ConfigParser.BOOLEAN_STATES:
+                    raise ValueError
+                value = configparser.ConfigParser.BOOLEAN_STATES[text.lower()]
+            else:
+                value = self.kind(text)
+        except ValueError:
+            raise ConfigError(f"{self.key}: expected {self.kind.__name__}, got '{text}'")
+        if self.minimum is not None and value < self.minimum:
+            raise ConfigError(f"{self.key}: must be at least {self.minimum}, got {value}")
+        return value
+
+
+SETTINGS = [
+    Setting("timeouts.request", float, 120.0, minimum=1,
+            help="seconds before a model request from the GUI is abandoned"),
+    Setting("timeouts.probe", float, 60.0, minimum=1,
+            help="seconds a warm-up probe may take"),
+    Setting("concurrency.batch", int, 4, minimum=1,
+            help="files the batch queue processes at once"),
+    Setting("concurrency.thread_pool", int, 0, minimum=0,
+            help="threads for blocking work such as encoding images; 0 for Python's default"),
+    Setting("concurrency.server", int, 8, minimum=1, live=False,
+            help="jobs --serve runs at once"),
+    Setting("concurrency.server_max_pending", int, 64, minimum=1, live=False,
+            help="jobs queued or running before --serve answers 503"),
+    Setting("cache.enabled", bool, True,
+            help="reuse results of identical requests"),
+    Setting("cache.results", int, 32, minimum=0,
+            help="model results kept in memory"),
+    Setting("cache.file_hashes", int, 1024, minimum=0,
+            help="file content hashes remembered"),
+    Setting("cache.image_memory_mb", int, 256, minimum=1,
+            help="megabytes of generated images kept in memory before spilling to disk"),
+    Setting("cache.store_mb", int, 1024, minimum=1,
+            help="megabytes of results kept on disk; the oldest are dropped past it"),
+    Setting("requests.hedge", bool, False,
+            help="also send slow requests to a fallback provider"),
+    Setting("whisper.local", bool, False,
+            help="transcribe on this machine with int8 Whisper (needs faster-whisper) instead of the API"),
+    Setting("whisper.workers", int, 0, minimum=0,
+            help="processes decoding audio chunks at once; 0 for half the CPU cores"),
+    Setting("whisper.compute_type", str, "int8",
+            help="weight type of the local model, such as int8 or float32"),
+    Setting("speculation.enabled", bool, False,
+            help="request a draft image of the prompt while it is being typed"),
+    Setting("speculation.delay", float, 0.8, minimum=0.1,
+            help="seconds typing must pause before a draft is requested"),
+    Setting("speculation.min_interval", float, 5.0, minimum=0,
+            help="fewest seconds between two drafts requested while typing"),
+    Setting("output.image_path", str, "output_image.png",
+            help="where the GUI saves a generated image"),
+    Setting("events.enabled", bool, True,
+            help="record model calls in the JSONL event log"),
+    Setting("events.path", str, os.path.join("logs", "events.jsonl"),
+            help="event log file"),
+    Setting("events.max_mb", float, 10.0, minimum=0.1,
+            help="megabytes the event log reaches before it is rotated"),
+    Setting("events.backups", int, 5, minimum=0,
+            help="rotated event logs kept"),
+    Setting("events.sample_rate", float, 1.0, minimum=0,
+            help="share of ordinary calls recorded; errors and slow calls always are"),
+    Setting("events.batch_sample_rate", float, 0.1, minimum=0,
+            help="share of ordinary batch queue calls recorded"),
+    Setting("events.slow_seconds", float, 10.0, minimum=0,
+            help="calls at least this slow are always recorded"),
+]
+SETTINGS_BY_KEY = {setting.key: setting for setting in SETTINGS}
+
+
+class Config:
+    """Validated settings, read with config["section.name"]
+
+    models maps registered model keys to the Hugging Face model each one
+    should use instead of its default.
+    """
+
+    def __init__(self, values, models=None, path=None):
+        self._values = dict(values)
+        self.models = dict(models or {})
+        self.path = path
+
+    def __getitem__(self, key):
+        return self._values[key]
+
+    def items(self):
+        return self._values.items()
+
+    def changes(self, other):
+        """Keys whose value differs in other, models.<key> for model overrides"""
+        changed = [key for key, value in self._values.items() if other[key] != value]
+        for key in set(self.models) | set(other.models):
+            if self.models.get(key) != other.models.get(key):
+                changed.append(f"models.{key}")
+        return changed
+
+
+def load_env_file(path=ENV_FILE):
+    """Copy KEY=value lines into the environment, leaving variables already set alone"""
+    if not os.path.exists(path):
+        return
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#") or "=" not in line:
+                continue
+            name, value = line.split("=", 1)
+            os.environ.setdefault(name.strip(), value.strip().strip("'\""))
+
+def load_config(path=CONFIG_FILE, environ=None):
+    """Read and validate the settings file and environment
+
+    A missing file means the defaults. Every problem is collected, so one
+    ConfigError names them all.
+    """
+    environ = os.environ if environ is None else environ
+    parser = configparser.ConfigParser(interpolation=None)
+    # Model keys such as facebook/detr-resnet-50 are case sensitive
+    parser.optionxform = str
+    try:
+        parser.read(path, encoding="utf-8")
+    except configparser.Error as e:
+        raise ConfigError(f"{path}: {e}")
+
+    values = {}
+    errors = []
+    for setting in SETTINGS:
+        section, name = setting.key.split(".")
+        text = environ.get(setting.env_name)
+        if text is None and parser.has_option(section, name):
+            text = parser.get(section, name)
+        try:
+            values[setting.key] = setting.default if text is None else setting.parse(text)
+        except ConfigError as e:
+            errors.append(str(e))
+
+    for section in parser.sections():
+        if section == "models":
+            continue
+        for name in parser.options(section):
+            if f"{section}.{name}" not in SETTINGS_BY_KEY:
+                errors.append(f"{section}.{name}: unknown setting")
+
+    if values.get("whisper.local") and importlib.util.find_spec("faster_whisper") is None:
+        errors.append("whisper.local: needs the faster-whisper package (pip install faster-whisper)")
+
+    models = {}
+    if parser.has_section("models"):
+        from models import MODEL_REGISTRY, load_plugins
+        load_plugins()
+        for key, model_name in parser.items("models"):
+            if key not in MODEL_REGISTRY:
+                errors.append(f"models.{key}: no model is registered under this key")
+            elif not model_name.strip():
+                errors.append(f"models.{key}: needs a model name")
+            else:
+                models[key] = model_name.strip()
+
+    if errors:
+        raise ConfigError(f"Invalid configuration in {path}:\n  " + "\n  ".join(errors))
+    return Config(values, models, path)
+
+
+def apply_config(config, previous=None):
+    """Resize caches and pools and set timeouts to match config
+
+    With previous given, only what changed is touched; settings that are
+    not live are left for the next start.
+    """
+    import async_runtime
+    import batch_queue
+    import decorators
+    import file_inputs
+    import image_hashes
+    import warmup
+    from event_log import EVENT_LOG
+    from image_results import IMAGE_STORE
+    from models import MODEL_REGISTRY, AIModel, AudioToTextModel
+
+    def changed(key):
+        return previous is None or previous[key] != config[key]
+
+    if changed("timeouts.probe"):
+        warmup.PROBE_TIMEOUT = config["timeouts.probe"]
+    if changed("concurrency.batch"):
+        batch_queue.BATCH_CONCURRENCY = config["concurrency.batch"]
+    if changed("concurrency.thread_pool") and (config["concurrency.thread_pool"] or previous is not None):
+        # 0 goes back to Python's default size
+        async_runtime.get_runner().set_thread_pool_size(config["concurrency.thread_pool"] or None)
+    if changed("cache.enabled"):
+        decorators.CACHE_ENABLED = config["cache.enabled"]
+        # Near-duplicate detections are kept apart from the result cache
+        image_hashes.clear_indexes()
+    if changed("cache.results"):
+        decorators.set_result_cache_size(config["cache.results"])
+    if changed("cache.file_hashes"):
+        file_inputs.HASH_CACHE_SIZE = config["cache.file_hashes"]
+    if changed("cache.image_memory_mb"):
+        IMAGE_STORE.set_budget(config["cache.image_memory_mb"] * 1024 * 1024)
+    if changed("requests.hedge"):
+        AIModel.hedge_requests = config["requests.hedge"]
+    if changed("whisper.local") or changed("whisper.workers") or changed("whisper.compute_type"):
+        if config["whisper.local"]:
+            AudioToTextModel.local_backend = {"workers": config["whisper.workers"],
+                                              "compute_type": config["whisper.compute_type"]}
+        else:
+            AudioToTextModel.local_backend = None
+            if previous is not None:
+                # Stop the worker processes of the backend that was in use
+                from local_whisper import close_backends
+                close_backends()
+    if changed("events.batch_sample_rate"):
+        batch_queue.BATCH_SAMPLE_RATE = config["events.batch_sample_rate"]
+    EVENT_LOG.configure(
+        path=config["events.path"],
+        enabled=config["events.enabled"],
+        max_bytes=int(config["events.max_mb"] * 1024 * 1024),
+        backups=config["events.backups"],
+        sample_rate=config["events.sample_rate"],
+        slow_seconds=config["events.slow_seconds"],
+    )
+
+    # A renamed model is created afresh the next time it is used
+    old_models = {} if previous is None else previous.models
+    for key in set(config.models) | set(old_models):
+        if config.models.get(key) != old_models.get(key) and key in MODEL_REGISTRY:
+            spec = MODEL_REGISTRY[key]
+            spec.set_model_name(config.models.get(key, spec.default_model_name))
+
+
+class ConfigWatcher:
+    """Holds the current config and reloads it when its file changes
+
+    check() is cheap (one stat) so a GUI can call it on a timer. A file
+    with errors is reported and ignored, keeping the last good config.
+    """
+
+    def __init__(self, path=CONFIG_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._mtime = self._stat()
+        self.config = load_config(path)
+
+    def _stat(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def check(self):
+        """Reload if the file changed; returns (changed keys, error message or None)"""
+        with self._lock:
+            mtime = self._stat()
+            if mtime == self._mtime:
+                return [], None
+            self._mtime = mtime
+            try:
+                config = load_config(self.path)
+            except ConfigError as e:
+                return [], str(e)
+            previous, self.config = self.config, config
+        changed = previous.changes(config)
+        if changed:
+            apply_config(config, previous)
+        return changed, None
+
+    def restart_needed(self, changed):
+        """The changed keys that only take effect on the next start"""
+        return [key for key in changed if key in SETTINGS_BY_KEY and not SETTINGS_BY_KEY[key].live]
@@ -1,3 +1,13 @@
+import asyncio
+import contextvars
+import inspect
+import threading
+from collections import OrderedDict
+
+from event_log import EVENT_LOG, note, phase
+from traffic import TRAFFIC
+
+
 def log_call(func):
     def wrapper(*args, **kwargs):
         print(f"[LOG] Calling {func.__name__} with args={args}, kwargs={kwargs}")
@@ -6,6 +16,50 @@ def log_call(func):
         return result
     return wrapper
 
+def log_action(func):
+    """Print each model call and record it in the structured event log, and
+    in the traffic recording if one is being made"""
+    if inspect.iscoroutinefunction(func):
+        async def async_wrapper(self, input_data, *args, **kwargs):
+            print(f"[LOG] {type(self).__name__}.{func.__name__} running")
+            call = TRAFFIC.start_call(self, func.__name__, "async", input_data, kwargs)
+            started = EVENT_LOG.start_call(self, func.__name__, input_data)
+            try:
+                result = await func(self, input_data, *args, **kwargs)
+            except BaseException as e:
+                EVENT_LOG.finish_call(started, error=e)
+                TRAFFIC.finish_call(call, e)
+                raise
+            EVENT_LOG.finish_call(started, result=result)
+            TRAFFIC.finish_call(call)
+            return result
+        return async_wrapper
+
+    if inspect.isgeneratorfunction(func):
+        # The event would leak into the caller between yields, so a
+        # generator is only printed, and its inner calls record themselves
+        def generator_wrapper(self, input_data, *args, **kwargs):
+            print(f"[LOG] {type(self).__name__}.{func.__name__} running")
+            call = TRAFFIC.start_call(self, func.__name__, "generator", input_data, kwargs)
+            generator = func(self, input_data, *args, **kwargs)
+            return generator if call is None else TRAFFIC.record_generator(call, generator)
+        return generator_wrapper
+
+    def wrapper(self, input_data, *args, **kwargs):
+        print(f"[LOG] {type(self).__name__}.{func.__name__} running")
+        call = TRAFFIC.start_call(self, func.__name__, "sync", input_data, kwargs)
+        started = EVENT_LOG.start_call(self, func.__name__, input_data)
+        try:
+            result = func(self, input_data, *args, **kwargs)
+        except BaseException as e:
+            EVENT_LOG.finish_call(started, error=e)
+            TRAFFIC.finish_call(call, e)
+            raise
+        EVENT_LOG.finish_call(started, result=result)
+        TRAFFIC.finish_call(call)
+        return result
+    return wrapper
+
 def validate_input(func):
     def wrapper(self, input_data):
         if input_data is None or (isinstance(input_data, str) and not input_data.strip()):
@@ -14,4 +68,135 @@ def validate_input(func):
     return wrapper
 
 
+# Results shared by every model instance, most recently used last
+RESULT_CACHE_SIZE = 32
+# When off, every call goes to the model; load tests compare both
+CACHE_ENABLED = True
+_result_cache = OrderedDict()
+_in_flight = {}
+_cache_lock = threading.Lock()
+# A one-item list while a cached call runs; dont_cache() clears it. A list,
+# so tasks and threads the call starts, which copy the context, share it
+_cacheable = contextvars.ContextVar("cacheable", default=None)
+
+def make_cache_key(model_name, input_data, params):
+    """Build a hashable key from the model, its input and the generation parameters"""
+    return (model_name, input_data, tuple(sorted(params.items())))
+
+def set_result_cache_size(size):
+    """Change how many results are kept, dropping the oldest if it shrinks"""
+    global RESULT_CACHE_SIZE
+    with _cache_lock:
+        RESULT_CACHE_SIZE = size
+        while len(_result_cache) > RESULT_CACHE_SIZE:
+            _result_cache.popitem(last=False)
+
+def clear_result_cache():
+    """Forget every cached result"""
+    with _cache_lock:
+        _result_cache.clear()
+
+def dont_cache():
+    """Keep the result of the cached call now running out of the cache"""
+    cacheable = _cacheable.get()
+    if cacheable is not None:
+        cacheable[0] = False
 
+def _claim(key):
+    """Look up key; returns (hit, result, waiter, owner) under the cache lock"""
+    with _cache_lock:
+        if key in _result_cache:
+            _result_cache.move_to_end(key)
+            return True, _result_cache[key], None, False
+        waiter = _in_flight.get(key)
+        owner = waiter is None
+        if owner:
+            waiter = _in_flight[key] = threading.Event()
+        return False, None, waiter, owner
+
+def _cached(key):
+    with _cache_lock:
+        return key in _result_cache, _result_cache.get(key)
+
+def _store(key, result):
+    with _cache_lock:
+        _result_cache[key] = result
+        while len(_result_cache) > RESULT_CACHE_SIZE:
+            _result_cache.popitem(last=False)
+
+def _release(key, waiter):
+    with _cache_lock:
+        del _in_flight[key]
+    waiter.set()
+
+def cache_result(func):
+    """Reuse the result of an identical call and share identical calls already running"""
+    def wrapper(self, input_data, cancel_token=None, **params):
+        if not CACHE_ENABLED:
+            note(cache="off")
+            return func(self, input_data, cancel_token=cancel_token, **params)
+        with phase("cache_key"):
+            key = make_cache_key(self._model_name, self._cache_input(input_data), params)
+        hit, result, waiter, owner = _claim(key)
+        note(cache="hit" if hit else "miss" if owner else "shared")
+        if hit:
+            return result
+
+        if not owner:
+            # Wait for the running call, still honouring our own cancellation
+            while not waiter.wait(0.1):
+                if cancel_token is not None:
+                    cancel_token.check()
+            hit, result = _cached(key)
+            if hit:
+                return result
+            # The first call failed, so try again ourselves
+            return wrapper(self, input_data, cancel_token=cancel_token, **params)
+
+        cacheable = [True]
+        reset = _cacheable.set(cacheable)
+        try:
+            result = func(self, input_data, cancel_token=cancel_token, **params)
+            if cacheable[0]:
+                _store(key, result)
+            return result
+        finally:
+            _cacheable.reset(reset)
+            _release(key, waiter)
+    return wrapper
+
+def acache_result(func):
+    """Async version of cache_result, sharing the same cache and in-flight calls"""
+    async def wrapper(self, input_data, cancel_token=None, **params):
+        if not CACHE_ENABLED:
+            note(cache="off")
+            return await func(self, input_data, cancel_token=cancel_token, **params)
+        with phase("cache_key"):
+            key = make_cache_key(self._model_name, self._cache_input(input_data), params)
+        hit, result, waiter, owner = _claim(key)
+        note(cache="hit" if hit else "miss" if owner else "shared")
+        if hit:
+            return result
+
+        if not owner:
+            # Poll rather than block so the event loop keeps running
+            while not waiter.is_set():
+                if cancel_token is not None:
+                    cancel_token.check()
+                await asyncio.sleep(0.05)
+            hit, result = _cached(key)
+            if hit:
+                return result
+            return await wrapper(self, input_data, cancel_token=cancel_token, **params)
+
+        cacheable = [True]
+        reset = _cacheable.set(cacheable)
+        try:
+            result = await func(self, input_data, cancel_token=cancel_token, **params)
+            if cacheable[0]:
+                _store(key, result)
+            return result
+        finally:
+            _cacheable.reset(reset)
+            _release(key, waiter)
+    return wrapper
@@ -0,0 +1,266 @@
+import atexit
+import contextvars
+import hashlib
+import json
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+# Where inference events go; rotated files get .1, .2, ... appended
+EVENT_LOG_PATH = os.path.join("logs", "events.jsonl")
+# Rotate once the log reaches this size, keeping this many old files
+EVENT_LOG_MAX_BYTES = 10 * 1024 * 1024
+EVENT_LOG_BACKUPS = 5
+# Events waiting for the writer before new ones are dropped rather than block
+EVENT_QUEUE_SIZE = 10000
+# Share of ordinary calls recorded; errors and slow calls are always kept
+EVENT_SAMPLE_RATE = 1.0
+# Calls at least this slow are always kept, whatever the sample rate
+EVENT_SLOW_SECONDS = 10.0
+
+# The event of the model call running in this thread or task, so the code
+# it calls can add timings to it
+_current_event = contextvars.ContextVar("current_event", default=None)
+# Sample rate for calls made in this context, such as a batch queue worker;
+# None means the log's own rate
+sample_rate = contextvars.ContextVar("event_sample_rate", default=None)
+
+_STOP = object()
+
+
+@contextmanager
+def phase(name):
+    """Add the time spent in the block to the current event's phase timings"""
+    event = _current_event.get()
+    if event is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_phase(name, time.perf_counter() - start, event)
+
+def add_phase(name, seconds, event=None):
+    event = event or _current_event.get()
+    if event is not None:
+        phases = event["phases"]
+        phases[name] = phases.get(name, 0.0) + seconds
+
+def note(**fields):
+    """Set fields on the current event, if a model call is being recorded"""
+    event = _current_event.get()
+    if event is not None:
+        event.update(fields)
+
+
+def describe_input(value):
+    """Hash and size of a model input; run on the writer thread, not the caller's"""
+    from file_inputs import bytes_hash, file_hash
+    from model_input import ModelInput
+    if isinstance(value, ModelInput):
+        return {"hash": value.hash[:16], "bytes": value.size, "type": value.mime}
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return {"hash": bytes_hash(value)[:16], "bytes": len(value)}
+    if isinstance(value, str):
+        if os.path.isfile(value):
+            # Memoized, and usually already computed for the cache key
+            return {"hash": file_hash(value)[:16], "bytes": os.path.getsize(value),
+                    "type": os.path.splitext(value)[1].lower()}
+        return {"hash": hashlib.sha256(value.encode("utf-8")).hexdigest()[:16], "chars": len(value)}
+    return {"type": type(value).__name__}
+
+def describe_output(result):
+    """Size of a model result, cheap enough to take before the call returns"""
+    if result is None:
+        return None
+    if isinstance(result, str):
+        return {"chars": len(result)}
+    if isinstance(result, (list, tuple)):
+        return {"items": len(result)}
+    size = getattr(result, "size", None)
+    if isinstance(size, tuple):
+        return {"width": size[0], "height": size[1]}
+    return {"type": type(result).__name__}
+
+
+class EventLog:
+    """JSONL log of model calls, written by a background thread
+
+    record() only puts the event on a bounded queue; hashing the input,
+    encoding JSON and writing happen on the writer thread, and when the
+    queue is full events are counted and dropped rather than block a model
+    call. Calls are head-sampled at sample_rate, but errors and calls
+    slower than slow_seconds are always kept. The file rotates by size.
+    """
+
+    def __init__(self, path=EVENT_LOG_PATH, max_bytes=EVENT_LOG_MAX_BYTES, backups=EVENT_LOG_BACKUPS,
+                 sample_rate=EVENT_SAMPLE_RATE, slow_seconds=EVENT_SLOW_SECONDS, queue_size=EVENT_QUEUE_SIZE):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.sample_rate = sample_rate
+        self.slow_seconds = slow_seconds
+        self.enabled = True
+        self.dropped = 0
+        self._queue = queue.Queue(queue_size)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._file = None
+        self._size = 0
+
+    # Recording (any thread)
+
+    def start_call(self, model, method, input_data):
+        """Begin recording a model call; returns (event, context token) or None"""
+        if not self.enabled:
+            return None
+        rate = sample_rate.get()
+        rate = self.sample_rate if rate is None else rate
+        event = {
+            "event": "inference",
+            "time": time.time(),
+            "model": model.model_name,
+            "task": model.task,
+            "method": method,
+            "sample_rate": rate,
+            "sampled": rate >= 1 or random.random() < rate,
+            "phases": {},
+            "_input": input_data,
+            "_start": time.perf_counter(),
+        }
+        return event, _current_event.set(event)
+
+    def finish_call(self, started, result=None, error=None):
+        """Finish a call begun with start_call() and queue it if it is kept"""
+        if started is None:
+            return
+        event, token = started
+        _current_event.reset(token)
+        event["duration"] = time.perf_counter() - event.pop("_start")
+        if error is not None:
+            event["error"] = f"{type(error).__name__}: {error}"[:500]
+        else:
+            event["output"] = describe_output(result)
+        # Tail sampling: what went wrong or slowly is what gets looked at later
+        if not (event.pop("sampled") or error is not None or event["duration"] >= self.slow_seconds):
+            return
+        self.record(event)
+
+    def record(self, event):
+        """Queue an event for writing without ever blocking"""
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    # Writing (writer thread)
+
+    def _ensure_writer(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._write_loop, name="event-log", daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def _write_loop(self):
+        while True:
+            event = self._queue.get()
+            # Write everything already queued before flushing once
+            batch = [event]
+            while len(batch) < 1000:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = _STOP in batch
+            try:
+                self._write([e for e in batch if e is not _STOP])
+            except OSError as e:
+                print(f"[LOG] Could not write events to {self.path}: {e}")
+            if stop:
+                return
+
+    def _write(self, events):
+        with self._lock:
+            dropped, self.dropped = self.dropped, 0
+        if dropped:
+            events.append({"event": "dropped", "time": time.time(), "count": dropped})
+        for event in events:
+            line = self._encode(event)
+            if line is None:
+                continue
+            if self._file is None:
+                self._open()
+            elif self._size + len(line) > self.max_bytes and self._size:
+                self._rotate()
+            self._file.write(line)
+            self._size += len(line)
+        if self._file is not None:
+            self._file.flush()
+
+    def _encode(self, event):
+        """The JSON line of one event, or None if it cannot be written
+
+        A problem with one event costs only that event, never the batch.
+        """
+        if "_input" in event:
+            try:
+                event["input"] = describe_input(event.pop("_input"))
+            except Exception as e:
+                # Such as a file deleted since the call; the rest still says what happened
+                event["input"] = {"error": f"{type(e).__name__}: {e}"[:200]}
+        try:
+            return json.dumps(event, default=str) + "\n"
+        except (TypeError, ValueError) as e:
+            print(f"[LOG] Dropping an event that cannot be encoded: {e}")
+            return None
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._size = self._file.tell()
+
+    def _rotate(self):
+        self._file.close()
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._open()
+
+    def close(self):
+        """Write the queued events and stop the writer"""
+        thread = self._thread
+        if thread is None:
+            return
+        self._queue.put(_STOP)
+        thread.join()
+        self._thread = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def configure(self, path=None, **settings):
+        """Change settings; a new path takes effect with the next event written"""
+        for name, value in settings.items():
+            setattr(self, name, value)
+        if path is not None and path != self.path:
+            self.close()
+            self.path = path
+
+
+# The log every model call is recorded in
+EVENT_LOG = EventLog()
@@ -0,0 +1,69 @@
+import hashlib
+import mmap
+import os
+import threading
+from collections import OrderedDict
+
+# Files at least this large are hashed through a memory map
+MMAP_THRESHOLD = 4 * 1024 * 1024
+CHUNK_SIZE = 1024 * 1024
+
+# Hashes by file fingerprint, most recently used last
+HASH_CACHE_SIZE = 1024
+_hash_cache = OrderedDict()
+_hash_lock = threading.Lock()
+
+
+def file_fingerprint(path):
+    """Identify a file version by (path, size, mtime, inode) from a single stat"""
+    st = os.stat(path)
+    return (os.path.abspath(path), st.st_size, st.st_mtime_ns, st.st_ino)
+
+def file_hash(path, fingerprint=None):
+    """SHA-256 of a file's contents, memoized until the file changes
+
+    Pass the file's fingerprint if it is already known to skip the stat.
+    """
+    if fingerprint is None:
+        fingerprint = file_fingerprint(path)
+    with _hash_lock:
+        if fingerprint in _hash_cache:
+            _hash_cache.move_to_end(fingerprint)
+            return _hash_cache[fingerprint]
+
+    digest = hashlib.sha256()
+    for chunk in iter_file_chunks(path, size=fingerprint[1]):
+        digest.update(chunk)
+    result = digest.hexdigest()
+    remember_file_hash(fingerprint, result)
+    return result
+
+def remember_file_hash(fingerprint, digest):
+    """Memoize the hash of a file version whose contents were hashed elsewhere"""
+    with _hash_lock:
+        _hash_cache[fingerprint] = digest
+        while len(_hash_cache) > HASH_CACHE_SIZE:
+            _hash_cache.popitem(last=False)
+
+def bytes_hash(data):
+    """SHA-256 of in-memory bytes, for inputs that never touched the disk"""
+    return hashlib.sha256(data).hexdigest()
+
+def iter_file_chunks(path, chunk_size=CHUNK_SIZE, size=None):
+    """Yield a file's contents in chunks without holding the whole file in memory
+
+    Large files are read through a memory map so the OS pages them in and
+    out as needed; small ones use plain buffered reads.
+    """
+    if size is None:
+        size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        if size < MMAP_THRESHOLD:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for offset in range(0, len(mapped), chunk_size):
+                yield mapped[offset:offset + chunk_size]
@@ -1,7 +1,33 @@
+import asyncio
+import contextlib
+import decorators
+import os
+import re
+import time
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
-from PIL import Image
-from models import ObjectDetectionModel, TextToImageModel
+from PIL import ImageTk
+from huggingface_hub import ObjectDetectionOutputElement
+from models import MODEL_REGISTRY, AIModel, TextToImageModel, load_plugins
+from cancellation import CancelToken, DeadlineExceededError
+from async_runtime import get_runner
+from run_profiler import RunProfiler
+from search_index import HIT_END, HIT_START, SearchIndex
+from result_store import ResultStore
+from image_results import IMAGE_STORE, ImageResult, process_rss
+from image_hashes import NearDuplicateIndex, phash
+from warmup import LOADING, READY, UNAVAILABLE, UNKNOWN, WARMING, ModelWarmer
+from batch_queue import DONE, RUNNING, BatchQueue
+from pipeline import Pipeline, Stage, can_chain, describe_detections
+from config import ConfigWatcher, apply_config
+from model_input import UnsupportedInputError
+from speculation import Speculator
+
+# Drag and drop of files needs the optional tkinterdnd2 package
+try:
+    from tkinterdnd2 import DND_FILES, TkinterDnD
+except ImportError:
+    DND_FILES = None
 from explanations import get_oop_explanation
 
 
@@ -82,6 +108,274 @@ class OOPExplanationWindow:
         close_btn.pack(side="right")
 
 
+class SearchWindow:
+    """Window searching the transcripts, prompts and other results of past runs"""
+    
+    # Milliseconds to wait after a keystroke before searching
+    SEARCH_DELAY = 150
+    
+    def __init__(self, parent, index):
+        self.index = index
+        self.pending_search = None
+        self.window = tk.Toplevel(parent)
+        self.window.title("Search Results")
+        self.window.geometry("800x600")
+        self.window.configure(bg="#f0f4f8")
+        self.window.transient(parent)
+        
+        self.query = tk.StringVar()
+        self.setup_ui()
+        self.query.trace_add("write", self.on_query_changed)
+    
+    def setup_ui(self):
+        search_frame = tk.Frame(self.window, bg="#f0f4f8")
+        search_frame.pack(fill="x", padx=20, pady=(20, 10))
+        
+        entry = tk.Entry(
+            search_frame,
+            textvariable=self.query,
+            font=("Segoe UI", 12),
+            relief=tk.SOLID,
+            borderwidth=1
+        )
+        entry.pack(fill="x", ipady=6)
+        entry.focus_set()
+        
+        self.status_label = tk.Label(
+            search_frame,
+            text=f"{len(self.index)} results indexed",
+            font=("Segoe UI", 9),
+            bg="#f0f4f8",
+            fg="#718096"
+        )
+        self.status_label.pack(anchor="w", pady=(5, 0))
+        
+        self.results_text = scrolledtext.ScrolledText(
+            self.window,
+            wrap=tk.WORD,
+            font=("Consolas", 10),
+            bg="white",
+            fg="#2d3748",
+            relief=tk.FLAT,
+            borderwidth=0,
+            padx=15,
+            pady=15
+        )
+        self.results_text.pack(fill="both", expand=True, padx=20, pady=(0, 20))
+        self.results_text.tag_configure("meta", foreground="#718096")
+        self.results_text.tag_configure("hit", background="#fefcbf", font=("Consolas", 10, "bold"))
+        self.results_text.config(state=tk.DISABLED)
+    
+    def on_query_changed(self, *args):
+        """Search once typing pauses rather than on every keystroke"""
+        if self.pending_search is not None:
+            self.window.after_cancel(self.pending_search)
+        self.pending_search = self.window.after(self.SEARCH_DELAY, self.run_search)
+    
+    def run_search(self):
+        self.pending_search = None
+        start = time.perf_counter()
+        hits = self.index.search(self.query.get())
+        elapsed = (time.perf_counter() - start) * 1000
+        self.status_label.config(text=f"{len(hits)} hits in {elapsed:.1f} ms")
+        
+        self.results_text.config(state=tk.NORMAL)
+        self.results_text.delete("1.0", tk.END)
+        for hit in hits:
+            when = time.strftime("%Y-%m-%d %H:%M", time.localtime(hit['created']))
+            self.results_text.insert(tk.END, f"{hit['kind']}  {hit['model']}  {when}\n", "meta")
+            if hit['source']:
+                self.results_text.insert(tk.END, f"{hit['source']}\n", "meta")
+            # Text between the markers is a matched term
+            for i, part in enumerate(re.split(f"[{HIT_START}{HIT_END}]", hit['snippet'])):
+                self.results_text.insert(tk.END, part, "hit" if i % 2 else ())
+            self.results_text.insert(tk.END, "\n\n")
+        self.results_text.config(state=tk.DISABLED)
+
+
+class BatchQueueWindow:
+    """Window running many files through the selected model"""
+    
+    # Milliseconds between list refreshes; changes are applied in batches
+    REFRESH_INTERVAL = 250
+    
+    def __init__(self, app):
+        self.app = app
+        self.queue = app.batch_queue
+        self.window = tk.Toplevel(app.root)
+        self.window.title("Batch Queue")
+        self.window.geometry("900x550")
+        self.window.configure(bg="#f0f4f8")
+        self.window.transient(app.root)
+        
+        self.concurrency_var = tk.IntVar(value=self.queue.concurrency)
+        self.setup_ui()
+        
+        # Show items queued before the window was (re)opened
+        for item in self.queue.items.values():
+            self.show_item(item)
+        self.refresh()
+    
+    def setup_ui(self):
+        button_frame = tk.Frame(self.window, bg="#f0f4f8")
+        button_frame.pack(fill="x", padx=20, pady=(20, 10))
+        
+        for text, command in ((" Add Files...", self.add_files), (" Start", self.start),
+                              (" Cancel", self.queue.cancel), (" Retry Failed", self.retry),
+                              (" Clear Finished", self.clear_finished)):
+            tk.Button(
+                button_frame,
+                text=text,
+                command=command,
+                font=("Segoe UI", 10, "bold"),
+                bg="#2c5aa0",
+                fg="white",
+                relief=tk.FLAT,
+                padx=12,
+                pady=6,
+                cursor="hand2",
+                activebackground="#4299e1",
+                activeforeground="white"
+            ).pack(side="left", padx=(0, 8))
+        
+        tk.Spinbox(
+            button_frame,
+            from_=1,
+            to=32,
+            width=4,
+            textvariable=self.concurrency_var,
+            font=("Segoe UI", 10)
+        ).pack(side="right")
+        tk.Label(
+            button_frame,
+            text="At once:",
+            font=("Segoe UI", 10),
+            bg="#f0f4f8",
+            fg="#2d3748"
+        ).pack(side="right", padx=(0, 5))
+        
+        list_frame = tk.Frame(self.window, bg="#f0f4f8")
+        list_frame.pack(fill="both", expand=True, padx=20)
+        self.tree = ttk.Treeview(list_frame, columns=("file", "status", "latency", "result"), show="headings")
+        for column, heading, width in (("file", "File", 260), ("status", "Status", 80),
+                                       ("latency", "Latency", 70), ("result", "Result", 400)):
+            self.tree.heading(column, text=heading)
+            self.tree.column(column, width=width, anchor="w")
+        scrollbar = ttk.Scrollbar(list_frame, orient="vertical", command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scrollbar.set)
+        self.tree.pack(side="left", fill="both", expand=True)
+        scrollbar.pack(side="right", fill="y")
+        
+        if DND_FILES is not None:
+            try:
+                TkinterDnD._require(self.window)
+                self.tree.drop_target_register(DND_FILES)
+                self.tree.dnd_bind("<<Drop>>", self.on_drop)
+                drop_hint = "Drop files on the list or use Add Files."
+            except (tk.TclError, AttributeError):
+                drop_hint = "Use Add Files to queue files."
+        else:
+            drop_hint = "Use Add Files to queue files (install tkinterdnd2 to drop them)."
+        
+        status_frame = tk.Frame(self.window, bg="#f0f4f8")
+        status_frame.pack(fill="x", padx=20, pady=(10, 20))
+        self.progress = ttk.Progressbar(status_frame, mode="determinate")
+        self.progress.pack(fill="x")
+        self.summary_label = tk.Label(
+            status_frame,
+            text=drop_hint,
+            font=("Segoe UI", 9),
+            bg="#f0f4f8",
+            fg="#718096"
+        )
+        self.summary_label.pack(anchor="w", pady=(5, 0))
+    
+    def add_files(self):
+        model = self.app.selected_model
+        input_type = model.input_type if model is not None else "image"
+        paths = filedialog.askopenfilenames(
+            parent=self.window,
+            title=f"Select {input_type.title()} Files",
+            filetypes=self.app.FILE_TYPES.get(input_type, self.app.FILE_TYPES['image'])
+        )
+        self.queue_paths(paths)
+    
+    def on_drop(self, event):
+        self.queue_paths(self.window.tk.splitlist(event.data))
+    
+    def queue_paths(self, paths):
+        if not paths:
+            return
+        self.queue.add(paths)
+        # Files added while the queue runs join the current batch
+        if self.queue.running:
+            self.start()
+    
+    def start(self):
+        model = self.app.selected_model
+        if model is None or model.input_type == "text":
+            messagebox.showwarning("Batch Queue", "Select an image or audio model first.", parent=self.window)
+            return
+        try:
+            concurrency = self.concurrency_var.get()
+        except tk.TclError:
+            messagebox.showwarning("Batch Queue", "'At once' must be a whole number of files.", parent=self.window)
+            return
+        self.queue.start(model, max(1, concurrency), timeout=self.app.request_timeout)
+    
+    def retry(self):
+        self.queue.retry()
+        self.start()
+    
+    def clear_finished(self):
+        for item_id in self.queue.clear_finished():
+            if self.tree.exists(item_id):
+                self.tree.delete(item_id)
+    
+    def refresh(self):
+        """Apply the changes since the last refresh in one pass"""
+        if not self.window.winfo_exists():
+            return
+        for item in self.queue.drain_changes():
+            self.show_item(item)
+            if item.status == DONE:
+                self.app.record_result(item.model, item.result, item.path)
+        # Running rows have a ticking latency; there are at most a few of them
+        for item in list(self.queue.items.values()):
+            if item.status == RUNNING:
+                self.show_item(item)
+        
+        counts = self.queue.counts()
+        total = sum(counts.values())
+        finished = total - counts['queued'] - counts['running']
+        self.progress.configure(maximum=max(total, 1), value=finished)
+        if total:
+            self.summary_label.config(
+                text=f"{finished} of {total} finished: {counts['done']} done, {counts['failed']} failed, "
+                     f"{counts['cancelled']} cancelled, {counts['running']} running"
+            )
+        self.window.after(self.REFRESH_INTERVAL, self.refresh)
+    
+    def show_item(self, item):
+        latency = f"{item.latency:.1f}s" if item.latency is not None else ""
+        values = (os.path.basename(item.path), item.status, latency, self.describe(item))
+        if self.tree.exists(item.id):
+            self.tree.item(item.id, values=values)
+        else:
+            self.tree.insert("", tk.END, iid=item.id, values=values)
+    
+    def describe(self, item):
+        if item.error:
+            return item.error
+        if item.status != DONE:
+            return ""
+        result = item.result
+        if isinstance(result, list):
+            labels = ", ".join(sorted({detection.label for detection in result}))
+            return f"{len(result)} objects: {labels}" if result else "No objects"
+        return " ".join(str(result).split())[:120]
+
+
 class AppGUI:
     """Enhanced AI GUI with modern design and improved UX"""
     
@@ -99,7 +393,54 @@ class AppGUI:
         'border': '#e2e8f0'        # Light border
     }
     
-    def __init__(self):
+    # Largest size of the image preview in the output section
+    PREVIEW_SIZE = (480, 360)
+    
+    # Milliseconds between checks of the settings file for changes
+    CONFIG_CHECK_INTERVAL = 2000
+    
+    # Action button colour for each model input type
+    ACTION_COLORS = {
+        'image': 'success',
+        'text': 'warning',
+        'audio': 'secondary'
+    }
+    
+    # File dialog filters for file-based input types
+    FILE_TYPES = {
+        'image': [("Image Files", "*.png;*.jpg;*.jpeg;*.bmp;*.gif"), ("All Files", "*.*")],
+        'audio': [("Audio Files", "*.wav;*.mp3;*.flac;*.ogg;*.m4a"), ("All Files", "*.*")]
+    }
+    
+    # Model cards per row in the selection section
+    CARDS_PER_ROW = 3
+    
+    # Milliseconds between memory gauge updates
+    MEMORY_GAUGE_INTERVAL = 1000
+    
+    # Card badge text and colour for each model readiness state
+    READINESS_BADGES = {
+        UNKNOWN: (" Not checked", 'text_secondary'),
+        WARMING: (" Warming up...", 'warning'),
+        LOADING: (" Model loading", 'warning'),
+        READY: (" Ready", 'success'),
+        UNAVAILABLE: (" Unavailable", 'danger'),
+    }
+    
+    # Milliseconds between readiness badge updates
+    READINESS_INTERVAL = 1000
+    
+    # Chain menu entry that runs the selected model on its own
+    NO_CHAIN = "Nothing"
+    
+    def __init__(self, settings=None):
+        # Settings are applied before anything sized by them is created
+        if settings is None:
+            settings = ConfigWatcher()
+            apply_config(settings.config)
+        self.settings = settings
+        self.request_timeout = settings.config["timeouts.request"]
+        
         self.root = tk.Tk()
         self.root.title("AI Studio - Hugging Face Model Interface")
         self.root.geometry("1000x750")
@@ -108,19 +449,73 @@ class AppGUI:
         # Configure styles
         self.setup_styles()
 
-        # Initializing the models
-        self.model1 = ObjectDetectionModel("facebook/detr-resnet-50")
-        self.model2 = TextToImageModel("black-forest-labs/FLUX.1-dev")
+        # Registered models; each one is only created when its card is selected
+        load_plugins()
+        self.model_specs = MODEL_REGISTRY
 
+        self.selected_spec = None
         self.selected_model = None
         self.input_type = tk.StringVar(value="Text")
         self.input_text = tk.StringVar()
         self.input_image_path = tk.StringVar()
         
+        # Text-to-Image generation settings (blank fields use the mode preset)
+        self.generation_mode = tk.StringVar(value="draft")
+        self.generation_vars = {
+            name: tk.StringVar() for name in TextToImageModel.GENERATION_PARAMS
+        }
+        self.progressive_var = tk.BooleanVar(value=True)
+        
+        # Model the selected model's result is fed to, by card title
+        self.chain_var = tk.StringVar(value=self.NO_CHAIN)
+        self.chain_specs = {}
+        self.chain_menu = None
+        
+        # Background job (the action button cancels it while it runs), run on
+        # the shared event loop thread
+        self.runner = get_runner()
+        self.job_id = 0
+        self.job_futures = []
+        self.job_token = None
+        self.generation_prompt = None
+        
+        # Profiling of the next run, toggled from the Tools menu
+        self.profile_next_run = tk.BooleanVar(value=False)
+        self.run_profiler = None
+        
+        # Full-text index of results, searched from the Tools menu, and every
+        # result kept on disk
+        self.search_index = SearchIndex()
+        self.result_store = ResultStore(max_bytes=settings.config["cache.store_mb"] * 1024 * 1024)
+        
+        # Prompts of the images generated so far, by perceptual hash, to
+        # point out a new image that repeats an earlier one
+        self.generated_images = NearDuplicateIndex()
+        
+        # Background warm-up of the selected model, shown on its card
+        self.warmer = ModelWarmer(self.runner)
+        self.readiness_labels = {}
+        
+        # Files queued from the Batch Queue window; it outlives the window
+        self.batch_queue = BatchQueue(self.runner)
+        self.batch_window = None
+        
+        # Duplicate slow requests to a fallback provider, toggled from the Tools menu
+        self.hedge_var = tk.BooleanVar(value=AIModel.hedge_requests)
+        
+        # Draft images requested while the prompt is typed, so Generate often
+        # finds its result already cached; opt-in from the Tools menu
+        self.speculate_var = tk.BooleanVar(value=settings.config["speculation.enabled"])
+        self.speculator = Speculator(self.runner, settings.config["speculation.min_interval"])
+        self.pending_speculation = None
+        
         # Initialize attribute placeholders
         self.model_cards = {}
         self.input_entry = None
         self.output_display = None
+        self.preview_label = None
+        self.memory_label = None
+        self.preview_photo = None
         self.model_info_label = None
         self.main_action_btn = None  # Main action button that changes based on model
         self.input_instruction_label = None  # Instructions for input
@@ -130,6 +525,37 @@ class AppGUI:
 
         self.setup_menu()
         self.setup_layout()
+        self.root.after(self.CONFIG_CHECK_INTERVAL, self.check_config)
+    
+    def check_config(self):
+        """Apply changes to the settings file and schedule the next check"""
+        changed, error = self.settings.check()
+        if error:
+            messagebox.showwarning("Settings Not Applied", f"{error}\n\nThe previous settings stay in use.")
+        elif changed:
+            config = self.settings.config
+            # Only touch what changed, so menu toggles made since the last
+            # reload survive edits to other settings
+            if "timeouts.request" in changed:
+                self.request_timeout = config["timeouts.request"]
+            if "requests.hedge" in changed:
+                self.hedge_var.set(config["requests.hedge"])
+            if "speculation.enabled" in changed:
+                self.speculate_var.set(config["speculation.enabled"])
+            if "speculation.min_interval" in changed:
+                self.speculator.min_interval = config["speculation.min_interval"]
+            if "cache.store_mb" in changed:
+                self.runner.submit(asyncio.to_thread(self.result_store.set_max_bytes,
+                                                     config["cache.store_mb"] * 1024 * 1024))
+            if "concurrency.batch" in changed:
+                self.batch_queue.resize(config["concurrency.batch"])
+                if self.batch_window is not None and self.batch_window.window.winfo_exists():
+                    self.batch_window.concurrency_var.set(config["concurrency.batch"])
+            print(f"[LOG] Settings reloaded: {', '.join(changed)}")
+            later = self.settings.restart_needed(changed)
+            if later:
+                print(f"[LOG] Restart to apply: {', '.join(later)}")
+        self.root.after(self.CONFIG_CHECK_INTERVAL, self.check_config)
     
     def setup_styles(self):
         """Configure ttk styles for modern look"""
@@ -161,6 +587,17 @@ class AppGUI:
         file_menu.add_command(label=" Exit", command=self.root.quit)
         menu_bar.add_cascade(label="File", menu=file_menu)
 
+        tools_menu = tk.Menu(menu_bar, tearoff=0, bg=self.COLORS['bg_card'], fg=self.COLORS['text_primary'])
+        tools_menu.add_command(label=" Batch Queue...", command=self.show_batch_queue)
+        tools_menu.add_command(label=" Search Results...", command=self.show_search)
+        tools_menu.add_separator()
+        tools_menu.add_checkbutton(label=" Hedge Slow Requests", variable=self.hedge_var,
+                                   command=self.on_hedge_toggled)
+        tools_menu.add_checkbutton(label=" Draft While Typing", variable=self.speculate_var,
+                                   command=self.on_speculate_toggled)
+        tools_menu.add_checkbutton(label=" Profile Next Run", variable=self.profile_next_run)
+        menu_bar.add_cascade(label="Tools", menu=tools_menu)
+
         help_menu = tk.Menu(menu_bar, tearoff=0, bg=self.COLORS['bg_card'], fg=self.COLORS['text_primary'])
         help_menu.add_command(label=" OOP Concepts", command=self.show_oop_explanation)
         help_menu.add_separator()
@@ -183,6 +620,26 @@ class AppGUI:
     def show_oop_explanation(self):
         """Open the OOP explanation window"""
         OOPExplanationWindow(self.root)
+    
+    def on_hedge_toggled(self):
+        """Turn hedged requests on or off for every model"""
+        AIModel.hedge_requests = self.hedge_var.get()
+    
+    def on_speculate_toggled(self):
+        """Stop any draft requested while typing once the option is turned off"""
+        if not self.speculate_var.get():
+            self.cancel_speculation()
+    
+    def show_batch_queue(self):
+        """Open the batch queue window, or bring it forward if it is open"""
+        if self.batch_window is not None and self.batch_window.window.winfo_exists():
+            self.batch_window.window.lift()
+            return
+        self.batch_window = BatchQueueWindow(self)
+    
+    def show_search(self):
+        """Open the results search window"""
+        SearchWindow(self.root, self.search_index)
 
     def setup_layout(self):
         """Setup enhanced main layout"""
@@ -284,6 +741,27 @@ class AppGUI:
             activeforeground=self.COLORS['primary']
         )
         oop_btn.pack(side="right", padx=30)
+        
+        # Memory gauge: image pixels held against the budget, and the whole process
+        self.memory_label = tk.Label(
+            header,
+            font=("Segoe UI", 9),
+            bg=self.COLORS['primary'],
+            fg="#e6f2ff",
+            justify="right"
+        )
+        self.memory_label.pack(side="right")
+        self.update_memory_gauge()
+    
+    def update_memory_gauge(self):
+        """Refresh the memory gauge and schedule the next refresh"""
+        mb = 1024 * 1024
+        text = f"Images: {IMAGE_STORE.resident_bytes / mb:.0f} / {IMAGE_STORE.budget / mb:.0f} MB"
+        rss = process_rss()
+        if rss is not None:
+            text += f"\nProcess: {rss / mb:.0f} MB"
+        self.memory_label.config(text=text)
+        self.root.after(self.MEMORY_GAUGE_INTERVAL, self.update_memory_gauge)
     
     def create_model_selection_section(self, parent):
         """Create enhanced model selection with cards"""
@@ -304,29 +782,26 @@ class AppGUI:
         cards_container = tk.Frame(section_frame, bg=self.COLORS['bg_main'])
         cards_container.pack(fill="x")
         
-        # Model 1 Card (Object Detection)
-        model1_card = self.create_model_card(
-            cards_container,
-            " Object Detection",
-            "Detect and identify objects in images",
-            "facebook/detr-resnet-50",
-            lambda: self.select_model_card(1)
-        )
-        model1_card.pack(side="left", fill="both", expand=True, padx=(0, 10))
+        # One card per registered model
+        for index, spec in enumerate(self.model_specs.values()):
+            card = self.create_model_card(
+                cards_container,
+                spec.title,
+                spec.description,
+                spec.model_name,
+                lambda key=spec.key: self.select_model_card(key),
+                key=spec.key
+            )
+            row, column = divmod(index, self.CARDS_PER_ROW)
+            card.grid(row=row, column=column, sticky="nsew", padx=(0, 10), pady=(0, 10))
+            self.model_cards[spec.key] = card
         
-        # Model 2 Card (Text to Image)
-        model2_card = self.create_model_card(
-            cards_container,
-            " Text to Image",
-            "Generate images from text descriptions",
-            "black-forest-labs/FLUX.1-dev",
-            lambda: self.select_model_card(2)
-        )
-        model2_card.pack(side="left", fill="both", expand=True)
+        for column in range(min(len(self.model_specs), self.CARDS_PER_ROW)):
+            cards_container.grid_columnconfigure(column, weight=1, uniform="cards")
         
-        self.model_cards = {1: model1_card, 2: model2_card}
+        self.update_readiness_badges()
     
-    def create_model_card(self, parent, title, description, model_name, command):
+    def create_model_card(self, parent, title, description, model_name, command, key=None):
         """Create a stylish model selection card"""
         card = tk.Frame(
             parent,
@@ -372,7 +847,16 @@ class AppGUI:
             bg=self.COLORS['bg_card'],
             fg=self.COLORS['text_secondary']
         )
-        model_label.pack(anchor="w", pady=(0, 10))
+        model_label.pack(anchor="w", pady=(0, 4))
+        
+        # Readiness badge, kept current by update_readiness_badges
+        readiness_label = tk.Label(
+            content_frame,
+            font=("Segoe UI", 9, "bold"),
+            bg=self.COLORS['bg_card']
+        )
+        readiness_label.pack(anchor="w", pady=(0, 10))
+        self.readiness_labels[key or model_name] = readiness_label
         
         # Select button
         select_btn = tk.Button(
@@ -393,59 +877,75 @@ class AppGUI:
         
         return card
     
-    def select_model_card(self, model_num):
+    def select_model_card(self, key):
         """Handle model selection with visual feedback"""
-        if model_num == 1:
-            self.selected_model = self.model1
-            # Highlight selected card
-            self.model_cards[1].configure(
-                highlightbackground=self.COLORS['success'],
-                highlightcolor=self.COLORS['success'],
-                highlightthickness=3
-            )
-            self.model_cards[2].configure(
-                highlightbackground=self.COLORS['border'],
-                highlightcolor=self.COLORS['border'],
-                highlightthickness=2
-            )
-            # Update main action button for Object Detection
-            if self.main_action_btn:
-                self.main_action_btn.config(
-                    text=" ACTION\n(Detect Objects)",
-                    bg=self.COLORS['success'],
-                    state=tk.NORMAL
-                )
-        else:
-            self.selected_model = self.model2
-            # Highlight selected card
-            self.model_cards[2].configure(
-                highlightbackground=self.COLORS['success'],
-                highlightcolor=self.COLORS['success'],
-                highlightthickness=3
-            )
-            self.model_cards[1].configure(
-                highlightbackground=self.COLORS['border'],
-                highlightcolor=self.COLORS['border'],
-                highlightthickness=2
+        spec = self.model_specs[key]
+        
+        # Warm the model while the user picks an input, and keep only the
+        # selected model alive
+        if self.selected_spec is not None and self.selected_spec.key != key:
+            self.warmer.stop(self.selected_spec.key)
+        self.warmer.warm(spec, keep_alive=True)
+        self.selected_spec = spec
+        self.selected_model = spec.load()
+        
+        # Highlight the selected card
+        for card_key, card in self.model_cards.items():
+            selected = card_key == key
+            card.configure(
+                highlightbackground=self.COLORS['success' if selected else 'border'],
+                highlightcolor=self.COLORS['success' if selected else 'border'],
+                highlightthickness=3 if selected else 2
             )
-            # Update main action button for Text-to-Image
-            if self.main_action_btn:
-                self.main_action_btn.config(
-                    text=" ACTION\n(Generate Image)",
-                    bg=self.COLORS['warning'],
-                    state=tk.NORMAL
-                )
         
+        self.update_action_button()
+        self.update_chain_options()
         self.display_model_info()
+        
+        if spec.input_type == "text":
+            first_step = "1. Type your text description in the input box"
+        else:
+            first_step = f"1. Click Browse File to select an {spec.input_type} file"
         messagebox.showinfo(
             "Model Selected", 
-            f"Model {model_num} has been loaded successfully!\n\n"
+            f"{spec.title.strip()} has been loaded successfully!\n\n"
             " Action button is now ready!\n\n"
             "Next steps:\n"
-            f"{'1. Click Browse Image to select a file' if model_num == 1 else '1. Type your text description in the input box'}\n"
+            f"{first_step}\n"
             "2. Click the ACTION button to run the model"
         )
     
+    def update_readiness_badges(self):
+        """Show each model's warm-up state on its card and schedule the next update"""
+        states = self.warmer.states()
+        for key, label in self.readiness_labels.items():
+            state, detail = states.get(key, (UNKNOWN, ""))
+            text, color = self.READINESS_BADGES[state]
+            if detail and state == LOADING:
+                text += f" ({detail})"
+            label.config(text=text, fg=self.COLORS[color])
+        self.root.after(self.READINESS_INTERVAL, self.update_readiness_badges)
+    
+    def update_action_button(self):
+        """Show the selected model's action, or Cancel while a job is running"""
+        if not self.main_action_btn or not self.selected_model:
+            return
+        if self.job_token is not None:
+            self.main_action_btn.config(
+                text=" CANCEL\n(Stop Current Job)",
+                bg=self.COLORS['danger'],
+                command=self.on_cancel_clicked,
+                state=tk.NORMAL
+            )
+        else:
+            model = self.selected_model
+            self.main_action_btn.config(
+                text=f" ACTION\n({model.action_label})",
+                bg=self.COLORS[self.ACTION_COLORS.get(model.input_type, 'primary')],
+                command=self.run_selected_model,
+                state=tk.NORMAL
+            )
+    
     def run_selected_model(self):
         """Run the currently selected model"""
         if not self.selected_model:
@@ -455,10 +955,41 @@ class AppGUI:
             )
             return
         
-        if self.selected_model == self.model1:
-            self.run_model1()
-        else:
-            self.run_model2()
+        if self.profile_next_run.get():
+            self.profile_next_run.set(False)
+            self.run_profiler = RunProfiler(self.selected_model.task.lower().replace(" ", "-"))
+            self.run_profiler.start()
+        
+        with self.profile_phase("input"):
+            if self.selected_model.input_type == "text":
+                self.run_text_model()
+            else:
+                self.run_file_model()
+        
+        # Input was rejected, so there is no job to wait for
+        if self.job_token is None:
+            self.finish_profile()
+    
+    def profile_phase(self, name):
+        """Context manager timing a phase of the profiled run, if there is one"""
+        if self.run_profiler is None:
+            return contextlib.nullcontext()
+        return self.run_profiler.phase(name)
+    
+    def finish_profile(self):
+        """Save the run profile and say where it went"""
+        if self.run_profiler is None:
+            return
+        profiler, self.run_profiler = self.run_profiler, None
+        profiler.stop()
+        paths = profiler.save()
+        self.output_display.insert(
+            tk.END,
+            f"\n\n Profile saved:\n"
+            f"  {paths['txt']} (summary)\n"
+            f"  {paths['prof']} (python -m pstats)\n"
+            f"  {paths['folded']} (flame graph stacks)"
+        )
     
     def create_input_section(self, parent):
         """Create enhanced input section"""
@@ -524,7 +1055,7 @@ class AppGUI:
         # Instructions label
         self.input_instruction_label = tk.Label(
             inner_frame,
-            text=" For Text-to-Image: Enter your text description below\n For Object Detection: Click 'Browse Image' to select an image file",
+            text=" For text models: Enter your text description below\n For image and audio models: Click 'Browse File' to select a file",
             font=("Segoe UI", 9),
             bg=self.COLORS['bg_card'],
             fg=self.COLORS['text_secondary'],
@@ -553,6 +1084,7 @@ class AppGUI:
             wrap=tk.WORD
         )
         self.input_entry.pack(side="left", fill="both", expand=True, padx=(0, 10))
+        self.input_entry.bind("<<Modified>>", self.on_prompt_modified)
         
         # Buttons container (vertical stack)
         buttons_container = tk.Frame(input_container, bg=self.COLORS['bg_card'])
@@ -561,8 +1093,8 @@ class AppGUI:
         # Browse button (for image selection)
         browse_btn = tk.Button(
             buttons_container,
-            text=" Browse Image",
-            command=self.browse_image,
+            text=" Browse File",
+            command=self.browse_file,
             font=("Segoe UI", 10, "bold"),
             bg=self.COLORS['secondary'],
             fg="white",
@@ -576,6 +1108,24 @@ class AppGUI:
         )
         browse_btn.pack(pady=(0, 8))
         
+        # Batch queue button (for many files at once)
+        queue_btn = tk.Button(
+            buttons_container,
+            text=" Queue Files",
+            command=self.show_batch_queue,
+            font=("Segoe UI", 10, "bold"),
+            bg=self.COLORS['secondary'],
+            fg="white",
+            relief=tk.FLAT,
+            padx=20,
+            pady=10,
+            cursor="hand2",
+            width=15,
+            activebackground=self.COLORS['primary'],
+            activeforeground="white"
+        )
+        queue_btn.pack(pady=(0, 8))
+        
         # ACTION button (main action button integrated here!)
         self.main_action_btn = tk.Button(
             buttons_container,
@@ -594,6 +1144,156 @@ class AppGUI:
             activeforeground="white"
         )
         self.main_action_btn.pack()
+        
+        self.create_chain_settings(inner_frame)
+        self.create_generation_settings(inner_frame)
+    
+    def create_chain_settings(self, parent):
+        """Create the row choosing a model to feed the result to"""
+        chain_frame = tk.Frame(parent, bg=self.COLORS['bg_card'])
+        chain_frame.pack(fill="x", pady=(15, 0))
+        
+        tk.Label(
+            chain_frame,
+            text="Then feed the result to:",
+            font=("Segoe UI", 10, "bold"),
+            bg=self.COLORS['bg_card'],
+            fg=self.COLORS['text_primary']
+        ).pack(side="left", padx=(0, 10))
+        
+        self.chain_menu = tk.OptionMenu(chain_frame, self.chain_var, self.NO_CHAIN)
+        self.chain_menu.config(
+            font=("Segoe UI", 10),
+            bg="white",
+            relief=tk.FLAT,
+            highlightthickness=1,
+            highlightbackground=self.COLORS['border']
+        )
+        self.chain_menu.pack(side="left")
+    
+    def update_chain_options(self):
+        """Offer the models that can take the selected model's result"""
+        producer = self.selected_spec.model_class
+        self.chain_specs = {
+            spec.title.strip(): spec for spec in self.model_specs.values()
+            if can_chain(producer, spec.model_class)
+        }
+        menu = self.chain_menu["menu"]
+        menu.delete(0, tk.END)
+        for title in [self.NO_CHAIN, *self.chain_specs]:
+            menu.add_command(label=title, command=lambda value=title: self.chain_var.set(value))
+        if self.chain_var.get() not in self.chain_specs:
+            self.chain_var.set(self.NO_CHAIN)
+    
+    def chained_spec(self):
+        """The spec of the model to feed the result to, or None"""
+        return self.chain_specs.get(self.chain_var.get())
+    
+    def create_generation_settings(self, parent):
+        """Create the Text-to-Image generation settings row"""
+        settings_frame = tk.Frame(parent, bg=self.COLORS['bg_card'])
+        settings_frame.pack(fill="x", pady=(15, 0))
+        
+        settings_label = tk.Label(
+            settings_frame,
+            text="Generation settings (Text-to-Image):",
+            font=("Segoe UI", 10, "bold"),
+            bg=self.COLORS['bg_card'],
+            fg=self.COLORS['text_primary']
+        )
+        settings_label.grid(row=0, column=0, columnspan=2, sticky="w", pady=(0, 5))
+        
+        # Draft is fast and low resolution, Final is full quality
+        for column, (value, text) in enumerate((("draft", "Draft (fast)"), ("final", "Final")), start=2):
+            tk.Radiobutton(
+                settings_frame,
+                text=text,
+                variable=self.generation_mode,
+                value=value,
+                font=("Segoe UI", 10),
+                bg=self.COLORS['bg_card'],
+                fg=self.COLORS['text_primary'],
+                selectcolor="white",
+                activebackground=self.COLORS['bg_card']
+            ).grid(row=0, column=column, sticky="w", padx=(0, 15), pady=(0, 5))
+        
+        # Show a quick draft while the final image renders
+        tk.Checkbutton(
+            settings_frame,
+            text="Progressive preview",
+            variable=self.progressive_var,
+            font=("Segoe UI", 10),
+            bg=self.COLORS['bg_card'],
+            fg=self.COLORS['text_primary'],
+            selectcolor="white",
+            activebackground=self.COLORS['bg_card']
+        ).grid(row=0, column=4, columnspan=2, sticky="w", pady=(0, 5))
+        
+        fields = [
+            ("Width", "width", 6),
+            ("Height", "height", 6),
+            ("Steps", "num_inference_steps", 5),
+            ("Guidance", "guidance_scale", 5),
+            ("Seed", "seed", 8),
+        ]
+        for column, (text, name, width) in enumerate(fields):
+            field_frame = tk.Frame(settings_frame, bg=self.COLORS['bg_card'])
+            field_frame.grid(row=1, column=column, sticky="w", padx=(0, 15))
+            tk.Label(
+                field_frame,
+                text=text,
+                font=("Segoe UI", 9),
+                bg=self.COLORS['bg_card'],
+                fg=self.COLORS['text_secondary']
+            ).pack(anchor="w")
+            tk.Entry(
+                field_frame,
+                textvariable=self.generation_vars[name],
+                width=width,
+                font=("Segoe UI", 10),
+                relief=tk.FLAT,
+                highlightthickness=1,
+                highlightbackground=self.COLORS['border']
+            ).pack(anchor="w")
+        
+        negative_frame = tk.Frame(settings_frame, bg=self.COLORS['bg_card'])
+        negative_frame.grid(row=2, column=0, columnspan=len(fields), sticky="we", pady=(8, 0))
+        tk.Label(
+            negative_frame,
+            text="Negative prompt",
+            font=("Segoe UI", 9),
+            bg=self.COLORS['bg_card'],
+            fg=self.COLORS['text_secondary']
+        ).pack(anchor="w")
+        tk.Entry(
+            negative_frame,
+            textvariable=self.generation_vars['negative_prompt'],
+            font=("Segoe UI", 10),
+            relief=tk.FLAT,
+            highlightthickness=1,
+            highlightbackground=self.COLORS['border']
+        ).pack(fill="x")
+    
+    def get_generation_params(self):
+        """Read the generation settings, converting numeric fields"""
+        converters = {
+            'width': int,
+            'height': int,
+            'num_inference_steps': int,
+            'guidance_scale': float,
+            'seed': int,
+        }
+        params = {'mode': self.generation_mode.get()}
+        for name, var in self.generation_vars.items():
+            value = var.get().strip()
+            if not value:
+                continue
+            convert = converters.get(name, str)
+            try:
+                params[name] = convert(value)
+            except ValueError:
+                raise ValueError(f"Invalid value for {name.replace('_', ' ')}: '{value}'")
+        return params
     
     def create_output_section(self, parent):
         """Create enhanced output section"""
@@ -634,6 +1334,9 @@ class AppGUI:
             wrap=tk.WORD
         )
         self.output_display.pack(fill="both", expand=True)
+        
+        # Image preview (packed once there is an image to show)
+        self.preview_label = tk.Label(output_container, bg=self.COLORS['bg_card'])
     
     def create_clear_button(self, parent):
         """Create clear output button"""
@@ -690,21 +1393,19 @@ class AppGUI:
         self.model_info_label.pack(fill="x")
 
 
-    def browse_image(self):
-        """Handle image file selection"""
+    def browse_file(self):
+        """Handle input file selection for the selected model"""
+        input_type = self.selected_model.input_type if self.selected_model else "image"
         file_path = filedialog.askopenfilename(
-            title="Select Image",
-            filetypes=[
-                ("Image Files", "*.png;*.jpg;*.jpeg;*.bmp;*.gif"),
-                ("All Files", "*.*")
-            ]
+            title=f"Select {input_type.title()}",
+            filetypes=self.FILE_TYPES.get(input_type, self.FILE_TYPES['image'])
         )
         if file_path:
             self.input_image_path.set(file_path)
             # Clear and update text input
             self.input_entry.delete("1.0", tk.END)
-            self.input_entry.insert("1.0", f"Selected image: {file_path}")
-            messagebox.showinfo("Image Selected", f"Image loaded successfully!\n\nPath: {file_path}\n\nClick the action button to extract text.")
+            self.input_entry.insert("1.0", f"Selected file: {file_path}")
+            messagebox.showinfo("File Selected", f"File loaded successfully!\n\nPath: {file_path}\n\nClick the action button to run the model.")
 
     def display_model_info(self):
         """Display information about the selected model"""
@@ -712,65 +1413,72 @@ class AppGUI:
             info = self.selected_model.get_info()
             self.model_info_label.config(text=info)
 
-    def run_model1(self):
-        """Run the Object Detection model"""
-        if not self.selected_model or self.selected_model != self.model1:
+    def run_file_model(self):
+        """Run the selected model on an image or audio file"""
+        input_type = self.selected_model.input_type
+        
+        input_data = self.get_input()
+        if not input_data or len(input_data.strip()) == 0:
             messagebox.showwarning(
-                "Wrong Model",
-                "Please select the Object Detection model first!"
+                "No Input Provided", 
+                f"Please browse and select an {input_type} file first!\n\nClick the ' Browse File' button to choose a file."
             )
             return
         
+        # Inspect the file once: the format check here, the cache key and the
+        # upload all use what is read now
+        model = self.selected_model
         try:
-            input_data = self.get_input()
-            if not input_data or len(input_data.strip()) == 0:
-                messagebox.showwarning(
-                    "No Input Provided", 
-                    "Please browse and select an image file first!\n\nClick the ' Browse Image' button to choose an image."
-                )
-                return
-            
-            # Validate it's a file path
-            import os
-            if not os.path.exists(input_data):
-                messagebox.showerror(
-                    "Invalid Image",
-                    f"The file does not exist:\n{input_data}\n\nPlease select a valid image file."
-                )
-                return
-            
-            # Show processing message
-            self.output_display.delete("1.0", tk.END)
-            self.output_display.insert(tk.END, "⏳ Analyzing image... Please wait...\n\nDetecting objects in the image...")
-            self.root.update()
-            
-            result = self.model1.run(input_data)
-            self.output_display.delete("1.0", tk.END)
-            
-            if result and len(str(result).strip()) > 0:
-                self.output_display.insert(
-                    tk.END,
-                    f" OBJECT DETECTION COMPLETED!\n\n"
-                    f"{'='*60}\n"
-                    f"{str(result)}\n"
-                    f"{'='*60}\n\n"
-                    f"Source: {input_data}"
-                )
-                messagebox.showinfo("Success!", "Objects detected successfully in the image!")
-            else:
-                self.output_display.insert(
-                    tk.END,
-                    " No objects were detected in the image.\n\n"
-                    "This could mean:\n"
-                    "• The image has no recognizable objects\n"
-                    "• The objects are too small or unclear\n"
-                    "• The image quality is too low\n\n"
-                    "Try using a clearer image with visible objects."
-                )
+            source = model.prepare_input(input_data)
+        except OSError:
+            messagebox.showerror(
+                f"Invalid {input_type.title()}",
+                f"The file does not exist:\n{input_data}\n\nPlease select a valid {input_type} file."
+            )
+            return
+        except UnsupportedInputError as e:
+            messagebox.showerror(f"Unsupported {input_type.title()}", str(e))
+            return
+        
+        if self.chained_spec() is not None:
+            self.start_chain(model, source)
+            return
+        if self.show_stored_result(model, source):
+            return
+        
+        # Show processing message
+        self.output_display.delete("1.0", tk.END)
+        self.output_display.insert(tk.END, f"⏳ Processing {input_type}... Please wait...\n\nRunning {self.selected_model.task}...")
+        
+        # The card that ran it, however the selection changes meanwhile
+        key = self.selected_spec.key
+        job_id = self.start_job()
+        self.submit_job(job_id, model.arun_model, source,
+                        callback=lambda f: self.on_model_done(f, key, model, source))
+    
+    def on_model_done(self, future, key, model, input_data):
+        """Render a model's result, or the error the request failed with
+
+        key is the spec of the card the request was made from.
+        """
+        self.finish_job()
+        self.output_display.delete("1.0", tk.END)
+        try:
+            result = future.result()
+            self.warmer.note_ready(key)
+            self.record_result(model, result, input_data)
+            self.render_result(model, result, input_data)
+        except DeadlineExceededError:
+            self.output_display.insert(
+                tk.END,
+                f" Error: The request timed out after {self.request_timeout} seconds.\n\n"
+                "The model may be loading or overloaded. Please try again in a few moments."
+            )
+            messagebox.showerror("Timed Out", f"The {model.task.lower()} request timed out.")
         except FileNotFoundError:
             self.output_display.delete("1.0", tk.END)
-            self.output_display.insert(tk.END, " Error: Image file not found!\n\nPlease select a valid image file.")
-            messagebox.showerror("File Not Found", "The selected image file could not be found.")
+            self.output_display.insert(tk.END, " Error: Input file not found!\n\nPlease select a valid file.")
+            messagebox.showerror("File Not Found", "The selected file could not be found.")
         except ValueError as ve:
             self.output_display.delete("1.0", tk.END)
             self.output_display.insert(tk.END, f" Validation Error:\n\n{str(ve)}\n\nPlease check your input and try again.")
@@ -782,106 +1490,486 @@ class AppGUI:
                 tk.END,
                 f" Error occurred:\n\n{error_msg}\n\n"
                 "Possible causes:\n"
-                "• Invalid image file or format\n"
+                "• Invalid file or format\n"
                 "• Network connectivity issues\n"
                 "• API service temporarily unavailable\n"
                 "• Model processing error\n\n"
                 "Troubleshooting:\n"
-                "1. Try a different image (PNG, JPG recommended)\n"
+                "1. Try a different file (PNG, JPG or WAV recommended)\n"
                 "2. Check your internet connection\n"
                 "3. Wait a moment and try again\n"
-                "4. Ensure image contains clear objects\n"
             )
-            messagebox.showerror("Error", f"Failed to process image:\n\n{error_msg}")
-
-    def run_model2(self):
-        """Run the Text-to-Image model"""
-        if not self.selected_model or self.selected_model != self.model2:
-            messagebox.showwarning(
-                "Wrong Model",
-                "Please select the Text-to-Image model first!"
+            messagebox.showerror("Error", f"Failed to process file:\n\n{error_msg}")
+    
+    def start_chain(self, model, input_data, params=None):
+        """Run the selected model and feed its result, in memory, to the chained model"""
+        next_spec = self.chained_spec()
+        next_model = next_spec.load()
+        pipeline = Pipeline([Stage(model, **(params or {})), Stage(next_model)])
+        # Both cards are ready once the chain succeeds
+        keys = (self.selected_spec.key, next_spec.key)
+        
+        self.output_display.delete("1.0", tk.END)
+        self.output_display.insert(
+            tk.END,
+            f"⏳ Running {model.task}, then {next_model.task}... Please wait...\n\n"
+            "The first result is passed straight to the second model."
+        )
+        job_id = self.start_job()
+        self.submit_job(job_id, pipeline.arun, input_data,
+                        callback=lambda f: self.on_chain_done(f, keys, pipeline, input_data))
+    
+    def on_chain_done(self, future, keys, pipeline, input_data):
+        """Keep every stage's result and display the last one"""
+        self.finish_job()
+        self.output_display.delete("1.0", tk.END)
+        
+        error = future.exception()
+        if isinstance(error, DeadlineExceededError):
+            self.output_display.insert(
+                tk.END,
+                f" Error: The chain timed out after {self.request_timeout} seconds.\n\n"
+                "A model may be loading or overloaded. Please try again in a few moments."
             )
+            messagebox.showerror("Timed Out", "The chained request timed out.")
+            return
+        if error is not None:
+            self.output_display.insert(tk.END, f" Error occurred:\n\n{str(error)}")
+            messagebox.showerror("Error", f"Failed to run the chain:\n\n{str(error)}")
             return
         
+        for key in keys:
+            self.warmer.note_ready(key)
+        results = future.result()
+        source = input_data
+        for position, (stage, result) in enumerate(zip(pipeline.stages, results)):
+            self.record_result(stage.model, result, source, stage.params)
+            if position == len(results) - 1:
+                break
+            if isinstance(result, ImageResult):
+                self.show_preview(result)
+            # Describe what the next model was given
+            if isinstance(result, str):
+                source = result
+            elif pipeline.stages[position + 1].model.input_type == 'text':
+                source = describe_detections(result)
+            else:
+                source = f"{stage.model.task} result for {source}"
+        
+        last = pipeline.stages[-1]
+        self.render_result(last.model, results[-1], source, last.params)
+        self.output_display.insert(
+            tk.END,
+            "\n\n Chain: " + " -> ".join(stage.model.task for stage in pipeline.stages)
+        )
+    
+    def record_result(self, model, result, source, params=None):
+        """Keep a successful result: searchable in the index, and in the result store"""
+        self.index_result(model, result, source)
+        key = model.result_key(source, **(params or {}))
+        # Encoding an image can take a moment, so store it off the Tk thread
+        self.runner.submit(asyncio.to_thread(self.result_store.put, key, result, model.model_name))
+    
+    def stored_result(self, model, source, params=None):
+        """The result of the same run kept in the result store, or None
+
+        Like the in-memory cache it is skipped when caching is off.
+        """
+        if not decorators.CACHE_ENABLED:
+            return None
         try:
-            input_data = self.get_input()
-            if not input_data or len(input_data.strip()) == 0:
-                messagebox.showwarning(
-                    "No Input Provided",
-                    "Please enter a text description first!\n\nType what you want to generate in the text box.\n\nExample: 'A cute robot reading a book in a cozy library'"
+            value = self.result_store.get(model.result_key(source, **(params or {})))
+        except (OSError, ValueError) as e:
+            print(f"[LOG] Could not read a stored result: {e}")
+            return None
+        if value is None:
+            return None
+        # Give the renderers what the model itself would have returned
+        if model.renderer == 'image':
+            return IMAGE_STORE.add(value)
+        if model.renderer == 'detections':
+            return ObjectDetectionOutputElement.parse_obj_as_list(value)
+        return value
+    
+    def show_stored_result(self, model, source, params=None):
+        """Render a stored result of this run; returns False if there is none"""
+        result = self.stored_result(model, source, params)
+        if result is None:
+            return False
+        self.output_display.delete("1.0", tk.END)
+        self.render_result(model, result, source, params)
+        self.output_display.insert(tk.END, "\n\n Shown from the result store; the model was not called.")
+        return True
+    
+    def index_result(self, model, result, source):
+        """Add a result to the search index"""
+        source = str(source)
+        if model.renderer == 'image':
+            # The prompt is what describes a generated image
+            self.search_index.add("prompt", model.model_name, "", source)
+        elif model.renderer == 'detections':
+            labels = " ".join(detection.label for detection in result)
+            self.search_index.add("detections", model.model_name, source, labels)
+        else:
+            kind = "transcript" if model.input_type == 'audio' else model.task.lower()
+            self.search_index.add(kind, model.model_name, source, str(result).strip())
+    
+    def render_result(self, model, result, source, params=None):
+        """Display a result with the renderer the model declares"""
+        renderers = {
+            'detections': self.render_detections,
+            'image': self.render_image,
+            'text': self.render_text,
+        }
+        renderers[model.renderer](result, source, params)
+    
+    def render_detections(self, result, source, params=None):
+        """Display detected objects with their scores and boxes"""
+        if result and len(str(result).strip()) > 0:
+            lines = []
+            for detection in result:
+                box = detection.box
+                lines.append(
+                    f"• {detection.label:<20} {detection.score:6.1%}   "
+                    f"box=({box.xmin}, {box.ymin}, {box.xmax}, {box.ymax})"
                 )
+            self.output_display.insert(
+                tk.END,
+                f" OBJECT DETECTION COMPLETED!\n\n"
+                f"{'='*60}\n"
+                + "\n".join(lines) + "\n"
+                f"{'='*60}\n\n"
+                f"Source: {source}"
+            )
+            messagebox.showinfo("Success!", "Objects detected successfully in the image!")
+        else:
+            self.output_display.insert(
+                tk.END,
+                " No objects were detected in the image.\n\n"
+                "This could mean:\n"
+                "• The image has no recognizable objects\n"
+                "• The objects are too small or unclear\n"
+                "• The image quality is too low\n\n"
+                "Try using a clearer image with visible objects."
+            )
+    
+    def render_text(self, result, source, params=None):
+        """Display a text result such as a transcript"""
+        self.output_display.insert(
+            tk.END,
+            f" MODEL OUTPUT READY!\n\n"
+            f"{'='*60}\n"
+            f"{str(result).strip()}\n"
+            f"{'='*60}\n\n"
+            f"Source: {source}"
+        )
+
+    def run_text_model(self):
+        """Run the selected model on the text prompt"""
+        input_data = self.get_input()
+        if not input_data or len(input_data.strip()) == 0:
+            messagebox.showwarning(
+                "No Input Provided",
+                "Please enter a text description first!\n\nType what you want to generate in the text box.\n\nExample: 'A cute robot reading a book in a cozy library'"
+            )
+            return
+        
+        # Make sure it's not an image path
+        if input_data.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.gif')):
+            messagebox.showwarning(
+                "Wrong Input Type",
+                f"For {self.selected_model.task}, please enter a TEXT DESCRIPTION, not a file!\n\nClear the input and type your description."
+            )
+            return
+        
+        model = self.selected_model
+        if not isinstance(model, TextToImageModel):
+            if self.chained_spec() is not None:
+                self.start_chain(model, input_data)
                 return
-            
-            # Make sure it's not an image path
-            if input_data.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.gif')):
-                messagebox.showwarning(
-                    "Wrong Input Type",
-                    "For Text-to-Image, please enter a TEXT DESCRIPTION, not an image file!\n\nClear the input and type your description."
-                )
+            if self.show_stored_result(model, input_data):
                 return
-            
-            # Show processing message
             self.output_display.delete("1.0", tk.END)
+            self.output_display.insert(tk.END, f"⏳ Running {model.task}... Please wait...")
+            key = self.selected_spec.key
+            job_id = self.start_job()
+            self.submit_job(job_id, model.arun_model, input_data,
+                            callback=lambda f: self.on_model_done(f, key, model, input_data))
+            return
+        
+        try:
+            params = self.get_generation_params()
+        except ValueError as ve:
+            messagebox.showerror("Validation Error", str(ve))
+            return
+        
+        if self.chained_spec() is not None:
+            self.start_chain(model, input_data, params)
+            return
+        if self.show_stored_result(model, input_data, params):
+            return
+        self.start_generation(model, input_data, params)
+    
+    def start_generation(self, model, prompt, params):
+        """Launch the final job, plus a cheap draft preview when progressive mode is on"""
+        job_id = self.start_job()
+        self.generation_prompt = prompt
+        
+        progressive = self.progressive_var.get() and params['mode'] != "draft"
+        
+        # Show processing message
+        self.output_display.delete("1.0", tk.END)
+        self.output_display.insert(
+            tk.END,
+            f" Generating image ({params['mode']} mode)... This may take 10-30 seconds...\n\n"
+            f"Your prompt: '{prompt}'\n\n"
+            + (" A quick draft preview will appear first.\n\n" if progressive else "")
+            + "Please wait while the AI creates your image..."
+        )
+        
+        key = self.selected_spec.key
+        final_future = self.submit_job(job_id, model.arun_model, prompt,
+                                       callback=lambda f: self.on_generation_done(f, key, model, prompt, params),
+                                       **params)
+        
+        if progressive:
+            self.submit_job(job_id, model.arun_model, prompt,
+                            callback=lambda f: self.on_draft_done(f, final_future),
+                            **self.draft_params(params))
+    
+    def draft_params(self, params):
+        """The draft of a generation: the user's seed, guidance and negative
+        prompt, with the size and step count of the draft preset"""
+        draft_params = dict(params, mode="draft")
+        for name in ("width", "height", "num_inference_steps"):
+            draft_params.pop(name, None)
+        return draft_params
+    
+    def start_job(self):
+        """Begin a new background job, cancelling any job still running"""
+        self.cancel_job()
+        self.job_token = CancelToken(self.request_timeout)
+        self.update_action_button()
+        return self.job_id
+    
+    def submit_job(self, job_id, func, *args, callback, **kwargs):
+        """Run the coroutine function func on the event loop under the current job's cancel token"""
+        coro = func(*args, cancel_token=self.job_token, **kwargs)
+        if self.run_profiler is not None:
+            coro = self.run_profiler.profile_coroutine(coro, "model")
+        future = self.runner.submit(coro)
+        self.job_futures.append(future)
+        self.watch_future(future, job_id, callback)
+        return future
+    
+    def finish_job(self):
+        """End the current job, stopping any request of it that is still running"""
+        if self.job_token is not None:
+            self.job_token.cancel()
+            self.job_token.release()
+        for future in self.job_futures:
+            future.cancel()
+        self.job_token = None
+        self.job_futures = []
+        self.generation_prompt = None
+        self.update_action_button()
+    
+    def cancel_job(self):
+        """Cancel the running job and ignore any results it still delivers"""
+        self.job_id += 1
+        self.finish_job()
+    
+    def on_cancel_clicked(self):
+        """Handle the Cancel button shown while a job runs"""
+        self.cancel_job()
+        self.output_display.delete("1.0", tk.END)
+        self.output_display.insert(tk.END, "Job cancelled. Ready for next operation.")
+        self.finish_profile()
+    
+    def watch_future(self, future, job_id, callback):
+        """Poll a background future from the Tk loop and run callback when it finishes"""
+        if job_id != self.job_id:
+            return
+        if not future.done():
+            self.root.after(100, self.watch_future, future, job_id, callback)
+            return
+        if not future.cancelled():
+            with self.profile_phase("render"):
+                callback(future)
+            if self.job_token is None:
+                self.finish_profile()
+    
+    def on_prompt_modified(self, event=None):
+        """Cancel the running generation when the user edits its prompt"""
+        if not self.input_entry.edit_modified():
+            return
+        self.input_entry.edit_modified(False)
+        if self.generation_prompt is not None and self.get_input() != self.generation_prompt:
+            self.cancel_job()
+            self.output_display.delete("1.0", tk.END)
+            self.output_display.insert(tk.END, "Prompt changed - generation cancelled.")
+            self.finish_profile()
+        self.schedule_speculation()
+    
+    def schedule_speculation(self, delay=None):
+        """Request a draft of the prompt once typing pauses, stopping the one
+        requested for an earlier version of it"""
+        if self.pending_speculation is not None:
+            self.root.after_cancel(self.pending_speculation)
+            self.pending_speculation = None
+        self.speculator.cancel(self.get_input())
+        if not self.speculate_var.get() or not isinstance(self.selected_model, TextToImageModel):
+            return
+        if delay is None:
+            delay = self.settings.config["speculation.delay"]
+        self.pending_speculation = self.root.after(int(delay * 1000), self.speculate)
+    
+    def speculate(self):
+        """Request the draft Generate would show first, or the image itself in draft mode"""
+        self.pending_speculation = None
+        model = self.selected_model
+        prompt = self.get_input()
+        # A running job has the network to itself, and a file is no prompt
+        if (self.job_token is not None or not isinstance(model, TextToImageModel)
+                or not prompt or self.input_image_path.get()):
+            return
+        try:
+            params = self.get_generation_params()
+        except ValueError:
+            return
+        # Without a draft to show first, a final image would not be sped up
+        if params['mode'] != "draft" and not self.progressive_var.get():
+            return
+        wait = self.speculator.wait_time()
+        if wait > 0:
+            # Rate limited: try again when allowed, with whatever the prompt is then
+            self.schedule_speculation(wait)
+            return
+        if self.speculator.start(model, prompt, timeout=self.request_timeout, **self.draft_params(params)):
+            print(f"[LOG] Drafting ahead: '{prompt[:60]}'")
+    
+    def cancel_speculation(self):
+        """Stop the draft requested while typing, and any about to be requested"""
+        if self.pending_speculation is not None:
+            self.root.after_cancel(self.pending_speculation)
+            self.pending_speculation = None
+        self.speculator.cancel()
+    
+    def on_draft_done(self, future, final_future):
+        """Show the draft preview unless the final image already arrived"""
+        if final_future.done() or future.exception() is not None:
+            return
+        draft = future.result()
+        if not hasattr(draft, 'size'):
+            return
+        self.show_preview(draft)
+        self.output_display.delete("1.0", tk.END)
+        self.output_display.insert(
+            tk.END,
+            f" Draft preview ready ({draft.size[0]} x {draft.size[1]} pixels)\n\n"
+            f"Your prompt: '{self.generation_prompt}'\n\n"
+            " Refining the full-quality image..."
+        )
+    
+    def on_generation_done(self, future, key, model, input_data, params):
+        """Save and display the final image, replacing any draft preview"""
+        self.finish_job()
+        self.output_display.delete("1.0", tk.END)
+        
+        error = future.exception()
+        if isinstance(error, DeadlineExceededError):
             self.output_display.insert(
                 tk.END,
-                " Generating image... This may take 10-30 seconds...\n\n"
-                f"Your prompt: '{input_data}'\n\n"
-                "Please wait while the AI creates your image..."
+                f" Error: The request timed out after {self.request_timeout} seconds.\n\n"
+                "The model may be loading or overloaded. Please try again in a few moments."
             )
-            self.root.update()
-            
-            result = self.model2.run(input_data)
-            self.output_display.delete("1.0", tk.END)
-            
-            # Check if result is a PIL Image object
-            if hasattr(result, 'save') and hasattr(result, 'size'):
-                # Save and display image
-                output_path = "output_image.png"
-                result.save(output_path)
-                self.output_display.insert(
-                    tk.END,
-                    f" IMAGE GENERATED SUCCESSFULLY!\n\n"
-                    f"{'='*60}\n"
-                    f" Saved as: {output_path}\n"
-                    f" Size: {result.size[0]} x {result.size[1]} pixels\n"
-                    f" Prompt: {input_data}\n"
-                    f"{'='*60}\n\n"
-                    f" Your image has been saved in the current directory!\n"
-                    f"You can find it at: {output_path}"
-                )
-                messagebox.showinfo(
-                    "Success!",
-                    f"Image generated and saved successfully!\n\n"
-                    f" File: {output_path}\n"
-                    f" Size: {result.size[0]} x {result.size[1]} pixels\n\n"
-                    f"Check the application folder to view your image!"
-                )
-            else:
-                self.output_display.insert(tk.END, f"Generated result:\n\n{str(result)}")
-        except Exception as e:
-            self.output_display.delete("1.0", tk.END)
+            messagebox.showerror("Timed Out", "The image generation request timed out.")
+            return
+        if error is not None:
             self.output_display.insert(
                 tk.END,
-                f" Error occurred:\n\n{str(e)}\n\n"
+                f" Error occurred:\n\n{str(error)}\n\n"
                 "Common issues:\n"
                 "• Network connectivity problems\n"
                 "• API rate limits\n"
                 "• Invalid API token\n\n"
                 "Please try again in a few moments."
             )
-            messagebox.showerror("Error", f"Failed to generate image:\n\n{str(e)}")
+            messagebox.showerror("Error", f"Failed to generate image:\n\n{str(error)}")
+            return
+        
+        self.warmer.note_ready(key)
+        self.record_result(model, future.result(), input_data, params)
+        self.render_image(future.result(), input_data, params)
+        self.flag_repeated_image(future.result(), input_data)
+    
+    def flag_repeated_image(self, image, prompt):
+        """Note in the output when a generated image nearly repeats an earlier one"""
+        if not hasattr(image, 'size'):
+            return
+        # The thumbnail hashes the same as the full image without reading it back
+        hash_value = phash(image.thumbnail if isinstance(image, ImageResult) else image)
+        earlier = self.generated_images.find(hash_value)
+        self.generated_images.add(hash_value, prompt)
+        if earlier is not None:
+            self.output_display.insert(
+                tk.END,
+                f"\n\n Nearly identical to the image generated for: '{earlier}'"
+            )
+    
+    def render_image(self, result, source, params=None):
+        """Save and display a generated image"""
+        # Check if result is a PIL Image object
+        if hasattr(result, 'save') and hasattr(result, 'size'):
+            # Save and display image
+            output_path = self.settings.config["output.image_path"]
+            result.save(output_path)
+            self.show_preview(result)
+            self.output_display.insert(
+                tk.END,
+                f" IMAGE GENERATED SUCCESSFULLY!\n\n"
+                f"{'='*60}\n"
+                f" Saved as: {output_path}\n"
+                f" Size: {result.size[0]} x {result.size[1]} pixels\n"
+                f" Mode: {(params or {}).get('mode', 'default')}\n"
+                f" Prompt: {source}\n"
+                f"{'='*60}\n\n"
+                f" Your image has been saved in the current directory!\n"
+                f"You can find it at: {output_path}"
+            )
+            messagebox.showinfo(
+                "Success!",
+                f"Image generated and saved successfully!\n\n"
+                f" File: {output_path}\n"
+                f" Size: {result.size[0]} x {result.size[1]} pixels\n\n"
+                f"Check the application folder to view your image!"
+            )
+        else:
+            self.output_display.insert(tk.END, f"Generated result:\n\n{str(result)}")
+    
+    def show_preview(self, image):
+        """Show a scaled-down copy of an image below the output text"""
+        if isinstance(image, ImageResult):
+            # The handle's thumbnail is big enough, and never needs the full pixels
+            image = image.thumbnail
+        preview = image.copy()
+        preview.thumbnail(self.PREVIEW_SIZE)
+        # Keep a reference so Tk does not discard the image
+        self.preview_photo = ImageTk.PhotoImage(preview)
+        self.preview_label.config(image=self.preview_photo)
+        self.preview_label.pack(anchor="w", pady=(10, 0))
 
     def get_input(self):
-        """Get input from the text widget or image path"""
-        # Check if we have an image path set
+        """Get input from the text widget or selected file path"""
+        # Check if we have a file path set
         image_path = self.input_image_path.get()
         if image_path:
             return image_path
         
         # Otherwise get text from the text widget
         text_content = self.input_entry.get("1.0", tk.END).strip()
-        # Remove the "Selected image:" prefix if present
-        if text_content.startswith("Selected image:"):
+        # Remove the "Selected file:" prefix if present
+        if text_content.startswith("Selected file:"):
             return self.input_image_path.get()
         return text_content
 
@@ -893,10 +1981,3 @@ class AppGUI:
     def run(self):
         """Start the GUI main loop"""
         self.root.mainloop()
-
-
-
-
-
-
-
@@ -0,0 +1,89 @@
+import sys
+import threading
+from collections import defaultdict, deque, namedtuple
+
+from cancellation import CancelledError
+
+# Where a request can be sent: an inference provider ("hf-inference",
+# "fal-ai", ...; None for the client default) and the model to ask there
+# (None for the model's own)
+Route = namedtuple("Route", ["provider", "model"])
+
+# Successful request latencies remembered per route
+LATENCY_WINDOW = 200
+# Samples needed before the observed p95 replaces HEDGE_DEFAULT_DELAY
+MIN_SAMPLES = 10
+# Seconds to wait for a route before hedging to the next one
+HEDGE_DEFAULT_DELAY = 10.0
+HEDGE_MIN_DELAY = 0.5
+
+# HTTP statuses worth trying elsewhere: rate limits and, from 500 up, server errors
+_RETRY_STATUSES = {429}
+# Connection and timeout errors of the HTTP libraries Hub clients use, by
+# module and class name
+_TRANSPORT_ERRORS = (
+    ("httpx", "TransportError"),
+    ("httpx2", "TransportError"),
+    ("requests", "ConnectionError"),
+    ("requests", "Timeout"),
+    ("aiohttp", "ClientConnectionError"),
+)
+
+
+class LatencyTracker:
+    """Rolling window of successful request latencies for each route"""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.window = window
+        self._samples = defaultdict(lambda: deque(maxlen=self.window))
+        self._lock = threading.Lock()
+
+    def record(self, key, seconds):
+        with self._lock:
+            self._samples[key].append(seconds)
+
+    def percentile(self, key, q):
+        """The q-th percentile (0-100) of recent latencies, or None with too few samples"""
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if len(samples) < MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * q / 100))]
+
+    def hedge_delay(self, key):
+        """Seconds after which a request on key is slower than 95% of recent ones"""
+        p95 = self.percentile(key, 95)
+        if p95 is None:
+            return HEDGE_DEFAULT_DELAY
+        return max(HEDGE_MIN_DELAY, p95)
+
+
+# Shared so every instance of a model learns from the same traffic
+LATENCIES = LatencyTracker()
+
+
+def can_fall_back(error):
+    """Whether another route might succeed where this error happened
+
+    Only failures of the route itself count: lost connections, timeouts,
+    rate limits and server errors. Anything else, a rejected input or a bug
+    of ours, would fail the same way everywhere.
+    """
+    if isinstance(error, CancelledError):
+        return False
+    # A replayed failure says what the original was
+    retryable = getattr(error, "retryable", None)
+    if retryable is not None:
+        return retryable
+    # Hub errors carry the response; aiohttp's carry just the status
+    status = getattr(getattr(error, "response", None), "status_code", None) or getattr(error, "status", None)
+    if isinstance(status, int):
+        return status in _RETRY_STATUSES or 500 <= status < 600
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    # A library that was never imported cannot have raised
+    for module_name, name in _TRANSPORT_ERRORS:
+        module = sys.modules.get(module_name)
+        if module is not None and isinstance(error, getattr(module, name, ())):
+            return True
+    return False
@@ -0,0 +1,184 @@
+import io
+import threading
+import weakref
+
+import numpy as np
+from PIL import Image
+
+# Side of the grayscale thumbnail each hash is computed from
+AHASH_SIZE = 8
+PHASH_SIZE = 32
+# Low-frequency DCT coefficients kept by phash (8x8 = 64 bits)
+PHASH_BITS = 8
+
+# Every NearDuplicateIndex, so clear_indexes() can reach them all
+_indexes = weakref.WeakSet()
+
+
+def fingerprint(source):
+    """(phash, (width, height)) of an image, path or bytes; None if it is not an image"""
+    if isinstance(source, Image.Image):
+        return phash(source), source.size
+    try:
+        image = Image.open(io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source)
+        size = image.size
+        # JPEGs can decode straight to a reduced size, which is all a hash needs
+        image.draft("L", (PHASH_SIZE * 2, PHASH_SIZE * 2))
+        image.load()
+    except (OSError, ValueError):
+        return None
+    return phash(image), size
+
+def _grayscale(image, size):
+    return np.asarray(image.convert("L").resize((size, size), Image.LANCZOS), dtype=np.float64)
+
+def _to_int(bits):
+    return int("".join("1" if bit else "0" for bit in bits.ravel()), 2)
+
+def ahash(image):
+    """64-bit average hash: each pixel of an 8x8 thumbnail against the mean"""
+    pixels = _grayscale(image, AHASH_SIZE)
+    return _to_int(pixels > pixels.mean())
+
+def _dct_matrix(n):
+    k = np.arange(n)
+    matrix = np.cos(np.pi * (2 * k[None, :] + 1) * k[:, None] / (2 * n)) * np.sqrt(2 / n)
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+_DCT = _dct_matrix(PHASH_SIZE)
+
+def phash(image):
+    """64-bit perceptual hash from the low frequencies of a 2D DCT
+
+    Robust to re-encoding, resizing and small colour changes, which is
+    what makes two copies of a photo land within a few bits of each other.
+    """
+    pixels = _grayscale(image, PHASH_SIZE)
+    low = (_DCT @ pixels @ _DCT.T)[:PHASH_BITS, :PHASH_BITS]
+    # The DC term is the overall brightness, so leave it out of the median
+    return _to_int(low > np.median(low.ravel()[1:]))
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+class BKTree:
+    """Burkhard-Keller tree over integer hashes under Hamming distance
+
+    Searching for hashes within d of a query only visits children whose edge
+    distance is within d of the query's distance to the node, by the
+    triangle inequality, instead of comparing against every stored hash.
+    """
+
+    def __init__(self):
+        self._root = None
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def add(self, hash_value, item):
+        self._size += 1
+        if self._root is None:
+            self._root = (hash_value, [item], {})
+            return
+        node = self._root
+        while True:
+            distance = hamming(hash_value, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = (hash_value, [item], {})
+                return
+            node = child
+
+    def search(self, hash_value, max_distance):
+        """Return (distance, item) pairs within max_distance, closest first"""
+        found = []
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node = stack.pop()
+            distance = hamming(hash_value, node[0])
+            if distance <= max_distance:
+                found.extend((distance, item) for item in node[1])
+            for edge, child in node[2].items():
+                if distance - max_distance <= edge <= distance + max_distance:
+                    stack.append(child)
+        found.sort(key=lambda pair: pair[0])
+        return found
+
+
+class NearDuplicateIndex:
+    """Thread-safe map from perceptual hashes to values, looked up by similarity
+
+    Keeps at most max_entries values; past that the oldest half is dropped,
+    since a BK-tree cannot remove entries in place.
+    """
+
+    def __init__(self, max_distance=4, max_entries=10000):
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        self._tree = BKTree()
+        self._entries = []
+        self._lock = threading.Lock()
+        _indexes.add(self)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def find(self, hash_value):
+        """The value stored under the closest hash within max_distance, or None"""
+        with self._lock:
+            matches = self._tree.search(hash_value, self.max_distance)
+        return matches[0][1] if matches else None
+
+    def clear(self):
+        with self._lock:
+            self._entries = []
+            self._tree = BKTree()
+
+    def add(self, hash_value, value):
+        with self._lock:
+            self._entries.append((hash_value, value))
+            self._tree.add(hash_value, value)
+            if len(self._entries) > self.max_entries:
+                self._entries = self._entries[len(self._entries) // 2:]
+                self._tree = BKTree()
+                for entry_hash, entry_value in self._entries:
+                    self._tree.add(entry_hash, entry_value)
+
+
+def clear_indexes():
+    """Forget what every NearDuplicateIndex holds"""
+    for index in list(_indexes):
+        index.clear()
+
+
+def find_duplicates(images, max_distance=4):
+    """Group near-identical images, e.g. the outputs of a generation batch
+
+    Returns lists of indexes into images, one list per group of two or
+    more; images that cannot be opened are skipped.
+    """
+    tree = BKTree()
+    hashes = {}
+    for i, source in enumerate(images):
+        found = fingerprint(source)
+        if found is not None:
+            hashes[i] = found[0]
+            tree.add(hashes[i], i)
+
+    groups = []
+    grouped = set()
+    for i, hash_value in hashes.items():
+        if i in grouped:
+            continue
+        group = sorted(j for _, j in tree.search(hash_value, max_distance) if j not in grouped)
+        grouped.update(group)
+        if len(group) > 1:
+            groups.append(group)
+    return groups
@@ -0,0 +1,205 @@
+import io
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import uuid
+import weakref
+from collections import OrderedDict
+
+from PIL import Image
+
+# Decoded pixels kept in memory across all image results before the least
+# recently used ones are written to disk
+RESULT_MEMORY_BUDGET = 256 * 1024 * 1024
+# Largest size of the thumbnail a handle keeps in memory, JPEG encoded so
+# it costs tens of kilobytes rather than most of a megabyte of pixels
+THUMBNAIL_SIZE = (512, 512)
+THUMBNAIL_QUALITY = 85
+# Fast lossless compression for spilled images; they are read back, not shipped
+SPILL_COMPRESS_LEVEL = 1
+
+
+class ImageResult:
+    """Compact handle to a generated image that may live in memory or on disk
+
+    Only the pixel data is spilled; the size, mode, source format and a
+    small thumbnail stay in memory so the GUI can show a preview and the
+    server can describe the image without reading it back.
+    """
+
+    def __init__(self, image, store):
+        self.size = image.size
+        self.mode = image.mode
+        self.format = image.format or "PNG"
+        thumbnail = image.copy()
+        thumbnail.thumbnail(THUMBNAIL_SIZE)
+        buffer = io.BytesIO()
+        thumbnail.convert("RGB").save(buffer, format="JPEG", quality=THUMBNAIL_QUALITY)
+        self._thumbnail = buffer.getvalue()
+        self.path = None
+        self._image = image
+        self._store = store
+        self._key = None
+
+    @property
+    def nbytes(self):
+        """Bytes the decoded pixels take in memory"""
+        # PIL pads 3-band images such as RGB to 4 bytes per pixel
+        if self.mode in ("1", "L", "P"):
+            pixel = 1
+        elif self.mode.startswith("I;16"):
+            pixel = 2
+        else:
+            pixel = 4
+        return self.size[0] * self.size[1] * pixel
+
+    @property
+    def thumbnail(self):
+        """A decoded copy of the thumbnail, at most THUMBNAIL_SIZE"""
+        return Image.open(io.BytesIO(self._thumbnail))
+
+    @property
+    def in_memory(self):
+        return self._image is not None
+
+    def open(self):
+        """The full image, read back from disk if it was spilled"""
+        image = self._image
+        if image is not None:
+            self._store.touch(self)
+            return image
+        image = Image.open(self.path)
+        image.load()
+        return image
+
+    def save(self, fp, format=None, **params):
+        """Save like PIL's Image.save, copying the spill file when it already fits"""
+        image = self._image
+        if image is not None:
+            image.save(fp, format=format, **params)
+            return
+        if isinstance(fp, (str, os.PathLike)) and not params and (format or "").upper() in ("", "PNG") \
+                and os.path.splitext(fp)[1].lower() == ".png":
+            shutil.copyfile(self.path, fp)
+            return
+        with Image.open(self.path) as spilled:
+            spilled.save(fp, format=format, **params)
+
+    def spill(self, directory):
+        """Write the pixels to disk and drop them from memory"""
+        image = self._image
+        if image is None:
+            return
+        path = os.path.join(directory, f"{uuid.uuid4().hex}.png")
+        image.save(path, format="PNG", compress_level=SPILL_COMPRESS_LEVEL)
+        self.path = path
+        # Drop rather than close(): a caller of open() may still be using it
+        self._image = None
+
+    def __del__(self):
+        # The spill file is only reachable through this handle
+        if self.path is not None:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+
+class ImageStore:
+    """Keeps image results under a memory budget, spilling the oldest to disk
+
+    Resident handles are held weakly, so pixels of a result nobody refers
+    to any more are freed at once instead of waiting to be spilled.
+    """
+
+    def __init__(self, budget=RESULT_MEMORY_BUDGET, directory=None):
+        self.budget = budget
+        self._directory = directory
+        self._resident = OrderedDict()
+        self._resident_bytes = 0
+        self._next_key = 0
+        # Reentrant because a handle's weakref callback can run inside add()
+        self._lock = threading.RLock()
+
+    @property
+    def directory(self):
+        if self._directory is None:
+            self._directory = tempfile.mkdtemp(prefix="ai_studio_results_")
+            weakref.finalize(self, shutil.rmtree, self._directory, True)
+        return self._directory
+
+    @property
+    def resident_bytes(self):
+        return self._resident_bytes
+
+    def add(self, image):
+        """Wrap a PIL image in a handle, spilling older images to stay in budget"""
+        result = ImageResult(image, self)
+        with self._lock:
+            key = self._next_key
+            self._next_key += 1
+            result._key = key
+            self._resident[key] = (weakref.ref(result, lambda ref: self._forget(key)), result.nbytes)
+            self._resident_bytes += result.nbytes
+            spill = self._over_budget()
+        self._spill(spill)
+        return result
+
+    def touch(self, result):
+        with self._lock:
+            if result._key in self._resident:
+                self._resident.move_to_end(result._key)
+
+    def set_budget(self, budget):
+        with self._lock:
+            self.budget = budget
+            spill = self._over_budget()
+        self._spill(spill)
+
+    def _forget(self, key):
+        with self._lock:
+            entry = self._resident.pop(key, None)
+            if entry is not None:
+                self._resident_bytes -= entry[1]
+
+    def _over_budget(self):
+        """Take least recently used handles off the resident list until in budget"""
+        spill = []
+        while self._resident_bytes > self.budget and self._resident:
+            _, (ref, nbytes) = self._resident.popitem(last=False)
+            self._resident_bytes -= nbytes
+            result = ref()
+            if result is not None:
+                spill.append(result)
+        return spill
+
+    def _spill(self, results):
+        # Encoding is slow, so it happens outside the lock
+        for result in results:
+            result.spill(self.directory)
+
+
+# Shared by every model so the budget covers all results together
+IMAGE_STORE = ImageStore()
+
+
+def process_rss():
+    """Resident set size of this process in bytes, or None where it is unknown"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    if sys.platform != "win32":
+        import resource
+        # Peak rather than current, the best available without /proc
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    return None
@@ -0,0 +1,464 @@
+import asyncio
+import io
+import itertools
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import decorators
+from async_runtime import get_runner
+from cancellation import CancelToken
+from decorators import acache_result, cache_result, clear_result_cache
+from image_hashes import clear_indexes
+from models import AIModel
+from warmup import silent_wav
+
+# Seconds each load level runs unless the caller asks otherwise
+LOAD_DURATION = 10.0
+# Different inputs a workload cycles through; with the cache on, every
+# input after the first round is a repeat
+DISTINCT_INPUTS = 50
+# A concurrency level saturates the setup once it reaches this share of the
+# best throughput of its sweep
+SATURATION_SHARE = 0.95
+# Percentiles shown in the report
+REPORT_PERCENTILES = (50, 90, 99, 99.9)
+
+
+class LatencyHistogram:
+    """Latency histogram in the style of HdrHistogram
+
+    Values are counted in log-linear buckets: exact below 256 units, then
+    128 buckets per power of two, so every recorded value is kept to within
+    1% in a few thousand counters whatever the number of samples. The unit
+    is a microsecond and values are capped at an hour.
+    """
+
+    SUB_BUCKET_BITS = 7
+    UNIT = 1e-6
+    MAX_SECONDS = 3600
+
+    def __init__(self):
+        self._sub_buckets = 1 << self.SUB_BUCKET_BITS
+        self.counts = [0] * (self._index(int(self.MAX_SECONDS / self.UNIT)) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self._lock = threading.Lock()
+
+    def _index(self, value):
+        if value < 2 * self._sub_buckets:
+            return value
+        shift = value.bit_length() - self.SUB_BUCKET_BITS - 1
+        return (shift + 1) * self._sub_buckets + (value >> shift) - self._sub_buckets
+
+    def _bucket_value(self, index):
+        """The middle of the values counted in a bucket, in seconds"""
+        if index < 2 * self._sub_buckets:
+            return index * self.UNIT
+        shift = index // self._sub_buckets - 1
+        top = index % self._sub_buckets + self._sub_buckets
+        return ((top << shift) + (1 << shift) / 2) * self.UNIT
+
+    def record(self, seconds):
+        value = min(max(int(seconds / self.UNIT), 0), int(self.MAX_SECONDS / self.UNIT))
+        with self._lock:
+            self.counts[self._index(value)] += 1
+            self.count += 1
+            self.total += seconds
+            self.min = seconds if self.min is None else min(self.min, seconds)
+            self.max = seconds if self.max is None else max(self.max, seconds)
+
+    def merge(self, other):
+        with self._lock:
+            self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+            self.count += other.count
+            self.total += other.total
+            if other.count:
+                self.min = other.min if self.min is None else min(self.min, other.min)
+                self.max = other.max if self.max is None else max(self.max, other.max)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def percentile(self, q):
+        """Seconds under which q percent of the recorded latencies fall"""
+        with self._lock:
+            if not self.count:
+                return None
+            rank = max(1, round(self.count * q / 100))
+            seen = 0
+            for index, count in enumerate(self.counts):
+                seen += count
+                if seen >= rank:
+                    # Never report more than was actually seen
+                    return min(self._bucket_value(index), self.max)
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "min": self.min,
+            "max": self.max,
+            "percentiles": {str(q): self.percentile(q) for q in REPORT_PERCENTILES},
+        }
+
+
+class StandInModel(AIModel):
+    """Local stand-in for a Hub model, for load tests that should not touch the network
+
+    Each request takes a lognormal service time around median seconds, and
+    at most capacity requests are served at once while the rest queue, as
+    on a real inference server. It is not registered, so it has no card.
+    """
+
+    task = "Load Test Stand-In"
+    input_type = "text"
+    renderer = "text"
+
+    def __init__(self, model_name="stand-in", median=0.05, spread=0.3, capacity=8, seed=None):
+        super().__init__(model_name)
+        self.median = median
+        self.spread = spread
+        self.capacity = capacity
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(capacity)
+        self._async_slots = {}
+
+    def _service_time(self):
+        with self._random_lock:
+            return self._random.lognormvariate(0, self.spread) * self.median
+
+    def run_model(self, input_data, cancel_token=None, timeout=None):
+        with CancelToken(timeout, parent=cancel_token) as token:
+            return self._infer(input_data, cancel_token=token)
+
+    async def arun_model(self, input_data, cancel_token=None, timeout=None):
+        with CancelToken(timeout, parent=cancel_token) as token:
+            return await self._ainfer(input_data, cancel_token=token)
+
+    @cache_result
+    def _infer(self, input_data, cancel_token):
+        with self._slots:
+            cancel_token.check()
+            time.sleep(self._service_time())
+        return f"echo: {input_data}"
+
+    @acache_result
+    async def _ainfer(self, input_data, cancel_token):
+        # Threads and the event loop share the capacity in spirit, but an
+        # asyncio semaphore only works on the loop that made it
+        loop = asyncio.get_running_loop()
+        if loop not in self._async_slots:
+            self._async_slots[loop] = asyncio.Semaphore(self.capacity)
+        async with self._async_slots[loop]:
+            cancel_token.check()
+            await asyncio.sleep(self._service_time())
+        return f"echo: {input_data}"
+
+
+def workload_inputs(model, distinct=DISTINCT_INPUTS):
+    """distinct different inputs suited to model's input type"""
+    if model.input_type == "image":
+        # Every image differs in size and bytes
+        from PIL import Image
+        inputs = []
+        for i in range(distinct):
+            image = Image.new("RGB", (32 + i, 32), "white")
+            image.putpixel((i % 32, i % 32), (i * 5 % 256, 0, 0))
+            inputs.append(_png_bytes(image))
+        return inputs
+    if model.input_type == "audio":
+        return [silent_wav(seconds=0.5 + i * 0.01) for i in range(distinct)]
+    return [f"load test prompt {i}" for i in range(distinct)]
+
+def _png_bytes(image):
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class LoadConfig:
+    """One setup to measure: how requests are issued, how many at once, and the cache"""
+
+    def __init__(self, mode="async", pool_size=8, cache=True):
+        if mode not in ("async", "threads"):
+            raise ValueError(f"Unknown load test mode: {mode}")
+        self.mode = mode
+        self.pool_size = pool_size
+        self.cache = cache
+
+    @property
+    def name(self):
+        return f"{self.mode} pool={self.pool_size} cache={'on' if self.cache else 'off'}"
+
+    def to_dict(self):
+        return {"mode": self.mode, "pool_size": self.pool_size, "cache": self.cache}
+
+
+class LoadResult:
+    """Latencies and throughput of one configuration at one load level
+
+    loop is "open" with load an arrival rate in requests per second, or
+    "closed" with load the number of clients.
+    """
+
+    def __init__(self, config, loop, load, histogram, errors, elapsed):
+        self.config = config
+        self.loop = loop
+        self.load = load
+        self.histogram = histogram
+        self.errors = errors
+        self.elapsed = elapsed
+
+    @property
+    def throughput(self):
+        """Successful requests per second"""
+        return self.histogram.count / self.elapsed if self.elapsed else 0.0
+
+    def to_dict(self):
+        return {
+            "config": self.config.to_dict(),
+            "loop": self.loop,
+            "load": self.load,
+            "errors": self.errors,
+            "elapsed": self.elapsed,
+            "throughput": self.throughput,
+            "latency": self.histogram.to_dict(),
+        }
+
+
+@contextmanager
+def _cache_setting(enabled):
+    # Every run starts cold so runs do not serve each other's results
+    previous = decorators.CACHE_ENABLED
+    decorators.CACHE_ENABLED = enabled
+    clear_result_cache()
+    clear_indexes()
+    try:
+        yield
+    finally:
+        decorators.CACHE_ENABLED = previous
+        clear_result_cache()
+        clear_indexes()
+
+def _arrival_times(rate, duration, seed):
+    """Poisson arrival offsets in seconds for an open-loop run"""
+    rng = random.Random(seed)
+    offset = rng.expovariate(rate)
+    while offset < duration:
+        yield offset
+        offset += rng.expovariate(rate)
+
+
+class LoadTester:
+    """Drives a model with open-loop arrivals or closed-loop clients
+
+    Open-loop requests are sent on a fixed schedule whether or not earlier
+    ones have finished, and their latency is measured from when they were
+    due, so a backed-up setup shows its queueing delay instead of quietly
+    sending less. Closed-loop clients send their next request as soon as
+    the last one answers, which finds the throughput a setup saturates at.
+    """
+
+    def __init__(self, model, inputs=None, timeout=None, runner=None, seed=0):
+        self.model = model
+        self.inputs = inputs or workload_inputs(model)
+        self.timeout = timeout
+        self.runner = runner or get_runner()
+        self.seed = seed
+
+    def open_loop(self, config, rate, duration=LOAD_DURATION):
+        with _cache_setting(config.cache):
+            if config.mode == "async":
+                return self.runner.run(self._aopen_loop(config, rate, duration))
+            return self._open_loop_threads(config, rate, duration)
+
+    def closed_loop(self, config, clients, duration=LOAD_DURATION):
+        with _cache_setting(config.cache):
+            if config.mode == "async":
+                return self.runner.run(self._aclosed_loop(config, clients, duration))
+            return self._closed_loop_threads(config, clients, duration)
+
+    def sweep(self, configs, concurrencies=(), rates=(), duration=LOAD_DURATION, progress=None):
+        """Run every config at every closed-loop concurrency and open-loop rate"""
+        results = []
+        for config in configs:
+            runs = [("closed", load) for load in concurrencies] + [("open", load) for load in rates]
+            for loop, load in runs:
+                run = self.closed_loop if loop == "closed" else self.open_loop
+                result = run(config, load, duration)
+                results.append(result)
+                if progress is not None:
+                    progress(result)
+        return results
+
+    def _call_sync(self, input_data):
+        self.model.run_model(input_data, timeout=self.timeout)
+
+    async def _acall(self, input_data, slots):
+        async with slots:
+            await self.model.arun_model(input_data, timeout=self.timeout)
+
+    async def _aopen_loop(self, config, rate, duration):
+        histogram = LatencyHistogram()
+        errors = 0
+        slots = asyncio.Semaphore(config.pool_size)
+        inputs = itertools.cycle(self.inputs)
+
+        async def send(due, input_data):
+            nonlocal errors
+            try:
+                await self._acall(input_data, slots)
+            except Exception:
+                errors += 1
+                return
+            histogram.record(time.perf_counter() - due)
+
+        start = time.perf_counter()
+        tasks = []
+        for offset in _arrival_times(rate, duration, self.seed):
+            delay = start + offset - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.ensure_future(send(start + offset, next(inputs))))
+        await asyncio.gather(*tasks)
+        return LoadResult(config, "open", rate, histogram, errors, time.perf_counter() - start)
+
+    def _open_loop_threads(self, config, rate, duration):
+        histogram = LatencyHistogram()
+        errors = []
+        inputs = itertools.cycle(self.inputs)
+
+        def send(due, input_data):
+            try:
+                self._call_sync(input_data)
+            except Exception:
+                errors.append(1)
+                return
+            histogram.record(time.perf_counter() - due)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(config.pool_size, thread_name_prefix="loadtest") as pool:
+            for offset in _arrival_times(rate, duration, self.seed):
+                delay = start + offset - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(send, start + offset, next(inputs))
+        return LoadResult(config, "open", rate, histogram, len(errors), time.perf_counter() - start)
+
+    async def _aclosed_loop(self, config, clients, duration):
+        histogram = LatencyHistogram()
+        errors = 0
+        slots = asyncio.Semaphore(config.pool_size)
+        inputs = itertools.cycle(self.inputs)
+        start = time.perf_counter()
+        deadline = start + duration
+
+        async def client():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                sent = time.perf_counter()
+                try:
+                    await self._acall(next(inputs), slots)
+                except Exception:
+                    errors += 1
+                    continue
+                histogram.record(time.perf_counter() - sent)
+
+        await asyncio.gather(*(client() for _ in range(clients)))
+        return LoadResult(config, "closed", clients, histogram, errors, time.perf_counter() - start)
+
+    def _closed_loop_threads(self, config, clients, duration):
+        histogram = LatencyHistogram()
+        errors = []
+        inputs = itertools.cycle(self.inputs)
+        inputs_lock = threading.Lock()
+        start = time.perf_counter()
+        deadline = start + duration
+
+        with ThreadPoolExecutor(config.pool_size, thread_name_prefix="loadtest") as pool:
+            def client():
+                while time.perf_counter() < deadline:
+                    with inputs_lock:
+                        input_data = next(inputs)
+                    sent = time.perf_counter()
+                    try:
+                        pool.submit(self._call_sync, input_data).result()
+                    except Exception:
+                        errors.append(1)
+                        continue
+                    histogram.record(time.perf_counter() - sent)
+
+            threads = [threading.Thread(target=client, daemon=True) for _ in range(clients)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        return LoadResult(config, "closed", clients, histogram, len(errors), time.perf_counter() - start)
+
+
+def saturation_points(results):
+    """{config name: (clients, throughput)} where each closed-loop sweep levels off"""
+    sweeps = {}
+    for result in results:
+        if result.loop == "closed":
+            sweeps.setdefault(result.config.name, []).append(result)
+    points = {}
+    for name, sweep in sweeps.items():
+        best = max(result.throughput for result in sweep)
+        knee = min((result for result in sweep if result.throughput >= best * SATURATION_SHARE),
+                   key=lambda result: result.load)
+        points[name] = (knee.load, knee.throughput)
+    return points
+
+def format_report(results):
+    """A text table comparing every configuration and load level"""
+    def ms(seconds):
+        return "-" if seconds is None else f"{seconds * 1000:.1f}"
+
+    header = (f"{'configuration':<28} {'loop':<6} {'load':>7} {'ok':>6} {'errors':>6} {'req/s':>8} "
+              + " ".join(f"{'p' + str(q):>8}" for q in REPORT_PERCENTILES) + f" {'max':>8}")
+    lines = [header, "-" * len(header)]
+    for result in results:
+        load = f"c={result.load}" if result.loop == "closed" else f"{result.load:g}/s"
+        latency = result.histogram
+        lines.append(
+            f"{result.config.name:<28} {result.loop:<6} {load:>7} {latency.count:>6} {result.errors:>6} "
+            f"{result.throughput:>8.1f} "
+            + " ".join(f"{ms(latency.percentile(q)):>8}" for q in REPORT_PERCENTILES)
+            + f" {ms(latency.max):>8}"
+        )
+    lines.append("Latencies in milliseconds.")
+    points = saturation_points(results)
+    if points:
+        lines.append("")
+        for name, (clients, throughput) in points.items():
+            lines.append(f"{name}: saturates at {clients} clients, {throughput:.1f} req/s")
+    return "\n".join(lines)
+
+def write_report(results, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({
+            "results": [result.to_dict() for result in results],
+            "saturation": {name: {"clients": clients, "throughput": throughput}
+                           for name, (clients, throughput) in saturation_points(results).items()},
+        }, f, indent=2)
+
+def run_load_test(model, configs, concurrencies=(), rates=(), duration=LOAD_DURATION,
+                  output=None, inputs=None, timeout=None):
+    """Sweep model over configs, print the report and optionally save it as JSON"""
+    tester = LoadTester(model, inputs=inputs, timeout=timeout)
+    results = tester.sweep(configs, concurrencies, rates, duration, progress=lambda result: print(
+        f"{result.config.name} {result.loop} {result.load}: {result.throughput:.1f} req/s"))
+    print(format_report(results))
+    if output:
+        write_report(results, output)
+        print(f"Report saved to {output}")
+    return results
@@ -0,0 +1,334 @@
+import asyncio
+import concurrent.futures
+import io
+import json
+import multiprocessing
+import os
+import threading
+import time
+import wave
+
+import numpy as np
+
+from transcripts import Segment
+
+# Local transcription needs the optional faster-whisper package, which runs
+# Whisper through CTranslate2 with int8 weights on the CPU
+try:
+    from faster_whisper import WhisperModel, decode_audio
+except ImportError:
+    WhisperModel = None
+    decode_audio = None
+
+# Weight type the model is loaded with; int8 is about four times smaller and
+# faster on CPU than float32 for a small loss in accuracy
+COMPUTE_TYPE = "int8"
+# Whisper hears 16 kHz mono and decodes at most 30 seconds at a time
+SAMPLE_RATE = 16000
+MAX_CHUNK_SECONDS = 30.0
+# Greedy decoding; beam search costs several times more CPU per chunk
+BEAM_SIZE = 1
+
+# Voice activity detection: loudness is measured per frame, and a frame is
+# speech if it stands well above the recording's noise floor
+FRAME_SECONDS = 0.03
+SPEECH_MARGIN_DB = 10.0
+# Frames quieter than this are silence, however quiet the recording
+SILENCE_DB = -50.0
+# Shorter pauses stay inside a chunk; speech is padded so words are not clipped
+MIN_SILENCE_SECONDS = 0.3
+SPEECH_PAD_SECONDS = 0.2
+
+# Written by --whisper-benchmark
+BENCHMARK_OUTPUT = "whisper_benchmark.json"
+
+MISSING_MESSAGE = "Local transcription needs the faster-whisper package: pip install faster-whisper"
+
+
+def local_model_name(model_name):
+    """The faster-whisper name of a Hub Whisper model: openai/whisper-tiny is tiny"""
+    prefix = "openai/whisper-"
+    return model_name[len(prefix):] if model_name.startswith(prefix) else model_name
+
+def default_workers():
+    """Half the CPU cores, each decoding with two threads"""
+    return max(1, (os.cpu_count() or 1) // 2)
+
+
+def load_audio(source):
+    """16 kHz mono float32 samples of an audio file or its bytes
+
+    8, 16 and 32-bit PCM WAV is read with the standard library; other
+    formats, 24-bit WAV among them, need the decoder that comes with
+    faster-whisper.
+    """
+    try:
+        reader = wave.open(io.BytesIO(source) if isinstance(source, bytes) else source, "rb")
+    except (wave.Error, EOFError):
+        return _decode(source)
+    with reader:
+        params = reader.getparams()
+        frames = reader.readframes(params.nframes)
+    if params.sampwidth == 1:
+        samples = (np.frombuffer(frames, np.uint8).astype(np.float32) - 128) / 128
+    else:
+        dtype = {2: np.int16, 4: np.int32}.get(params.sampwidth)
+        if dtype is None:
+            return _decode(source)
+        samples = np.frombuffer(frames, dtype).astype(np.float32) / np.iinfo(dtype).max
+    samples = samples.reshape(-1, params.nchannels).mean(axis=1)
+    if params.framerate != SAMPLE_RATE:
+        count = int(len(samples) * SAMPLE_RATE / params.framerate)
+        samples = np.interp(np.arange(count) * (params.framerate / SAMPLE_RATE),
+                            np.arange(len(samples)), samples).astype(np.float32)
+    return samples
+
+
+def _decode(source):
+    if decode_audio is None:
+        raise RuntimeError(MISSING_MESSAGE)
+    return decode_audio(io.BytesIO(source) if isinstance(source, bytes) else source,
+                        sampling_rate=SAMPLE_RATE)
+
+
+def speech_chunks(samples, rate=SAMPLE_RATE, max_seconds=MAX_CHUNK_SECONDS):
+    """(start, end) sample ranges of the speech in samples, each at most max_seconds
+
+    Consecutive speech is packed into as few chunks as fit, so chunks start
+    and end in pauses and Whisper never hears a word cut in half. Speech
+    that runs on longer than a chunk is cut at its quietest frame near the
+    end of the window. Silence between chunks is never decoded.
+    """
+    frame = int(FRAME_SECONDS * rate)
+    count = len(samples) // frame
+    if count == 0:
+        return [(0, len(samples))] if len(samples) else []
+    frames = samples[:count * frame].reshape(count, frame)
+    energy = 10 * np.log10(np.mean(frames ** 2, axis=1) + 1e-10)
+    floor, peak = np.percentile(energy, 10), np.percentile(energy, 99)
+    # Without pauses to set a floor, as in unbroken speech or pure noise,
+    # only the absolute level tells speech from silence
+    threshold = floor + SPEECH_MARGIN_DB if peak - floor > 2 * SPEECH_MARGIN_DB else SILENCE_DB
+    speech = energy > max(threshold, SILENCE_DB)
+
+    # Speech regions in frames, with short pauses inside them bridged
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], speech.astype(np.int8), [0]))))
+    regions = []
+    for start, end in zip(edges[::2], edges[1::2]):
+        if regions and start - regions[-1][1] < MIN_SILENCE_SECONDS / FRAME_SECONDS:
+            regions[-1][1] = end
+        else:
+            regions.append([start, end])
+    pad = int(SPEECH_PAD_SECONDS / FRAME_SECONDS)
+    max_frames = int(max_seconds / FRAME_SECONDS)
+
+    chunks = []
+    for start, end in regions:
+        start, end = max(start - pad, 0), min(end + pad, count)
+        if chunks and end - chunks[-1][0] <= max_frames:
+            chunks[-1][1] = end
+            continue
+        if chunks:
+            start = max(start, chunks[-1][1])
+        while end - start > max_frames:
+            # Cut in the quietest frame of the window's last fifth
+            low = start + max_frames * 4 // 5
+            cut = low + int(np.argmin(energy[low:start + max_frames]))
+            chunks.append([start, cut])
+            start = cut
+        chunks.append([start, end])
+    last = len(samples)
+    return [(int(start) * frame, last if end == count else int(end) * frame) for start, end in chunks]
+
+
+# The model of a worker process, loaded once when the process starts
+_worker_model = None
+
+def _load_worker(model_size, compute_type, cpu_threads):
+    global _worker_model
+    _worker_model = WhisperModel(model_size, device="cpu", compute_type=compute_type,
+                                 cpu_threads=cpu_threads)
+
+def _decode_chunk(samples, word_timestamps):
+    """(text, start, end) pieces of one chunk, timed from its start"""
+    segments, _ = _worker_model.transcribe(samples, beam_size=BEAM_SIZE, word_timestamps=word_timestamps,
+                                           condition_on_previous_text=False, vad_filter=False)
+    if word_timestamps:
+        return [(word.word, word.start, word.end) for segment in segments for word in segment.words or []]
+    return [(segment.text, segment.start, segment.end) for segment in segments]
+
+
+class LocalWhisper:
+    """Whisper on this machine, decoding the chunks of a recording in parallel
+
+    Audio is split at pauses into chunks of up to 30 seconds, and a pool of
+    worker processes, each holding its own int8 copy of the model, decodes
+    them side by side, so a long recording takes about 1/workers of the
+    time. The workers start, and load the model, on first use or warm().
+    """
+
+    def __init__(self, model_name="openai/whisper-tiny", workers=0, compute_type=COMPUTE_TYPE):
+        if WhisperModel is None:
+            raise RuntimeError(MISSING_MESSAGE)
+        self.model_name = model_name
+        self.workers = workers or default_workers()
+        self.compute_type = compute_type
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                threads = max(1, (os.cpu_count() or 1) // self.workers)
+                # Spawned rather than forked: the parent runs an event loop and
+                # other threads that a fork would copy mid-flight
+                self._pool = concurrent.futures.ProcessPoolExecutor(
+                    self.workers, mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_load_worker,
+                    initargs=(local_model_name(self.model_name), self.compute_type, threads))
+            return self._pool
+
+    def warm(self):
+        """Start every worker and load its model"""
+        silence = np.zeros(SAMPLE_RATE, np.float32)
+        pool = self._get_pool()
+        concurrent.futures.wait([pool.submit(_decode_chunk, silence, False) for _ in range(self.workers)])
+
+    def submit(self, audio, word_timestamps=False):
+        """Queue every chunk of audio; returns [(offset seconds, future)] in time order"""
+        samples = load_audio(audio)
+        pool = self._get_pool()
+        return [(start / SAMPLE_RATE, pool.submit(_decode_chunk, samples[start:end], word_timestamps))
+                for start, end in speech_chunks(samples)]
+
+    def transcribe_segments(self, audio, word_timestamps=False, cancel_token=None):
+        """Yield Segments in time order as the chunks are decoded
+
+        Cancelling drops the chunks not yet started; ones already being
+        decoded finish in the background.
+        """
+        chunks = self.submit(audio, word_timestamps)
+        try:
+            for offset, future in chunks:
+                while True:
+                    try:
+                        pieces = future.result(timeout=0.1)
+                        break
+                    except concurrent.futures.TimeoutError:
+                        pass
+                    if cancel_token is not None:
+                        cancel_token.check()
+                for text, start, end in pieces:
+                    yield Segment(offset + start, offset + end, text)
+        finally:
+            for _, future in chunks:
+                future.cancel()
+
+    def transcribe(self, audio, cancel_token=None):
+        return " ".join(segment.text.strip() for segment in self.transcribe_segments(audio, cancel_token=cancel_token))
+
+    async def atranscribe(self, audio):
+        """Async transcribe(); cancelling the task drops the chunks not yet started"""
+        chunks = await asyncio.to_thread(self.submit, audio)
+        results = await asyncio.gather(*(asyncio.wrap_future(future) for _, future in chunks))
+        return " ".join(text.strip() for pieces in results for text, _, _ in pieces)
+
+    def close(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+# One backend per model, shared by every model instance
+_backends = {}
+_backends_lock = threading.Lock()
+
+def get_backend(model_name, workers=0, compute_type=COMPUTE_TYPE):
+    """The shared backend for model_name, replacing one made with other settings"""
+    with _backends_lock:
+        backend = _backends.get(model_name)
+        if backend is not None and (backend.workers, backend.compute_type) != (
+                workers or default_workers(), compute_type):
+            backend.close()
+            backend = None
+        if backend is None:
+            backend = _backends[model_name] = LocalWhisper(model_name, workers, compute_type)
+        return backend
+
+def close_backends():
+    with _backends_lock:
+        backends = list(_backends.values())
+        _backends.clear()
+    for backend in backends:
+        backend.close()
+
+
+def benchmark(paths, worker_counts=(1, 2, 4), model_name="openai/whisper-tiny",
+              compute_type=COMPUTE_TYPE, remote=True):
+    """Real-time factor of local transcription at each worker count, and of the API
+
+    The real-time factor is processing time over audio length; below 1 is
+    faster than the audio plays. Local workers are warmed up first so model
+    loading is not counted, and the result cache is off throughout.
+    """
+    import decorators
+    from models import AudioToTextModel
+
+    rows = []
+    cache_enabled, decorators.CACHE_ENABLED = decorators.CACHE_ENABLED, False
+    try:
+        for path in paths:
+            seconds = len(load_audio(path)) / SAMPLE_RATE
+            for workers in worker_counts:
+                with LocalWhisper(model_name, workers, compute_type) as backend:
+                    backend.warm()
+                    start = time.perf_counter()
+                    text = backend.transcribe(path)
+                    rows.append(_benchmark_row(path, f"local {compute_type} x{workers}", seconds,
+                                               time.perf_counter() - start, text))
+            if remote:
+                model = AudioToTextModel(model_name)
+                model.local_backend = None
+                start = time.perf_counter()
+                try:
+                    text = " ".join(segment.text.strip() for segment in model.transcribe_segments(path))
+                except Exception as e:
+                    rows.append({"file": path, "backend": "api", "audio_seconds": seconds, "error": str(e)})
+                else:
+                    rows.append(_benchmark_row(path, "api", seconds, time.perf_counter() - start, text))
+    finally:
+        decorators.CACHE_ENABLED = cache_enabled
+    return rows
+
+def _benchmark_row(path, backend, audio_seconds, elapsed, text):
+    return {"file": path, "backend": backend, "audio_seconds": round(audio_seconds, 2),
+            "seconds": round(elapsed, 3), "rtf": round(elapsed / audio_seconds, 4) if audio_seconds else None,
+            "words": len(text.split())}
+
+def format_benchmark(rows):
+    lines = [f"{'file':<28} {'backend':<16} {'audio s':>8} {'time s':>8} {'RTF':>7} {'words':>6}"]
+    for row in rows:
+        name = os.path.basename(row["file"])[:28]
+        if "error" in row:
+            lines.append(f"{name:<28} {row['backend']:<16} {row['audio_seconds']:>8.1f}  failed: {row['error']}")
+        else:
+            lines.append(f"{name:<28} {row['backend']:<16} {row['audio_seconds']:>8.1f} "
+                         f"{row['seconds']:>8.2f} {row['rtf']:>7.3f} {row['words']:>6}")
+    return "\n".join(lines)
+
+def run_benchmark(paths, worker_counts=(1, 2, 4), model_name="openai/whisper-tiny",
+                  compute_type=COMPUTE_TYPE, remote=True, output=BENCHMARK_OUTPUT):
+    """Benchmark, print a table and write the rows to output as JSON"""
+    rows = benchmark(paths, worker_counts, model_name, compute_type, remote)
+    print(format_benchmark(rows))
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(rows, f, indent=2)
+    print(f"Wrote {output}")
+    return rows
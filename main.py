@@ -1,5 +1,151 @@
-from gui import AppGUI
+import argparse
+import sys
 
-if __name__ == "__main__":
-    app = AppGUI()
+
+def main():
+    parser = argparse.ArgumentParser(description="AI Studio - Hugging Face Model Interface")
+    parser.add_argument("--serve", action="store_true",
+                        help="run the local HTTP/JSON inference service instead of the GUI")
+    parser.add_argument("--host", default="127.0.0.1", help="address for --serve (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8137, help="port for --serve (default: 8137)")
+    parser.add_argument("--max-pending", type=int,
+                        help="jobs queued or running before --serve answers 503 "
+                             "(default: concurrency.server_max_pending, 64)")
+    parser.add_argument("--concurrency", type=int,
+                        help="jobs --serve runs at once (default: concurrency.server, 8)")
+    parser.add_argument("--config", default="ai_studio.ini",
+                        help="settings file, reloaded while the GUI runs (default: ai_studio.ini)")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="measure import times, first paint and model readiness, then exit")
+    parser.add_argument("--startup-budget", type=float, default=3.0,
+                        help="seconds --profile-startup allows before exiting with status 1 (default: 3.0)")
+    parser.add_argument("--profile-output", default="startup_profile.json",
+                        help="report file for --profile-startup (default: startup_profile.json)")
+    parser.add_argument("--transcribe", metavar="AUDIO",
+                        help="transcribe an audio file to timestamped subtitles, then exit")
+    parser.add_argument("--subtitle-format", choices=["srt", "vtt", "json"], default="srt",
+                        help="output format for --transcribe (default: srt)")
+    parser.add_argument("--subtitle-output",
+                        help="output file for --transcribe (default: the audio file with the format's extension)")
+    parser.add_argument("--word-timestamps", action="store_true",
+                        help="time each word rather than each phrase in --transcribe")
+    parser.add_argument("--load-test", metavar="MODEL",
+                        help="load test a registered model key, or 'stand-in' for a local "
+                             "stand-in, then exit")
+    parser.add_argument("--load-clients", default="1,2,4,8,16",
+                        help="closed-loop client counts for --load-test (default: 1,2,4,8,16)")
+    parser.add_argument("--load-rates", default="",
+                        help="open-loop arrival rates in requests per second for --load-test")
+    parser.add_argument("--load-modes", default="async,threads",
+                        help="how --load-test issues requests: async, threads or both (default: async,threads)")
+    parser.add_argument("--load-pool-sizes", default="8",
+                        help="requests each --load-test configuration runs at once (default: 8)")
+    parser.add_argument("--load-cache", default="off",
+                        help="result cache for --load-test: on, off or on,off (default: off)")
+    parser.add_argument("--load-duration", type=float, default=10.0,
+                        help="seconds per --load-test level (default: 10)")
+    parser.add_argument("--load-inputs", nargs="+", metavar="FILE",
+                        help="input files --load-test cycles through (default: generated inputs)")
+    parser.add_argument("--load-output", default="loadtest_report.json",
+                        help="report file for --load-test (default: loadtest_report.json)")
+    parser.add_argument("--whisper-benchmark", nargs="+", metavar="AUDIO",
+                        help="compare the real-time factor of local int8 Whisper and the API on these files")
+    parser.add_argument("--whisper-workers", default="1,2,4",
+                        help="worker process counts for --whisper-benchmark (default: 1,2,4)")
+    parser.add_argument("--skip-remote", action="store_true",
+                        help="leave the API out of --whisper-benchmark")
+    parser.add_argument("--benchmark-output", default="whisper_benchmark.json",
+                        help="report file for --whisper-benchmark (default: whisper_benchmark.json)")
+    parser.add_argument("--record-traffic", nargs="?", const="", metavar="SESSION",
+                        help="record every model request and response (default file: traffic/<time>.jsonl)")
+    parser.add_argument("--replay", metavar="SESSION",
+                        help="rerun a recorded session with its recorded responses and timing, and report latencies")
+    parser.add_argument("--replay-speed", type=float, default=1.0,
+                        help="how many times faster than recorded --replay runs (default: 1)")
+    parser.add_argument("--replay-output", default="replay_report.json",
+                        help="report file for --replay (default: replay_report.json)")
+    parser.add_argument("--replay-interactive", action="store_true",
+                        help="with --replay, run the GUI or --serve answering requests from the recording instead")
+    args = parser.parse_args()
+
+    if args.profile_startup:
+        from startup_profiler import profile_startup
+        sys.exit(profile_startup(args.startup_budget, args.profile_output))
+
+    # The token file and settings are read once and checked before anything runs
+    from config import ConfigError, ConfigWatcher, apply_config, load_env_file
+    load_env_file()
+    try:
+        settings = ConfigWatcher(args.config)
+    except ConfigError as e:
+        parser.exit(2, f"{e}\n")
+    apply_config(settings.config)
+
+    from traffic import TRAFFIC
+    if args.replay and not args.replay_interactive:
+        from traffic import replay_session
+        replay_session(args.replay, args.replay_speed, args.replay_output)
+        return
+    if args.replay:
+        TRAFFIC.replay(args.replay, args.replay_speed)
+    elif args.record_traffic is not None:
+        TRAFFIC.record(args.record_traffic or None)
+
+    if args.load_test:
+        import itertools
+        from loadtest import LoadConfig, StandInModel, run_load_test
+        if args.load_test == "stand-in":
+            model = StandInModel()
+        else:
+            from models import MODEL_REGISTRY, load_plugins
+            load_plugins()
+            if args.load_test not in MODEL_REGISTRY:
+                parser.error(f"unknown model '{args.load_test}'; choose from {', '.join(MODEL_REGISTRY)}")
+            model = MODEL_REGISTRY[args.load_test].load()
+        configs = [LoadConfig(mode, int(pool_size), cache == "on") for mode, pool_size, cache in itertools.product(
+            args.load_modes.split(","), args.load_pool_sizes.split(","), args.load_cache.split(","))]
+        run_load_test(model, configs,
+                      concurrencies=[int(n) for n in args.load_clients.split(",") if n],
+                      rates=[float(n) for n in args.load_rates.split(",") if n],
+                      duration=args.load_duration, output=args.load_output, inputs=args.load_inputs)
+        return
+
+    if args.whisper_benchmark:
+        from local_whisper import WhisperModel, MISSING_MESSAGE, run_benchmark
+        if WhisperModel is None:
+            parser.exit(2, f"{MISSING_MESSAGE}\n")
+        from models import MODEL_REGISTRY, load_plugins
+        load_plugins()
+        run_benchmark(args.whisper_benchmark, [int(n) for n in args.whisper_workers.split(",") if n],
+                      model_name=MODEL_REGISTRY["openai/whisper-tiny"].model_name,
+                      compute_type=settings.config["whisper.compute_type"],
+                      remote=not args.skip_remote, output=args.benchmark_output)
+        return
+
+    if args.transcribe:
+        import os
+        from models import MODEL_REGISTRY, load_plugins
+        from transcripts import export_transcript
+        load_plugins()
+        output = args.subtitle_output or f"{os.path.splitext(args.transcribe)[0]}.{args.subtitle_format}"
+        # The registry's model honours a [models] override in the settings
+        index = export_transcript(MODEL_REGISTRY["openai/whisper-tiny"].load(), args.transcribe, output,
+                                  args.subtitle_format, word_timestamps=args.word_timestamps)
+        print(f"Wrote {len(index)} segments to {output}")
+        return
+
+    if args.serve:
+        from server import serve
+        config = settings.config
+        serve(args.host, args.port,
+              args.max_pending or config["concurrency.server_max_pending"],
+              args.concurrency or config["concurrency.server"])
+        return
+
+    from gui import AppGUI
+    app = AppGUI(settings)
     app.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+import io
+import os
+import wave
+
+from file_inputs import bytes_hash, file_hash, remember_file_hash
+
+# Files up to this size are read whole by the single open that sniffs them,
+# since the upload needs every byte anyway; larger ones are streamed
+WHOLE_READ_LIMIT = 8 * 1024 * 1024
+# Bytes read from the start of a larger file to sniff its format
+HEADER_BYTES = 64
+
+# MIME types each model input type accepts
+SUPPORTED_TYPES = {
+    "image": {"image/png", "image/jpeg", "image/gif", "image/bmp", "image/webp", "image/tiff"},
+    "audio": {"audio/wav", "audio/flac", "audio/ogg", "audio/mpeg", "audio/mp4"},
+}
+
+
+class UnsupportedInputError(ValueError):
+    """Raised when an input is not in a format the model accepts"""
+
+
+def sniff_mime(header):
+    """The MIME type the leading bytes of a file announce, or None"""
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if header.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if header[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if header.startswith(b"BM"):
+        return "image/bmp"
+    if header[:4] in (b"II*\x00", b"MM\x00*"):
+        return "image/tiff"
+    if header.startswith(b"RIFF") and header[8:12] == b"WEBP":
+        return "image/webp"
+    if header.startswith(b"RIFF") and header[8:12] == b"WAVE":
+        return "audio/wav"
+    if header.startswith(b"fLaC"):
+        return "audio/flac"
+    if header.startswith(b"OggS"):
+        return "audio/ogg"
+    if header.startswith(b"ID3") or (len(header) > 1 and header[0] == 0xFF and header[1] & 0xE0 == 0xE0):
+        return "audio/mpeg"
+    if header[4:8] == b"ftyp":
+        return "audio/mp4" if header[8:12] in (b"M4A ", b"M4B ") else "video/mp4"
+    return None
+
+
+class ModelInput:
+    """An image or audio input inspected once for the whole request
+
+    Made from a path with one stat and one open, which sniffs the format
+    from the header and, for files small enough to upload in one go, reads
+    the contents too. Validation, the cache key, preprocessing and the
+    upload then all use what was found here instead of going back to the
+    file. Dimensions and duration are probed on first use.
+    """
+
+    def __init__(self, path=None, data=None, size=None, mime=None, fingerprint=None):
+        self.path = path
+        self.data = data
+        self.size = size
+        self.mime = mime
+        self.fingerprint = fingerprint
+        self._hash = None
+        self._probed = None
+
+    @classmethod
+    def from_path(cls, path):
+        """Inspect a file; raises FileNotFoundError if it does not exist"""
+        st = os.stat(path)
+        with open(path, "rb") as f:
+            if st.st_size <= WHOLE_READ_LIMIT:
+                data = f.read()
+                header = data[:HEADER_BYTES]
+            else:
+                data = None
+                header = f.read(HEADER_BYTES)
+        fingerprint = (os.path.abspath(path), st.st_size, st.st_mtime_ns, st.st_ino)
+        return cls(path, data, st.st_size, sniff_mime(header), fingerprint)
+
+    @classmethod
+    def from_bytes(cls, data):
+        data = bytes(data)
+        return cls(None, data, len(data), sniff_mime(data[:HEADER_BYTES]))
+
+    @classmethod
+    def coerce(cls, value):
+        """A ModelInput for a path, bytes or an existing ModelInput"""
+        if isinstance(value, cls):
+            return value
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return cls.from_bytes(value)
+        return cls.from_path(os.fspath(value))
+
+    @property
+    def kind(self):
+        """"image", "audio" or None, from the sniffed MIME type"""
+        for kind, types in SUPPORTED_TYPES.items():
+            if self.mime in types:
+                return kind
+        return None
+
+    def check(self, input_type):
+        """Raise UnsupportedInputError unless this is a supported input_type file"""
+        if self.kind != input_type:
+            found = self.mime or "an unrecognised format"
+            raise UnsupportedInputError(f"{self} is {found}, not a supported {input_type} format")
+        return self
+
+    def content(self):
+        """What to hand to a client or decoder: the bytes if they were read, else the path"""
+        return self.data if self.data is not None else self.path
+
+    @property
+    def hash(self):
+        """SHA-256 of the contents, shared with file_hash() for the same file version"""
+        if self._hash is None:
+            if self.data is not None:
+                self._hash = bytes_hash(self.data)
+                if self.fingerprint is not None:
+                    remember_file_hash(self.fingerprint, self._hash)
+            else:
+                self._hash = file_hash(self.path, fingerprint=self.fingerprint)
+        return self._hash
+
+    def _probe(self):
+        if self._probed is None:
+            dimensions = duration = None
+            source = io.BytesIO(self.data) if self.data is not None else self.path
+            if self.kind == "image":
+                from PIL import Image
+                # Opening only parses the header; pixels are never decoded
+                with Image.open(source) as image:
+                    dimensions = image.size
+            elif self.mime == "audio/wav":
+                with wave.open(source, "rb") as audio:
+                    duration = audio.getnframes() / audio.getframerate()
+            self._probed = (dimensions, duration)
+        return self._probed
+
+    @property
+    def dimensions(self):
+        """(width, height) of an image, or None"""
+        return self._probe()[0]
+
+    @property
+    def duration(self):
+        """Seconds of a WAV recording, or None for other inputs"""
+        return self._probe()[1]
+
+    def __str__(self):
+        return self.path if self.path is not None else f"<{self.size} bytes of {self.mime or 'data'}>"
+
+    def __repr__(self):
+        return f"ModelInput({str(self)!r}, {self.mime!r}, {self.size})"
@@ -1,28 +1,635 @@
-# models.py
-from huggingface_hub import InferenceClient
-from decorators import log_action
+import asyncio
+import mimetypes
+import os
+import threading
+import time
+from importlib.metadata import entry_points
+from huggingface_hub import (AsyncInferenceClient, AutomaticSpeechRecognitionOutput,
+                             InferenceClient, ObjectDetectionBoundingBox, ObjectDetectionOutputElement)
+import decorators
+from decorators import log_action, cache_result, acache_result, dont_cache, make_cache_key
+from cancellation import CancelToken
+from file_inputs import bytes_hash, file_hash, iter_file_chunks
+from transcripts import CHUNK_SECONDS, Segment, iter_audio_chunks
+from image_hashes import NearDuplicateIndex, fingerprint
+from image_results import IMAGE_STORE
+from warmup import silent_wav, tiny_png
+from hedging import LATENCIES, Route, can_fall_back
+from event_log import note, phase
+from model_input import ModelInput
+from traffic import TRAFFIC
+
+# Registered models by key, in card order
+MODEL_REGISTRY = {}
+
+# Entry point group third-party packages use to add models
+PLUGIN_GROUP = "ai_studio.models"
+
+
+class ModelSpec:
+    """Registry entry for one model card; the model itself is created on first use"""
+
+    def __init__(self, key, model_class, model_name, title, description):
+        self.key = key
+        self.model_class = model_class
+        self.model_name = model_name
+        self.default_model_name = model_name
+        self.title = title
+        self.description = description
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def input_type(self):
+        return self.model_class.input_type
+
+    @property
+    def loaded(self):
+        return self._model is not None
+
+    def load(self):
+        """Return the model instance, creating it on the first call"""
+        with self._lock:
+            if self._model is None:
+                self._model = self.model_class(self.model_name)
+            return self._model
+
+    def set_model_name(self, model_name):
+        """Use another Hugging Face model; the next load() creates it"""
+        with self._lock:
+            if model_name != self.model_name:
+                self.model_name = model_name
+                self._model = None
+
+
+def register_model(model_name, title, description, key=None):
+    """Class decorator adding a model card to MODEL_REGISTRY
+
+    Stack it to offer the same class with several Hugging Face models.
+    """
+    def decorator(cls):
+        spec_key = key or model_name
+        if spec_key in MODEL_REGISTRY:
+            raise ValueError(f"Model '{spec_key}' is already registered")
+        MODEL_REGISTRY[spec_key] = ModelSpec(spec_key, cls, model_name, title, description)
+        return cls
+    return decorator
+
+
+def load_plugins():
+    """Import modules advertised under PLUGIN_GROUP so their models register themselves"""
+    for entry_point in entry_points(group=PLUGIN_GROUP):
+        try:
+            entry_point.load()
+        except Exception as e:
+            print(f"[LOG] Could not load model plugin {entry_point.name}: {e}")
+
 
 # Base Class
 class AIModel:
+    # What subclasses declare so the GUI can build cards and dispatch without knowing them
+    task = "Generic"
+    input_type = "text"      # "text", "image" or "audio"
+    renderer = "text"        # "text", "image" or "detections"
+    action_label = "Run Model"
+
+    # Other places to send a request, tried in order after the model's own
+    # when it fails: Route(provider, model), None meaning the default
+    fallback_routes = ()
+    # Also send a request to the next route once it is slower than 95% of
+    # recent ones there, keeping whichever answers first (async calls only)
+    hedge_requests = False
+
     def __init__(self, model_name):
         self._model_name = model_name    # Encapsulation
-        self.client = InferenceClient(model_name)
+        self._async_clients = {}
+        self._async_client_loop = None
+
+    @property
+    def model_name(self):
+        return self._model_name
 
-    def run_model(self, input_data):
+    def run_model(self, input_data, cancel_token=None, timeout=None):
         raise NotImplementedError("Subclass must override run_model()")
 
+    async def arun_model(self, input_data, cancel_token=None, timeout=None):
+        raise NotImplementedError("Subclass must override arun_model()")
+
     def get_info(self):
-        return f"Model: {self._model_name}"
+        return f"Model: {self._model_name}\nTask: {self.task}"
+
+    def result_key(self, input_data, **params):
+        """A string naming the result of a run, the same for the same input and params"""
+        return repr(make_cache_key(self._model_name, self._cache_input(input_data), params))
+
+    def probe_request(self):
+        """(client method, args, kwargs) of the cheapest request that loads the
+        model, or None if there is none; used to warm models up"""
+        return None
+
+    async def aprobe(self, timeout=None):
+        """Send the probe request, bypassing the cache; returns False if there is none"""
+        request = self.probe_request()
+        if request is None:
+            return False
+        method, args, kwargs = request
+        # Only the model's own route, and without skewing its latency record
+        with CancelToken(timeout) as token:
+            await self._with_token(self._acall_route(self.routes()[0], method, args, kwargs, record=False),
+                                   cancel_token=token)
+        return True
+
+    def routes(self):
+        return [Route(None, None), *self.fallback_routes]
+
+    def _note_route(self, route):
+        """Record which route answered
+
+        Another model's answer is not this model's result, so it is kept
+        out of the cache, where it would be served under this model's key.
+        """
+        note(provider=route.provider or "default")
+        if route.model not in (None, self._model_name):
+            dont_cache()
+
+    def _route_name(self, route):
+        return f"{route.model or self._model_name} via {route.provider or 'default provider'}"
+
+    def _cache_input(self, input_data):
+        """The part of a cache key identifying the input"""
+        return input_data
+
+    def _create_client(self, timeout=None, route=Route(None, None)):
+        client = InferenceClient(route.model or self._model_name, provider=route.provider, timeout=timeout)
+        return TRAFFIC.wrap(client, self, route)
+
+    def _call_client(self, method, *args, cancel_token, **kwargs):
+        """Run one inference request on its own client so cancelling closes its connection"""
+        return self._with_client(lambda client: getattr(client, method)(*args, **kwargs),
+                                 cancel_token=cancel_token)
+
+    def _with_client(self, request, cancel_token):
+        """Call request(client) with a fresh client that the token closes on cancellation
+
+        If it fails, each fallback route is tried in turn.
+        """
+        routes = self.routes()
+        for i, route in enumerate(routes):
+            cancel_token.check()
+            client = self._create_client(timeout=cancel_token.remaining(), route=route)
+            unregister = cancel_token.add_callback(client.close)
+            try:
+                with phase("request"):
+                    result = request(client)
+                self._note_route(route)
+                return result
+            except Exception as e:
+                # Report the cancellation rather than the error it caused
+                cancel_token.check()
+                if i == len(routes) - 1 or not can_fall_back(e):
+                    raise
+                print(f"[LOG] {self._route_name(route)} failed ({e}), trying {self._route_name(routes[i + 1])}")
+            finally:
+                unregister()
+                client.close()
+
+    def _create_async_client(self, route=Route(None, None)):
+        client = AsyncInferenceClient(route.model or self._model_name, provider=route.provider)
+        return TRAFFIC.wrap(client, self, route, asynchronous=True)
+
+    def _get_async_client(self, route):
+        # One client (and connection pool) per route and event loop
+        loop = asyncio.get_running_loop()
+        if self._async_client_loop is not loop:
+            self._async_clients = {}
+            self._async_client_loop = loop
+        if route not in self._async_clients:
+            self._async_clients[route] = self._create_async_client(route)
+        return self._async_clients[route]
+
+    async def _acall_client(self, method, *args, cancel_token, **kwargs):
+        """Async version of _call_client; cancelling the token cancels the request task"""
+        with phase("request"):
+            return await self._with_token(self._acall_routes(method, args, kwargs), cancel_token=cancel_token)
+
+    async def _with_token(self, coro, cancel_token):
+        """Await coro as a task that cancelling the token cancels"""
+        try:
+            cancel_token.check()
+        except Exception:
+            coro.close()
+            raise
+        loop = asyncio.get_running_loop()
+        task = asyncio.ensure_future(coro)
+        unregister = cancel_token.add_callback(lambda: loop.call_soon_threadsafe(task.cancel))
+        try:
+            return await task
+        except asyncio.CancelledError:
+            # Report our own cancellation or deadline rather than the bare task cancel
+            cancel_token.check()
+            raise
+        finally:
+            unregister()
+
+    async def _acall_route(self, route, method, args, kwargs, record=True):
+        start = time.perf_counter()
+        result = await getattr(self._get_async_client(route), method)(*args, **kwargs)
+        if record:
+            LATENCIES.record((self._model_name, route, method), time.perf_counter() - start)
+        return result
+
+    async def _acall_routes(self, method, args, kwargs):
+        """Send a request along the routes until one succeeds
+
+        The next route is tried when a request fails and, with hedging on,
+        when the latest request has run past its route's recent p95 latency.
+        The first success wins and requests still running are cancelled.
+        """
+        routes = self.routes()
+        pending = {}
+        next_route = 0
+        error = None
+        launch = True
+        try:
+            while True:
+                if launch and next_route < len(routes):
+                    task = asyncio.ensure_future(self._acall_route(routes[next_route], method, args, kwargs))
+                    pending[task] = routes[next_route]
+                    next_route += 1
+                if not pending:
+                    raise error
+
+                delay = None
+                if self.hedge_requests and next_route < len(routes):
+                    delay = LATENCIES.hedge_delay((self._model_name, routes[next_route - 1], method))
+                done, _ = await asyncio.wait(pending, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+
+                # Nothing answered in time, so hedge with the next route
+                launch = not done
+                if launch:
+                    print(f"[LOG] {self._route_name(routes[next_route - 1])} is slow, "
+                          f"hedging with {self._route_name(routes[next_route])}")
+                for task in done:
+                    route = pending.pop(task)
+                    if task.exception() is None:
+                        self._note_route(route)
+                        return task.result()
+                    error = task.exception()
+                    if not can_fall_back(error):
+                        raise error
+                    if next_route < len(routes):
+                        print(f"[LOG] {self._route_name(route)} failed ({error}), "
+                              f"trying {self._route_name(routes[next_route])}")
+                    launch = True
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+# Intermediate class for models whose input is a local file (or raw bytes)
+class FileInputModel(AIModel):
+    # Files at least this large are uploaded in chunks rather than read into memory
+    STREAM_UPLOAD_THRESHOLD = 8 * 1024 * 1024
+
+    def prepare_input(self, input_data):
+        """Inspect a path or bytes once as a ModelInput, rejecting unsupported formats
+
+        Raises FileNotFoundError or UnsupportedInputError before any network work.
+        """
+        with phase("inspect"):
+            source = ModelInput.coerce(input_data).check(self.input_type)
+        # The event log describes the input from this rather than going back to the file
+        note(_input=source)
+        return source
+
+    def _cache_input(self, input_data):
+        # Key on the content so renamed copies hit and edited files miss
+        if isinstance(input_data, ModelInput):
+            return ("file" if input_data.path is not None else "bytes", input_data.hash)
+        if isinstance(input_data, (bytes, bytearray, memoryview)):
+            return ("bytes", bytes_hash(input_data))
+        if isinstance(input_data, str) and os.path.isfile(input_data):
+            return ("file", file_hash(input_data))
+        return input_data
+
+    def _streams(self, source):
+        """Whether source is a file large enough to upload in chunks"""
+        # Recorded and replayed traffic has to go through the client methods
+        return source.data is None and source.size >= self.STREAM_UPLOAD_THRESHOLD and TRAFFIC.mode is None
+
+    def _call_client_with_file(self, method, task, source, parse, cancel_token):
+        """Call a binary-input client method on a ModelInput, streaming large files"""
+        def request(client):
+            if self._streams(source):
+                response = self._stream_file(client, task, source.path, source.size, source.mime)
+                if response is not None:
+                    return parse(response)
+            return getattr(client, method)(source.content())
+        return self._with_client(request, cancel_token=cancel_token)
+
+    async def _acall_client_with_file(self, method, task, source, parse, cancel_token):
+        """Async version of _call_client_with_file
+
+        The async client reads a file whole before sending it, so large files
+        are streamed by the sync client on a worker thread instead, without
+        hedging.
+        """
+        if self._streams(source):
+            return await asyncio.to_thread(self._call_client_with_file, method, task, source, parse,
+                                           cancel_token=cancel_token)
+        return await self._acall_client(method, source.content(), cancel_token=cancel_token)
+
+    def _stream_file(self, client, task, path, size=None, mime=None):
+        """POST a file to a raw-binary endpoint chunk by chunk
+
+        Returns None when the provider needs the whole body encoded up front,
+        so the caller falls back to the regular client method.
+        """
+        try:
+            from huggingface_hub.inference._providers import get_provider_helper
+            from huggingface_hub.inference._providers.hf_inference import HFInferenceBinaryInputTask
+        except ImportError:
+            return None
+        helper = get_provider_helper(client.provider, task=task, model=client.model)
+        if not isinstance(helper, HFInferenceBinaryInputTask):
+            return None
+        request = helper.prepare_request(inputs=b"", parameters={}, headers=client.headers,
+                                         model=client.model, api_key=client.token)
+        if size is None:
+            size = os.path.getsize(path)
+        request.data = iter_file_chunks(path, size=size)
+        request.headers["content-type"] = mime or mimetypes.guess_type(path)[0] or "application/octet-stream"
+        request.headers["content-length"] = str(size)
+        return helper.get_response(client._inner_post(request), request_params=request)
 
 # Subclass 1 (Polymorphism + Method Overriding)
-class TextToImageModel(AIModel):
+@register_model(
+    "facebook/detr-resnet-50",
+    title=" Object Detection",
+    description="Detect and identify objects in images",
+)
+class ObjectDetectionModel(FileInputModel):
+    task = "Object Detection"
+    input_type = "image"
+    renderer = "detections"
+    action_label = "Detect Objects"
+
+    # Same architecture and COCO labels with a deeper backbone
+    fallback_routes = (Route("hf-inference", "facebook/detr-resnet-101"),)
+
+    # pHash bits two images may differ by and still share detections
+    DUPLICATE_DISTANCE = 4
+
+    def __init__(self, model_name):
+        super().__init__(model_name)
+        # Earlier detections by perceptual hash, so re-encoded or resized
+        # copies of a photo reuse them when the byte hash misses
+        self._similar_images = NearDuplicateIndex(self.DUPLICATE_DISTANCE)
+
+    @log_action
+    def run_model(self, input_data, cancel_token=None, timeout=None):
+        source, image = self._inspect(input_data)
+        reused = self._reuse_detections(image)
+        if reused is not None:
+            return reused
+        with CancelToken(timeout, parent=cancel_token) as token:
+            result = self._detect(source, cancel_token=token)
+        self._remember_detections(image, result)
+        return result
+
     @log_action
-    def run_model(self, input_data):
-        return self.client.text_to_image(input_data)
+    async def arun_model(self, input_data, cancel_token=None, timeout=None):
+        # Reading, decoding and hashing the image would otherwise stall the event loop
+        source, image = await asyncio.to_thread(self._inspect, input_data)
+        reused = self._reuse_detections(image)
+        if reused is not None:
+            return reused
+        with CancelToken(timeout, parent=cancel_token) as token:
+            result = await self._adetect(source, cancel_token=token)
+        self._remember_detections(image, result)
+        return result
+
+    def _inspect(self, input_data):
+        """The checked ModelInput and its perceptual fingerprint"""
+        source = self.prepare_input(input_data)
+        with phase("fingerprint"):
+            return source, fingerprint(source.content())
+
+    def probe_request(self):
+        return "object_detection", (tiny_png(),), {}
+
+    def _reuse_detections(self, image):
+        """Detections of a near-identical earlier image, scaled to this one's size"""
+        # Reused detections are cached results, so they follow the cache setting
+        if image is None or not decorators.CACHE_ENABLED:
+            return None
+        match = self._similar_images.find(image[0])
+        if match is None:
+            return None
+        note(cache="near-duplicate")
+        (old_width, old_height), detections = match
+        width, height = image[1]
+        sx, sy = width / old_width, height / old_height
+        return [
+            ObjectDetectionOutputElement(
+                box=ObjectDetectionBoundingBox(
+                    xmin=round(d.box.xmin * sx), ymin=round(d.box.ymin * sy),
+                    xmax=round(d.box.xmax * sx), ymax=round(d.box.ymax * sy)),
+                label=d.label,
+                score=d.score,
+            )
+            for d in detections
+        ]
+
+    def _remember_detections(self, image, detections):
+        if image is not None and decorators.CACHE_ENABLED:
+            self._similar_images.add(image[0], (image[1], detections))
+
+    @cache_result
+    def _detect(self, image, cancel_token):
+        return self._call_client_with_file("object_detection", "object-detection", image,
+                                           ObjectDetectionOutputElement.parse_obj_as_list,
+                                           cancel_token=cancel_token)
+
+    @acache_result
+    async def _adetect(self, image, cancel_token):
+        return await self._acall_client_with_file("object_detection", "object-detection", image,
+                                                  ObjectDetectionOutputElement.parse_obj_as_list,
+                                                  cancel_token=cancel_token)
 
 # Subclass 2
-class AudioToTextModel(AIModel):
+@register_model(
+    "black-forest-labs/FLUX.1-dev",
+    title=" Text to Image",
+    description="Generate images from text descriptions",
+)
+class TextToImageModel(AIModel):
+    task = "Text to Image"
+    input_type = "text"
+    renderer = "image"
+    action_label = "Generate Image"
+
+    # Other providers serving the same FLUX.1-dev weights
+    fallback_routes = (Route("fal-ai", None), Route("together", None))
+
+    # Presets for fast drafts and full quality output
+    GENERATION_MODES = {
+        "draft": {"width": 512, "height": 512, "num_inference_steps": 8},
+        "final": {"width": 1024, "height": 1024, "num_inference_steps": 28},
+    }
+    GENERATION_PARAMS = ("width", "height", "num_inference_steps",
+                         "guidance_scale", "seed", "negative_prompt")
+
     @log_action
-    def run_model(self, input_data):
-        with open(input_data, "rb") as f:
-            return self.client.audio_to_text(f) 
+    def run_model(self, input_data, mode="final", cancel_token=None, timeout=None, **overrides):
+        params = self.resolve_params(mode, **overrides)
+        with CancelToken(timeout, parent=cancel_token) as token:
+            return self._generate(input_data, cancel_token=token, **params)
+
+    @log_action
+    async def arun_model(self, input_data, mode="final", cancel_token=None, timeout=None, **overrides):
+        params = self.resolve_params(mode, **overrides)
+        with CancelToken(timeout, parent=cancel_token) as token:
+            return await self._agenerate(input_data, cancel_token=token, **params)
+
+    def probe_request(self):
+        # One small step is enough to get the pipeline loaded
+        return "text_to_image", ("warm-up",), {"width": 256, "height": 256, "num_inference_steps": 1}
+
+    def resolve_params(self, mode="final", **overrides):
+        """Merge the mode preset with explicit overrides, dropping unset values"""
+        if mode not in self.GENERATION_MODES:
+            raise ValueError(f"Unknown generation mode: {mode}")
+        unknown = set(overrides) - set(self.GENERATION_PARAMS)
+        if unknown:
+            raise ValueError(f"Unknown generation parameters: {', '.join(sorted(unknown))}")
+        params = dict(self.GENERATION_MODES[mode])
+        params.update({k: v for k, v in overrides.items() if v is not None and v != ""})
+        return params
+
+    @cache_result
+    def _generate(self, prompt, cancel_token, **params):
+        image = self._call_client("text_to_image", prompt, cancel_token=cancel_token, **params)
+        # Cached and batched results are handles, so pixels stay within the memory budget
+        with phase("store"):
+            return IMAGE_STORE.add(image)
+
+    @acache_result
+    async def _agenerate(self, prompt, cancel_token, **params):
+        image = await self._acall_client("text_to_image", prompt, cancel_token=cancel_token, **params)
+        # Adding may spill older images, which encodes them, so keep it off the event loop
+        with phase("store"):
+            return await asyncio.to_thread(IMAGE_STORE.add, image)
+
+# Subclass 3
+@register_model(
+    "openai/whisper-tiny",
+    title=" Speech to Text",
+    description="Transcribe speech from an audio file",
+)
+class AudioToTextModel(FileInputModel):
+    task = "Speech Recognition"
+    input_type = "audio"
+    renderer = "text"
+    action_label = "Transcribe Audio"
+
+    # Transcribe on this machine instead of through the API: None, or the
+    # keyword arguments of local_whisper.get_backend(), such as {"workers": 4}
+    local_backend = None
+
+    @log_action
+    def run_model(self, input_data, cancel_token=None, timeout=None):
+        source = self.prepare_input(input_data)
+        with CancelToken(timeout, parent=cancel_token) as token:
+            if self.local_backend is not None:
+                return self._transcribe_locally(source, cancel_token=token,
+                                                compute_type=self._local().compute_type)
+            return self._transcribe(source, cancel_token=token)
+
+    @log_action
+    async def arun_model(self, input_data, cancel_token=None, timeout=None):
+        source = await asyncio.to_thread(self.prepare_input, input_data)
+        with CancelToken(timeout, parent=cancel_token) as token:
+            if self.local_backend is not None:
+                return await self._atranscribe_locally(source, cancel_token=token,
+                                                       compute_type=self._local().compute_type)
+            return await self._atranscribe(source, cancel_token=token)
+
+    def probe_request(self):
+        return "automatic_speech_recognition", (silent_wav(),), {}
+
+    async def aprobe(self, timeout=None):
+        if self.local_backend is None:
+            return await super().aprobe(timeout)
+        # Starting the worker processes loads the model into each of them
+        await asyncio.wait_for(asyncio.to_thread(self._local().warm), timeout)
+        return True
+
+    def _local(self):
+        from local_whisper import get_backend
+        return get_backend(self._model_name, **self.local_backend)
+
+    @cache_result
+    def _transcribe(self, audio, cancel_token):
+        result = self._call_client_with_file("automatic_speech_recognition", "automatic-speech-recognition",
+                                             audio, AutomaticSpeechRecognitionOutput.parse_obj_as_instance,
+                                             cancel_token=cancel_token)
+        return result.text
+
+    @acache_result
+    async def _atranscribe(self, audio, cancel_token):
+        result = await self._acall_client_with_file("automatic_speech_recognition", "automatic-speech-recognition",
+                                                    audio, AutomaticSpeechRecognitionOutput.parse_obj_as_instance,
+                                                    cancel_token=cancel_token)
+        return result.text
+
+    # compute_type is only there to keep local transcripts, which quantized
+    # weights can change slightly, apart from the API's in the cache
+    @cache_result
+    def _transcribe_locally(self, audio, cancel_token, compute_type):
+        note(provider="local")
+        with phase("request"):
+            return self._local().transcribe(audio.content(), cancel_token=cancel_token)
+
+    @acache_result
+    async def _atranscribe_locally(self, audio, cancel_token, compute_type):
+        note(provider="local")
+        with phase("request"):
+            return await self._with_token(self._local().atranscribe(audio.content()), cancel_token=cancel_token)
+
+    @log_action
+    def transcribe_segments(self, audio, word_timestamps=False, chunk_seconds=CHUNK_SECONDS,
+                            cancel_token=None, timeout=None):
+        """Yield timestamped Segments, one audio chunk at a time
+
+        timeout applies to each chunk so long recordings can run in one pass.
+        The local backend decodes every chunk at once and has no network
+        to wait on, so it ignores timeout; cancel_token still stops it.
+        """
+        source = self.prepare_input(audio)
+        if self.local_backend is not None:
+            note(provider="local")
+            yield from self._local().transcribe_segments(source.content(), word_timestamps,
+                                                         cancel_token=cancel_token)
+            return
+        for offset, duration, chunk in iter_audio_chunks(source.content(), chunk_seconds):
+            with CancelToken(timeout, parent=cancel_token) as token:
+                pieces, text = self._transcribe_chunk(chunk, cancel_token=token,
+                                                      return_timestamps="word" if word_timestamps else True)
+            if not pieces:
+                # The provider ignored return_timestamps, so time the chunk as a whole
+                pieces = [(text, 0.0, duration)]
+            for piece_text, start, end in pieces:
+                if end is None:
+                    end = duration if duration is not None else start
+                yield Segment(offset + start, offset + end, piece_text)
+
+    @cache_result
+    def _transcribe_chunk(self, audio, cancel_token, return_timestamps=True):
+        result = self._call_client("automatic_speech_recognition", audio,
+                                   extra_body={"return_timestamps": return_timestamps},
+                                   cancel_token=cancel_token)
+        pieces = [(chunk.text, chunk.timestamp[0] or 0.0, chunk.timestamp[1])
+                  for chunk in result.chunks or []]
+        return pieces, result.text
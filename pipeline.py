@@ -0,0 +1,191 @@
+import asyncio
+import io
+from collections import namedtuple
+
+from async_runtime import get_runner
+
+# Finished items a stage may hold before it waits for the next stage to take
+# them, so a fast stage cannot pile up results ahead of a slow one
+STAGE_BUFFER = 2
+
+# What became of one input: the result of every stage it got through, and
+# the error that stopped it, if any
+ChainResult = namedtuple("ChainResult", ["index", "results", "error"])
+
+# Marks the end of a stage's input
+_DONE = object()
+
+
+def image_input(image):
+    """Bytes an image model can upload, from a generated image, PIL image or bytes
+
+    An image that was spilled to disk is already PNG, so its file is read
+    back as it is; one still in memory is encoded once, with fast
+    compression since it is only uploaded.
+    """
+    if isinstance(image, (bytes, bytearray)):
+        return bytes(image)
+    path = getattr(image, "path", None)
+    if path is not None and not getattr(image, "in_memory", True):
+        with open(path, "rb") as f:
+            return f.read()
+    if hasattr(image, "open"):
+        # An ImageResult handle
+        image = image.open()
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG", compress_level=1)
+    return buffer.getvalue()
+
+def describe_detections(detections):
+    """A prompt naming the detected objects, most confident first"""
+    labels = []
+    for detection in sorted(detections, key=lambda d: d.score, reverse=True):
+        if detection.label not in labels:
+            labels.append(detection.label)
+    return ", ".join(labels)
+
+# How the result a model renders becomes the next model's input; None passes
+# it on as it is
+CHAIN_ADAPTERS = {
+    ("text", "text"): None,
+    ("image", "image"): image_input,
+    ("detections", "text"): describe_detections,
+}
+
+def can_chain(producer, consumer):
+    """Whether producer's results can be fed to consumer"""
+    return (producer.renderer, consumer.input_type) in CHAIN_ADAPTERS
+
+
+class Stage:
+    """One model in a pipeline, with the keyword arguments it is run with"""
+
+    def __init__(self, model, concurrency=1, **params):
+        self.model = model
+        self.concurrency = concurrency
+        self.params = params
+
+
+class Pipeline:
+    """Feeds each model's result straight into the next one
+
+    Results move between stages in memory: text as it is, images as the
+    bytes an image model uploads, detections as a prompt naming them. run()
+    takes one input through every stage; map() streams many inputs so each
+    stage works on the next item while later stages finish earlier ones.
+    """
+
+    def __init__(self, stages, runner=None):
+        self.stages = [stage if isinstance(stage, Stage) else Stage(stage) for stage in stages]
+        if not self.stages:
+            raise ValueError("A pipeline needs at least one model")
+        self.runner = runner or get_runner()
+        self._adapters = []
+        for producer, consumer in zip(self.stages, self.stages[1:]):
+            if not can_chain(producer.model, consumer.model):
+                raise ValueError(f"{producer.model.task} results cannot be fed to {consumer.model.task}")
+            self._adapters.append(CHAIN_ADAPTERS[(producer.model.renderer, consumer.model.input_type)])
+
+    async def _run_stage(self, position, value, cancel_token, timeout):
+        if position > 0:
+            adapter = self._adapters[position - 1]
+            if adapter is not None:
+                # Encoding an image would otherwise stall the event loop
+                value = await asyncio.to_thread(adapter, value)
+        stage = self.stages[position]
+        return await stage.model.arun_model(value, cancel_token=cancel_token, timeout=timeout, **stage.params)
+
+    async def arun(self, input_data, cancel_token=None, timeout=None):
+        """Run input_data through every stage; returns each stage's result
+
+        timeout applies to each stage separately.
+        """
+        results = []
+        value = input_data
+        for position in range(len(self.stages)):
+            value = await self._run_stage(position, value, cancel_token, timeout)
+            results.append(value)
+        return results
+
+    def run(self, input_data, cancel_token=None, timeout=None):
+        return self.runner.run(self.arun(input_data, cancel_token=cancel_token, timeout=timeout))
+
+    async def amap(self, inputs, cancel_token=None, timeout=None):
+        """Yield a ChainResult for each input, in the order they finish
+
+        Every stage runs up to its concurrency items at once, taking them
+        from the stage before as they arrive. An input that fails at one
+        stage skips the rest.
+        """
+        queues = [asyncio.Queue(STAGE_BUFFER) for _ in self.stages]
+        finished = asyncio.Queue()
+        remaining = [stage.concurrency for stage in self.stages]
+
+        async def end_input():
+            for _ in range(self.stages[0].concurrency):
+                await queues[0].put(_DONE)
+
+        async def feed():
+            try:
+                for index, input_data in enumerate(inputs):
+                    await queues[0].put((index, input_data, []))
+            except asyncio.CancelledError:
+                # The workers are being cancelled too, so nothing would take
+                # an end marker and putting one could block forever
+                raise
+            except Exception:
+                await end_input()
+                raise
+            await end_input()
+
+        async def work(position):
+            last = position == len(self.stages) - 1
+            while True:
+                item = await queues[position].get()
+                if item is _DONE:
+                    break
+                index, value, results = item
+                try:
+                    value = await self._run_stage(position, value, cancel_token, timeout)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    await finished.put(ChainResult(index, results, e))
+                    continue
+                results = results + [value]
+                if last:
+                    await finished.put(ChainResult(index, results, None))
+                else:
+                    await queues[position + 1].put((index, value, results))
+            # The last worker of a stage to stop ends the next stage's input
+            remaining[position] -= 1
+            if remaining[position] == 0:
+                if last:
+                    await finished.put(_DONE)
+                else:
+                    for _ in range(self.stages[position + 1].concurrency):
+                        await queues[position + 1].put(_DONE)
+
+        tasks = [asyncio.ensure_future(feed())]
+        for position, stage in enumerate(self.stages):
+            tasks += [asyncio.ensure_future(work(position)) for _ in range(stage.concurrency)]
+        try:
+            while True:
+                result = await finished.get()
+                if result is _DONE:
+                    break
+                yield result
+            # Surface a failure of the feeder, such as a bad inputs iterable
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _map_all(self, inputs, cancel_token, timeout):
+        results = [result async for result in self.amap(inputs, cancel_token=cancel_token, timeout=timeout)]
+        return sorted(results, key=lambda result: result.index)
+
+    def map(self, inputs, cancel_token=None, timeout=None):
+        """ChainResults for every input, in input order"""
+        return self.runner.run(self._map_all(inputs, cancel_token, timeout))
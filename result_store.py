@@ -0,0 +1,325 @@
+import hashlib
+import io
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+import numpy as np
+
+# Default location of the store, next to output_image.png
+RESULTS_DIR = "results"
+
+# What a blob holds, so get() can decode it
+KIND_BYTES = 0
+KIND_TEXT = 1
+KIND_PNG = 2
+KIND_JSON = 3
+# Index records with this flag delete their key
+FLAG_DELETED = 1
+
+_MAGIC = b"AIRS"
+_VERSION = 1
+# magic, version, record count
+_HEADER = struct.Struct("<4sIQ")
+# Fixed-width index record; numpy reads the whole index through this dtype
+RECORD_DTYPE = np.dtype([
+    # blake2b-128 of the key; raw bytes, since an S16 field would drop a
+    # digest's trailing NUL bytes when read back
+    ("key", "V16"),
+    ("offset", "<u8"),     # start of the blob in blobs.dat
+    ("length", "<u8"),
+    ("model", "<u2"),      # position in models.txt
+    ("kind", "u1"),
+    ("flags", "u1"),
+    ("timestamp", "<f8"),
+    ("crc", "<u4"),        # CRC-32 of the blob
+])
+# Index capacity added whenever it fills up
+_GROW_RECORDS = 65536
+# Share of max_bytes the blobs are trimmed to once they pass it, so trimming
+# and compacting do not run again on the very next put
+TRIM_SHARE = 0.75
+
+
+def key_hash(key):
+    """16-byte digest identifying a key in the index"""
+    if isinstance(key, str):
+        key = key.encode("utf-8")
+    return hashlib.blake2b(key, digest_size=16).digest()
+
+
+class ResultStore:
+    """Append-only store of results: one blob file and a fixed-width index
+
+    Blobs are appended to blobs.dat and described by 48-byte records in
+    index.dat, which is memory-mapped and read as a NumPy record array, so
+    scans never parse text. A dict from key digest to the newest record
+    gives O(1) lookups; overwrites and deletes only append, and compact()
+    rewrites both files without the dead entries. With max_bytes set, the
+    oldest entries are dropped whenever the blob file grows past it.
+    """
+
+    def __init__(self, directory=RESULTS_DIR, max_bytes=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.RLock()
+        self._models_path = os.path.join(directory, "models.txt")
+        self._models = []
+        if os.path.exists(self._models_path):
+            with open(self._models_path, encoding="utf-8") as f:
+                self._models = f.read().splitlines()
+        self._model_ids = {name: i for i, name in enumerate(self._models)}
+        self._open()
+        self.set_max_bytes(max_bytes)
+
+    # Files
+
+    def _open(self):
+        self._blob_path = os.path.join(self.directory, "blobs.dat")
+        self._index_path = os.path.join(self.directory, "index.dat")
+        self._blobs = open(self._blob_path, "a+b")
+        if not os.path.exists(self._index_path):
+            with open(self._index_path, "wb") as f:
+                f.write(_HEADER.pack(_MAGIC, _VERSION, 0))
+                f.truncate(_HEADER.size + _GROW_RECORDS * RECORD_DTYPE.itemsize)
+        self._index_file = open(self._index_path, "r+b")
+        self._map = mmap.mmap(self._index_file.fileno(), 0)
+        magic, version, count = _HEADER.unpack_from(self._map, 0)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f"{self._index_path} is not a version {_VERSION} result index")
+        self._count = count
+
+        # Newest record per key; later records supersede earlier ones
+        records = self.records()
+        self._latest = dict(zip(records["key"].tolist(), range(len(records))))
+        latest = np.fromiter(self._latest.values(), dtype=np.int64, count=len(self._latest))
+        self._live = int(((records["flags"][latest] & FLAG_DELETED) == 0).sum())
+        del records
+
+    def close(self):
+        with self._lock:
+            self._map.close()
+            self._index_file.close()
+            self._blobs.close()
+
+    def _capacity(self):
+        return (len(self._map) - _HEADER.size) // RECORD_DTYPE.itemsize
+
+    def _grow(self):
+        size = _HEADER.size + (self._capacity() + _GROW_RECORDS) * RECORD_DTYPE.itemsize
+        self._map.close()
+        self._index_file.truncate(size)
+        self._map = mmap.mmap(self._index_file.fileno(), 0)
+
+    # Reading
+
+    def records(self):
+        """Every index record, oldest first, as a NumPy record array over the map
+
+        The array is a view: copy what you keep, and drop it before the
+        store grows or compacts.
+        """
+        return np.frombuffer(self._map, dtype=RECORD_DTYPE, count=self._count, offset=_HEADER.size)
+
+    def _record(self, slot):
+        # Copy the bytes out so no view pins the map, which must be closed to grow
+        start = _HEADER.size + slot * RECORD_DTYPE.itemsize
+        return np.frombuffer(self._map[start:start + RECORD_DTYPE.itemsize], dtype=RECORD_DTYPE)[0]
+
+    def __len__(self):
+        return self._live
+
+    def __contains__(self, key):
+        return self._find(key) is not None
+
+    def _find(self, key):
+        with self._lock:
+            slot = self._latest.get(key_hash(key))
+            if slot is None:
+                return None
+            record = self._record(slot)
+        return None if record["flags"] & FLAG_DELETED else record
+
+    def get_bytes(self, key):
+        """The raw blob stored under key and its kind, or (None, None)"""
+        record = self._find(key)
+        if record is None:
+            return None, None
+        return self._read(record), int(record["kind"])
+
+    def get(self, key, default=None):
+        """The value stored under key, decoded by kind"""
+        data, kind = self.get_bytes(key)
+        if data is None:
+            return default
+        return decode(data, kind)
+
+    def _read(self, record):
+        with self._lock:
+            self._blobs.seek(int(record["offset"]))
+            data = self._blobs.read(int(record["length"]))
+        if zlib.crc32(data) != int(record["crc"]):
+            raise IOError("Result store blob is corrupt")
+        return data
+
+    def scan(self, model=None, since=None):
+        """Yield (key digest, model, timestamp, kind) of live entries, oldest first"""
+        with self._lock:
+            records = self.records()
+            live = np.zeros(len(records), dtype=bool)
+            live[list(self._latest.values())] = True
+            live &= (records["flags"] & FLAG_DELETED) == 0
+            if model is not None:
+                live &= records["model"] == self._model_ids.get(model, -1)
+            if since is not None:
+                live &= records["timestamp"] >= since
+            selected = records[live].copy()
+            models = list(self._models)
+            del records
+        for record in selected:
+            yield record["key"].tobytes(), models[record["model"]], float(record["timestamp"]), int(record["kind"])
+
+    # Writing
+
+    def put(self, key, value, model=""):
+        """Store value under key, replacing any earlier value"""
+        data, kind = encode(value)
+        with self._lock:
+            self._blobs.seek(0, os.SEEK_END)
+            offset = self._blobs.tell()
+            self._blobs.write(data)
+            self._blobs.flush()
+            self._append(key_hash(key), offset, len(data), self._model_id(model), kind, 0, zlib.crc32(data))
+            if self.max_bytes is not None and offset + len(data) > self.max_bytes:
+                self.trim(int(self.max_bytes * TRIM_SHARE))
+
+    def set_max_bytes(self, max_bytes):
+        """Limit the blob file to max_bytes, trimming it now if it is over"""
+        with self._lock:
+            self.max_bytes = max_bytes
+            if max_bytes is not None and os.path.getsize(self._blob_path) > max_bytes:
+                self.trim(int(max_bytes * TRIM_SHARE))
+
+    def delete(self, key):
+        """Forget key; returns False if it was not stored"""
+        with self._lock:
+            if self._find(key) is None:
+                return False
+            self._append(key_hash(key), 0, 0, 0, KIND_BYTES, FLAG_DELETED, 0)
+            return True
+
+    def _model_id(self, model):
+        if model not in self._model_ids:
+            self._model_ids[model] = len(self._models)
+            self._models.append(model)
+            with open(self._models_path, "a", encoding="utf-8") as f:
+                f.write(model + "\n")
+        return self._model_ids[model]
+
+    def _append(self, digest, offset, length, model, kind, flags, crc):
+        if self._count >= self._capacity():
+            self._grow()
+        previous = self._latest.get(digest)
+        was_live = previous is not None and not self._record(previous)["flags"] & FLAG_DELETED
+        slot = self._count
+        record = np.array([(digest, offset, length, model, kind, flags, time.time(), crc)], dtype=RECORD_DTYPE)
+        start = _HEADER.size + slot * RECORD_DTYPE.itemsize
+        self._map[start:start + RECORD_DTYPE.itemsize] = record.tobytes()
+        # Count the record only once it is written, so a crash never exposes half of one
+        self._count += 1
+        _HEADER.pack_into(self._map, 0, _MAGIC, _VERSION, self._count)
+        self._latest[digest] = slot
+        self._live += (0 if flags & FLAG_DELETED else 1) - (1 if was_live else 0)
+
+    def flush(self):
+        with self._lock:
+            self._blobs.flush()
+            self._map.flush()
+
+    def trim(self, max_bytes):
+        """Delete the oldest entries until the rest fit in max_bytes, then compact
+
+        Returns the number of bytes of blob data reclaimed.
+        """
+        with self._lock:
+            records = self.records()
+            slots = np.array(sorted(self._latest.values()), dtype=np.int64)
+            slots = slots[(records["flags"][slots] & FLAG_DELETED) == 0]
+            sizes = np.cumsum(records["length"][slots][::-1])[::-1]
+            # Oldest first, drop entries while those after them are over the limit
+            dropped = records["key"][slots[sizes > max_bytes]].copy()
+            del records
+            for digest in dropped:
+                self._append(digest.tobytes(), 0, 0, 0, KIND_BYTES, FLAG_DELETED, 0)
+            return self.compact()
+
+    def compact(self):
+        """Rewrite the store with only the newest live entry of each key
+
+        Returns the number of bytes of blob data reclaimed.
+        """
+        with self._lock:
+            before = os.path.getsize(self._blob_path)
+            blob_tmp = self._blob_path + ".tmp"
+            index_tmp = self._index_path + ".tmp"
+            slots = sorted(slot for slot in self._latest.values()
+                           if not self._record(slot)["flags"] & FLAG_DELETED)
+            capacity = max(_GROW_RECORDS, len(slots) + _GROW_RECORDS)
+            records = np.zeros(len(slots), dtype=RECORD_DTYPE)
+            offset = 0
+            with open(blob_tmp, "wb") as blobs:
+                for i, slot in enumerate(slots):
+                    record = self._record(slot)
+                    data = self._read(record)
+                    blobs.write(data)
+                    records[i] = record
+                    records[i]["offset"] = offset
+                    offset += len(data)
+            with open(index_tmp, "wb") as index:
+                index.write(_HEADER.pack(_MAGIC, _VERSION, len(slots)))
+                index.write(records.tobytes())
+                index.truncate(_HEADER.size + capacity * RECORD_DTYPE.itemsize)
+
+            self.close()
+            os.replace(blob_tmp, self._blob_path)
+            os.replace(index_tmp, self._index_path)
+            self._open()
+            return before - offset
+
+
+def encode(value):
+    """(bytes, kind) for a stored value"""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value), KIND_BYTES
+    if isinstance(value, str):
+        return value.encode("utf-8"), KIND_TEXT
+    if hasattr(value, "save") and hasattr(value, "size"):
+        # PIL images and ImageResult handles
+        buffer = io.BytesIO()
+        value.save(buffer, format="PNG")
+        return buffer.getvalue(), KIND_PNG
+    return json.dumps(value, default=_to_json).encode("utf-8"), KIND_JSON
+
+def decode(data, kind):
+    if kind == KIND_TEXT:
+        return data.decode("utf-8")
+    if kind == KIND_PNG:
+        from PIL import Image
+        image = Image.open(io.BytesIO(data))
+        image.load()
+        return image
+    if kind == KIND_JSON:
+        return json.loads(data)
+    return data
+
+def _to_json(value):
+    # Hub output types such as ObjectDetectionOutputElement are dataclasses
+    # that behave like dicts
+    if hasattr(value, "items"):
+        return dict(value.items())
+    raise TypeError(f"Cannot store {type(value).__name__} as JSON")
@@ -0,0 +1,142 @@
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+# Directory where run profiles are saved
+PROFILE_DIR = "profiles"
+# Seconds between stack samples for the flame graph dump
+SAMPLE_INTERVAL = 0.005
+# Before Python 3.12 a profile only sees the thread that enabled it, so each
+# thread gets its own; from 3.12 one profile sees every thread, and only one
+# may be enabled at a time
+_PROFILE_PER_THREAD = sys.version_info < (3, 12)
+
+
+class RunProfiler:
+    """Profiles one GUI run across the Tk thread and the event loop thread
+
+    Phases (input, model, render, ...) are timed by wall clock, and each
+    thread is profiled by cProfile while it is in a phase; the threads'
+    profiles are merged when the run is saved. A sampler thread meanwhile
+    records the stacks of every thread, labelled with the active phase, for
+    a flame graph.
+    """
+
+    def __init__(self, name="run"):
+        self.name = name
+        self.phases = []
+        # [profile, phases the thread is in] by thread id
+        self._profiles = {}
+        self._lock = threading.Lock()
+        self._current_phase = "idle"
+        self._samples = Counter()
+        self._stop = threading.Event()
+        self._sampler = None
+        self.start_time = None
+
+    def start(self):
+        self.start_time = time.perf_counter()
+        self._sampler = threading.Thread(target=self._sample, name="run-profiler", daemon=True)
+        self._sampler.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+
+    @contextmanager
+    def phase(self, name):
+        """Time a phase and profile the calling thread while it runs"""
+        start = time.perf_counter()
+        previous, self._current_phase = self._current_phase, name
+        self._enable()
+        try:
+            yield
+        finally:
+            self._disable()
+            self._current_phase = previous
+            self.phases.append((name, start - self.start_time, time.perf_counter() - start))
+
+    async def profile_coroutine(self, coro, name="model"):
+        """Await coro inside a phase on the event loop thread"""
+        with self.phase(name):
+            return await coro
+
+    # A profile may only be enabled once at a time, so the nested and
+    # overlapping phases of a thread share one enable/disable pair
+    def _enable(self):
+        thread = threading.get_ident() if _PROFILE_PER_THREAD else None
+        with self._lock:
+            entry = self._profiles.setdefault(thread, [cProfile.Profile(), 0])
+            if entry[1] == 0:
+                entry[0].enable()
+            entry[1] += 1
+
+    def _disable(self):
+        thread = threading.get_ident() if _PROFILE_PER_THREAD else None
+        with self._lock:
+            entry = self._profiles[thread]
+            entry[1] -= 1
+            if entry[1] == 0:
+                entry[0].disable()
+
+    def stats(self, stream=None):
+        """pstats.Stats of every thread's profile together, or None if nothing ran"""
+        with self._lock:
+            profiles = [profile for profile, _ in self._profiles.values()]
+        if not profiles:
+            return None
+        stats = pstats.Stats(profiles[0], stream=stream)
+        for profile in profiles[1:]:
+            stats.add(profile)
+        return stats
+
+    def _sample(self):
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stop.wait(SAMPLE_INTERVAL):
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                stack.append(self._current_phase)
+                self._samples[";".join(reversed(stack))] += 1
+
+    def save(self, directory=PROFILE_DIR):
+        """Write the .prof, summary .txt and collapsed-stack .folded files; returns their paths"""
+        os.makedirs(directory, exist_ok=True)
+        stem = os.path.join(directory, f"{self.name}-{time.strftime('%Y%m%d-%H%M%S')}")
+        paths = {"prof": stem + ".prof", "txt": stem + ".txt", "folded": stem + ".folded"}
+
+        summary = io.StringIO()
+        summary.write(f"Phases for {self.name} (start / duration, seconds):\n")
+        for name, start, duration in self.phases:
+            summary.write(f"  {name:<10} {start:8.3f} {duration:8.3f}\n")
+        summary.write("\n")
+        stats = self.stats(stream=summary)
+        if stats is not None:
+            # Load with `python -m pstats <file>` to sort interactively
+            stats.dump_stats(paths["prof"])
+            stats.sort_stats("cumulative").print_stats(40)
+        with open(paths["txt"], "w", encoding="utf-8") as f:
+            f.write(summary.getvalue())
+
+        # One "phase;thread;frame;...;frame count" line per stack, as read by
+        # flamegraph.pl and speedscope
+        with open(paths["folded"], "w", encoding="utf-8") as f:
+            for stack, count in self._samples.most_common():
+                f.write(f"{stack} {count}\n")
+        return paths
@@ -0,0 +1,97 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+
+# On-disk index of session results, next to output_image.png
+SEARCH_DB = "search_index.db"
+
+# Markers snippet() puts around matched terms, for the GUI to highlight
+HIT_START = "\x02"
+HIT_END = "\x03"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    digest TEXT UNIQUE NOT NULL,
+    kind TEXT NOT NULL,
+    model TEXT NOT NULL,
+    source TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS documents USING fts5(
+    source, body, tokenize = 'porter unicode61'
+);
+"""
+
+
+class SearchIndex:
+    """SQLite FTS5 index of transcripts, prompts and other results
+
+    Each result is one row in an inverted index kept on disk, so adding a
+    result is a single small insert and queries are ranked by BM25 without
+    scanning every document. Identical results are only stored once.
+    """
+
+    def __init__(self, path=SEARCH_DB):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode = WAL")
+            self._conn.execute("PRAGMA synchronous = NORMAL")
+            self._conn.executescript(_SCHEMA)
+
+    def add(self, kind, model, source, body):
+        """Index one result; returns False if it was already indexed"""
+        digest = hashlib.sha256("\0".join((kind, model, source, body)).encode("utf-8")).hexdigest()
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO results (digest, kind, model, source, created) VALUES (?, ?, ?, ?, ?)",
+                (digest, kind, model, source, time.time()))
+            if not cursor.rowcount:
+                return False
+            self._conn.execute("INSERT INTO documents (rowid, source, body) VALUES (?, ?, ?)",
+                               (cursor.lastrowid, source, body))
+        return True
+
+    def search(self, query, limit=50):
+        """Return the best matches for free text as dicts, best first"""
+        match = to_match_expression(query)
+        if not match:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT r.kind, r.model, r.source, r.created, bm25(documents) AS rank,"
+                f" snippet(documents, 1, '{HIT_START}', '{HIT_END}', ' … ', 16)"
+                " FROM documents JOIN results r ON r.id = documents.rowid"
+                " WHERE documents MATCH ? ORDER BY rank LIMIT ?",
+                (match, limit)).fetchall()
+        return [
+            {"kind": kind, "model": model, "source": source, "created": created,
+             "score": -rank, "snippet": snippet}
+            for kind, model, source, created, rank, snippet in rows
+        ]
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def to_match_expression(query):
+    """Turn what a user typed into an FTS5 query that cannot be a syntax error
+
+    Every word must match, and the last one also matches as a prefix so
+    results appear while it is still being typed.
+    """
+    words = re.findall(r"\w+", query)
+    if not words:
+        return ""
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
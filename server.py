@@ -0,0 +1,332 @@
+import asyncio
+import base64
+import io
+import json
+import math
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from async_runtime import get_runner
+from cancellation import CancelToken
+from models import MODEL_REGISTRY, load_plugins
+
+
+class ServiceBusy(Exception):
+    """Raised when the job queue is full"""
+
+
+class Job:
+    """One inference request and its outcome"""
+
+    def __init__(self, model_key, input_data, params):
+        self.id = uuid.uuid4().hex
+        self.model_key = model_key
+        self.input_data = input_data
+        self.params = params
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self.future = None
+        # Cancelled when nobody is waiting for the result any more
+        self.token = CancelToken()
+        self.done = threading.Event()
+
+    def to_dict(self):
+        data = {
+            "id": self.id,
+            "model": self.model_key,
+            "status": self.status,
+            "created": self.created,
+            "finished": self.finished,
+        }
+        if self.status == "done":
+            data["result"] = self.result
+        elif self.status == "error":
+            data["error"] = self.error
+        return data
+
+
+class InferenceService:
+    """Runs jobs for every client on the shared event loop, cache and model instances
+
+    At most max_pending jobs may be queued or running; further submissions
+    raise ServiceBusy so the HTTP layer can answer 503 instead of queueing
+    without bound.
+    """
+
+    def __init__(self, max_pending=64, concurrency=8, job_retention=600):
+        self.max_pending = max_pending
+        self.concurrency = concurrency
+        self.job_retention = job_retention
+        self.runner = get_runner()
+        self._jobs = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._semaphore = None
+
+    def list_models(self):
+        return [
+            {
+                "key": spec.key,
+                "model": spec.model_name,
+                "title": spec.title.strip(),
+                "description": spec.description,
+                "task": spec.model_class.task,
+                "input_type": spec.input_type,
+                "renderer": spec.model_class.renderer,
+            }
+            for spec in MODEL_REGISTRY.values()
+        ]
+
+    def submit(self, model_key, input_data, params=None):
+        """Queue a job and return it; raises KeyError for unknown models"""
+        spec = MODEL_REGISTRY[model_key]
+        job = Job(model_key, input_data, params or {})
+        with self._lock:
+            self._forget_old_jobs()
+            if self._pending >= self.max_pending:
+                raise ServiceBusy(f"{self._pending} jobs already pending")
+            self._pending += 1
+            self._jobs[job.id] = job
+        job.future = self.runner.submit(self._run(spec, job))
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    async def _run(self, spec, job):
+        # The semaphore belongs to the runner's loop, so create it there
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        try:
+            async with self._semaphore:
+                job.token.check()
+                job.status = "running"
+                model = spec.load()
+                result = await model.arun_model(job.input_data, cancel_token=job.token, **job.params)
+            # PNG and base64 encoding would stall every other job on the loop
+            job.result = await asyncio.to_thread(serialize_result, model.renderer, result)
+            job.status = "done"
+        except Exception as e:
+            if job.token.cancelled:
+                job.status = "cancelled"
+            else:
+                job.error = f"{type(e).__name__}: {e}"
+                job.status = "error"
+        finally:
+            job.finished = time.time()
+            with self._lock:
+                self._pending -= 1
+            job.done.set()
+
+    def _forget_old_jobs(self):
+        cutoff = time.time() - self.job_retention
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished is not None and job.finished < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+def serialize_result(renderer, result):
+    """Convert a model result to JSON-friendly data"""
+    if renderer == "image" and hasattr(result, "save"):
+        buffer = io.BytesIO()
+        result.save(buffer, format="PNG")
+        return {
+            "type": "image",
+            "format": "png",
+            "width": result.size[0],
+            "height": result.size[1],
+            "data": base64.b64encode(buffer.getvalue()).decode("ascii"),
+        }
+    if renderer == "detections":
+        return {
+            "type": "detections",
+            "detections": [
+                {
+                    "label": d.label,
+                    "score": d.score,
+                    "box": {"xmin": d.box.xmin, "ymin": d.box.ymin,
+                            "xmax": d.box.xmax, "ymax": d.box.ymax},
+                }
+                for d in result
+            ],
+        }
+    return {"type": "text", "text": str(result)}
+
+
+class InferenceRequestHandler(BaseHTTPRequestHandler):
+    """JSON endpoints over an InferenceService
+
+    GET  /models                    registered models
+    POST /models/<key>/run          run and wait for the result
+    POST /jobs                      queue a job, returns its id (202)
+    GET  /jobs/<id>?wait=<seconds>  job status, long-polling up to wait
+    GET  /jobs/<id>/stream          newline-delimited JSON status until done
+    """
+
+    service = None
+    # Longest a single request may block waiting for a job
+    MAX_WAIT = 300
+    server_version = "AIStudio/1.0"
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = [p for p in url.path.split("/") if p]
+        if parts == ["models"]:
+            self.send_json(200, {"models": self.service.list_models()})
+        elif len(parts) == 2 and parts[0] == "jobs":
+            try:
+                wait = self.seconds(parse_qs(url.query).get("wait", ["0"])[0], "wait")
+            except ValueError as e:
+                self.send_json(400, {"error": str(e)})
+                return
+            self.send_job(parts[1], wait)
+        elif len(parts) == 3 and parts[0] == "jobs" and parts[2] == "stream":
+            self.stream_job(parts[1])
+        else:
+            self.send_json(404, {"error": "Not found"})
+
+    def do_POST(self):
+        parts = [p for p in urlparse(self.path).path.split("/") if p]
+        try:
+            body = self.read_json()
+            if not isinstance(body, dict):
+                raise ValueError("Request body must be a JSON object")
+        except ValueError as e:
+            self.send_json(400, {"error": str(e)})
+            return
+
+        # Model keys are Hub names such as "facebook/detr-resnet-50"
+        if len(parts) >= 3 and parts[0] == "models" and parts[-1] == "run":
+            job = self.submit("/".join(parts[1:-1]), body)
+            if job is not None:
+                if not job.done.wait(job.params.get("timeout", self.MAX_WAIT)):
+                    # The client gets no result, so stop the work
+                    job.token.cancel()
+                self.send_json(200 if job.status == "done" else 500 if job.status == "error" else 504,
+                               job.to_dict())
+        elif parts == ["jobs"]:
+            job = self.submit(body.get("model"), body)
+            if job is not None:
+                self.send_json(202, job.to_dict())
+        else:
+            self.send_json(404, {"error": "Not found"})
+
+    def submit(self, model_key, body):
+        """Queue a job from a request body, answering the client on failure"""
+        try:
+            input_data = body["input"] if "input" in body else base64.b64decode(body["input_base64"])
+        except (KeyError, TypeError, ValueError):
+            self.send_json(400, {"error": "Request needs 'input' or 'input_base64'"})
+            return None
+        params = body.get("params", {})
+        try:
+            if not isinstance(params, dict):
+                raise ValueError("'params' must be a JSON object")
+            params = dict(params)
+            # A timeout in params reaches the model and the wait just the same
+            if "timeout" in params:
+                params["timeout"] = self.seconds(params["timeout"], "timeout", positive=True)
+            if "timeout" in body:
+                params["timeout"] = self.seconds(body["timeout"], "timeout", positive=True)
+        except ValueError as e:
+            self.send_json(400, {"error": str(e)})
+            return None
+        try:
+            return self.service.submit(model_key, input_data, params)
+        except (KeyError, TypeError):
+            self.send_json(404, {"error": f"Unknown model: {model_key}"})
+        except ServiceBusy as e:
+            self.send_json(503, {"error": f"Service busy: {e}"}, headers={"Retry-After": "1"})
+        return None
+
+    def seconds(self, value, name, positive=False):
+        """value as a number of seconds capped at MAX_WAIT
+
+        Raises ValueError for anything that is not a non-negative number, or
+        not a positive one when positive is set.
+        """
+        try:
+            if isinstance(value, bool):
+                raise TypeError
+            seconds = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"'{name}' must be a number of seconds")
+        if math.isnan(seconds) or seconds < 0 or (positive and seconds == 0):
+            raise ValueError(f"'{name}' must be a {'positive' if positive else 'non-negative'} number of seconds")
+        return min(seconds, self.MAX_WAIT)
+
+    def send_job(self, job_id, wait):
+        job = self.service.get(job_id)
+        if job is None:
+            self.send_json(404, {"error": f"Unknown job: {job_id}"})
+            return
+        job.done.wait(wait)
+        self.send_json(200, job.to_dict())
+
+    def stream_job(self, job_id):
+        job = self.service.get(job_id)
+        if job is None:
+            self.send_json(404, {"error": f"Unknown job: {job_id}"})
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        deadline = time.monotonic() + self.MAX_WAIT
+        while True:
+            finished = job.done.wait(1.0)
+            self.write_chunk(json.dumps(job.to_dict() if finished else
+                                        {"id": job.id, "status": job.status}) + "\n")
+            if finished or time.monotonic() > deadline:
+                break
+        self.write_chunk("")
+
+    def write_chunk(self, text):
+        data = text.encode("utf-8")
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        if not length:
+            return {}
+        try:
+            return json.loads(self.rfile.read(length))
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON body: {e}")
+
+    def send_json(self, status, data, headers=None):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        print(f"[LOG] {self.address_string()} {format % args}")
+
+
+def serve(host="127.0.0.1", port=8137, max_pending=64, concurrency=8):
+    """Serve the model registry over HTTP until interrupted"""
+    load_plugins()
+    handler = type("Handler", (InferenceRequestHandler,),
+                   {"service": InferenceService(max_pending, concurrency)})
+    server = ThreadingHTTPServer((host, port), handler)
+    print(f"[LOG] AI Studio inference service listening on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
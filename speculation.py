@@ -0,0 +1,78 @@
+import threading
+import time
+
+from cancellation import CancelToken
+
+# Seconds typing must pause before a draft is requested
+SPECULATE_DELAY = 0.8
+# Fewest seconds between two speculative requests, however fast the typing
+SPECULATE_MIN_INTERVAL = 5.0
+
+
+class Speculator:
+    """Runs a model on a prompt before it is asked to, so the real run finds
+    the result in the result cache
+
+    Only one speculative request runs at a time; starting another, or
+    cancelling because the prompt changed, stops it. Requests are spaced at
+    least min_interval apart. The result is not returned anywhere: the
+    cache keeps it, and a run with the same prompt and parameters either
+    gets it straight away or joins the request still in flight.
+    """
+
+    def __init__(self, runner, min_interval=SPECULATE_MIN_INTERVAL):
+        self.runner = runner
+        self.min_interval = min_interval
+        self.prompt = None
+        self.params = None
+        self.future = None
+        self._token = None
+        self._last_start = None
+        self._lock = threading.Lock()
+        # Speculative requests started, and those cancelled before finishing
+        self.started = 0
+        self.cancelled = 0
+
+    def wait_time(self):
+        """Seconds until another request may start; 0 if one may start now"""
+        if self._last_start is None:
+            return 0.0
+        return max(self._last_start + self.min_interval - time.monotonic(), 0.0)
+
+    def start(self, model, prompt, timeout=None, **params):
+        """Request model's result for prompt in the background
+
+        Returns the future, or None if the rate limit does not allow a
+        request yet. The same prompt and params are not requested twice in
+        a row unless the first request failed.
+        """
+        with self._lock:
+            if (self.future is not None and self.prompt == prompt and self.params == params
+                    and not (self.future.done() and self.future.exception() is not None)):
+                return self.future
+            self._cancel()
+            if self.wait_time() > 0:
+                return None
+            token = self._token = CancelToken(timeout)
+            self.prompt = prompt
+            self.params = params
+            self._last_start = time.monotonic()
+            self.started += 1
+            self.future = self.runner.submit(model.arun_model(prompt, cancel_token=token, **params))
+        self.future.add_done_callback(lambda future: token.release())
+        return self.future
+
+    def cancel(self, prompt=None):
+        """Stop the running request, unless it is for prompt"""
+        with self._lock:
+            if prompt is None or prompt != self.prompt:
+                self._cancel()
+
+    def _cancel(self):
+        if self.future is not None and not self.future.done():
+            self._token.cancel()
+            self.future.cancel()
+            self.cancelled += 1
+        self.future = None
+        self.prompt = None
+        self.params = None
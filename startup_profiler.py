@@ -0,0 +1,133 @@
+import json
+import sys
+import time
+
+# Default limit in seconds from launch to a usable window with a model ready
+STARTUP_BUDGET = 3.0
+
+
+class _TimingLoader:
+    """Wraps a module loader to time its exec_module()"""
+
+    def __init__(self, loader, profiler):
+        self._loader = loader
+        self._profiler = profiler
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        profiler = self._profiler
+        profiler._stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            elapsed = time.perf_counter() - start
+            children = profiler._stack.pop()
+            if profiler._stack:
+                profiler._stack[-1] += elapsed
+            profiler.imports.append({
+                "module": module.__name__,
+                "cumulative": elapsed,
+                "self": elapsed - children,
+            })
+
+
+class StartupProfiler:
+    """Records per-module import times and named startup milestones"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.imports = []
+        self.marks = {}
+        self._stack = []
+        self._installed = False
+
+    # Meta path finder protocol: wrap the loader of every module found after us
+    def find_spec(self, name, path=None, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is None:
+                continue
+            if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                spec.loader = _TimingLoader(spec.loader, self)
+            return spec
+        return None
+
+    def install(self):
+        if not self._installed:
+            sys.meta_path.insert(0, self)
+            self._installed = True
+
+    def uninstall(self):
+        if self._installed:
+            sys.meta_path.remove(self)
+            self._installed = False
+
+    def mark(self, name):
+        """Record a milestone as seconds since the profiler started"""
+        self.marks[name] = time.perf_counter() - self.start
+
+    def report(self, top=20):
+        """Return the report as a dict and a printable summary"""
+        slowest = sorted(self.imports, key=lambda entry: entry["self"], reverse=True)
+        data = {"marks": self.marks, "imports": slowest}
+        lines = ["Startup milestones (seconds since launch):"]
+        lines += [f"  {name:<20} {seconds:8.3f}" for name, seconds in self.marks.items()]
+        lines.append(f"\nSlowest {min(top, len(slowest))} of {len(slowest)} imports (self / cumulative seconds):")
+        lines += [f"  {entry['self']:8.4f} {entry['cumulative']:8.4f}  {entry['module']}"
+                  for entry in slowest[:top]]
+        return data, "\n".join(lines)
+
+
+def profile_startup(budget=STARTUP_BUDGET, output="startup_profile.json"):
+    """Launch the GUI with profiling, write a report and return an exit code
+
+    Returns 1 when the window took longer than budget seconds to be painted
+    with a model ready, so the check can run in CI.
+    """
+    profiler = StartupProfiler()
+    profiler.install()
+    app = None
+    try:
+        from gui import AppGUI
+        profiler.mark("gui_imported")
+
+        app = AppGUI()
+        profiler.mark("gui_constructed")
+
+        # Process pending map and draw events so the window is on screen
+        app.root.update()
+        profiler.mark("first_paint")
+
+        # Creating the first model is what a user waits for on their first selection
+        spec = next(iter(app.model_specs.values()), None)
+        if spec is not None:
+            spec.load()
+        profiler.mark("model_ready")
+    finally:
+        profiler.uninstall()
+        # AppGUI() itself may be what failed
+        if app is not None:
+            app.root.destroy()
+
+    data, summary = profiler.report()
+    data["budget"] = budget
+    total = profiler.marks["model_ready"]
+    data["within_budget"] = total <= budget
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+
+    print(summary)
+    print(f"\nReport written to {output}")
+    if total > budget:
+        print(f"Startup took {total:.3f}s, over the {budget:.3f}s budget")
+        return 1
+    print(f"Startup took {total:.3f}s, within the {budget:.3f}s budget")
+    return 0
@@ -0,0 +1,87 @@
+import asyncio
+import time
+
+import pytest
+
+from async_runtime import AsyncRunner
+from batch_queue import CANCELLED, DONE, RUNNING, BatchQueue
+from models import AIModel
+
+
+class TagModel(AIModel):
+    task = "Tag"
+    input_type = "text"
+    renderer = "text"
+
+    def __init__(self, tag, delay=0.0):
+        super().__init__(tag)
+        self.tag = tag
+        self.delay = delay
+
+    async def arun_model(self, input_data, cancel_token=None, timeout=None):
+        deadline = time.monotonic() + self.delay
+        while time.monotonic() < deadline:
+            cancel_token.check()
+            await asyncio.sleep(0.01)
+        return f"{self.tag}:{input_data}"
+
+
+@pytest.fixture
+def queue():
+    runner = AsyncRunner()
+    yield BatchQueue(runner)
+    runner.stop()
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_runs_every_item(queue):
+    items = queue.add(["a", "b", "c"])
+    queue.start(TagModel("x"), concurrency=2)
+    wait_for(lambda: not queue.running)
+    assert [item.result for item in items] == ["x:a", "x:b", "x:c"]
+    assert all(item.model is queue.model for item in items)
+
+
+def test_items_after_a_model_switch_run_on_the_new_model(queue):
+    slow, fast = TagModel("old", delay=0.3), TagModel("new")
+    first, *rest = queue.add(["a", "b", "c", "d"])
+    queue.start(slow, concurrency=1)
+    wait_for(lambda: first.status == RUNNING)
+    queue.start(fast, concurrency=1)
+    wait_for(lambda: queue.counts()[DONE] == 4)
+    # The item already running finishes on the model it started with
+    assert first.model is slow and first.result == "old:a"
+    assert all(item.model is fast for item in rest)
+    assert [item.result for item in rest] == ["new:b", "new:c", "new:d"]
+    wait_for(lambda: not queue.running)
+
+
+def test_model_switch_starts_the_full_concurrency(queue):
+    slow, fast = TagModel("old", delay=0.3), TagModel("new", delay=0.2)
+    queue.add(["a", "b"])
+    queue.start(slow, concurrency=2)
+    wait_for(lambda: queue.counts()[RUNNING] == 2)
+    items = queue.add(["c", "d"])
+    queue.start(fast, concurrency=2)
+    # Both new items run at once, alongside the retiring slow workers
+    wait_for(lambda: all(item.status == RUNNING for item in items))
+    wait_for(lambda: queue.counts()[DONE] == 4)
+    assert [item.model for item in items] == [fast, fast]
+
+
+def test_cancel_stops_items_still_running_on_a_previous_model(queue):
+    slow, fast = TagModel("old", delay=5.0), TagModel("new", delay=5.0)
+    first, second, third = queue.add(["a", "b", "c"])
+    queue.start(slow, concurrency=1)
+    wait_for(lambda: first.status == RUNNING)
+    queue.start(fast, concurrency=1)
+    wait_for(lambda: second.status == RUNNING)
+    queue.cancel()
+    wait_for(lambda: not queue.running and first.status == CANCELLED)
+    assert (first.model, second.status, third.status) == (slow, CANCELLED, CANCELLED)
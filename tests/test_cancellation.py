@@ -0,0 +1,92 @@
+import time
+
+import pytest
+
+from cancellation import CancelToken, CancelledError, DeadlineExceededError
+
+
+def test_token_without_deadline_runs_until_cancelled():
+    with CancelToken() as token:
+        assert token.remaining() is None
+        token.check()
+        token.cancel()
+        assert token.cancelled
+        with pytest.raises(CancelledError) as caught:
+            token.check()
+        assert not isinstance(caught.value, DeadlineExceededError)
+
+
+def test_deadline_expires_by_itself():
+    with CancelToken(timeout=0.05) as token:
+        assert 0 < token.remaining() <= 0.05
+        assert token.wait(2)
+        assert token.cancelled and token.remaining() == 0
+        with pytest.raises(DeadlineExceededError):
+            token.check()
+
+
+def test_check_notices_a_passed_deadline_before_the_timer():
+    with CancelToken(timeout=10) as token:
+        token.deadline = time.monotonic() - 1
+        with pytest.raises(TimeoutError):
+            token.check()
+        assert token.cancelled
+
+
+def test_cancelling_the_parent_cancels_its_children():
+    with CancelToken() as parent, CancelToken(parent=parent) as child:
+        parent.cancel()
+        assert child.cancelled
+        with pytest.raises(CancelledError) as caught:
+            child.check()
+        assert not isinstance(caught.value, DeadlineExceededError)
+
+
+def test_child_expires_with_its_parent_deadline():
+    with CancelToken(timeout=0.05) as parent, CancelToken(timeout=60, parent=parent) as child:
+        assert child.deadline == parent.deadline
+        assert child.wait(2)
+        with pytest.raises(DeadlineExceededError):
+            child.check()
+
+
+def test_cancelling_a_child_leaves_the_parent_running():
+    with CancelToken() as parent:
+        with CancelToken(parent=parent) as child:
+            child.cancel()
+        assert not parent.cancelled
+        assert parent._callbacks == []
+
+
+def test_callbacks_run_once():
+    calls = []
+    with CancelToken() as token:
+        token.add_callback(lambda: calls.append("first"))
+        remove = token.add_callback(lambda: calls.append("removed"))
+        remove()
+        token.cancel()
+        token.cancel()
+        assert calls == ["first"]
+        # Registered after cancellation: runs straight away
+        token.add_callback(lambda: calls.append("late"))
+    assert calls == ["first", "late"]
+
+
+def test_failing_callback_does_not_stop_the_others():
+    calls = []
+
+    def fail():
+        raise RuntimeError("closed")
+
+    with CancelToken() as token:
+        token.add_callback(fail)
+        token.add_callback(lambda: calls.append("next"))
+        token.cancel()
+    assert calls == ["next"]
+
+
+def test_released_token_does_not_expire():
+    token = CancelToken(timeout=0.05)
+    token.release()
+    assert not token.wait(0.2)
+    assert not token.cancelled
@@ -0,0 +1,36 @@
+import async_runtime
+from config import apply_config, load_config
+
+
+class FakeRunner:
+    def __init__(self):
+        self.pool_sizes = []
+
+    def set_thread_pool_size(self, size):
+        self.pool_sizes.append(size)
+
+
+def settings(tmp_path, name, text):
+    path = tmp_path / name
+    path.write_text(text, encoding="utf-8")
+    return load_config(str(path), environ={})
+
+
+def test_thread_pool_back_to_zero_restores_the_default(tmp_path, monkeypatch):
+    runner = FakeRunner()
+    monkeypatch.setattr(async_runtime, "get_runner", lambda: runner)
+    default = settings(tmp_path, "default.ini", "[concurrency]\nthread_pool = 0\n")
+    sized = settings(tmp_path, "sized.ini", "[concurrency]\nthread_pool = 6\n")
+    apply_config(sized, default)
+    apply_config(default, sized)
+    assert runner.pool_sizes == [6, None]
+
+
+def test_unchanged_thread_pool_is_left_alone(tmp_path, monkeypatch):
+    runner = FakeRunner()
+    monkeypatch.setattr(async_runtime, "get_runner", lambda: runner)
+    first = settings(tmp_path, "first.ini", "[concurrency]\nthread_pool = 0\n")
+    second = settings(tmp_path, "second.ini", "[concurrency]\nthread_pool = 0\nbatch = 4\n")
+    apply_config(second, first)
+    apply_config(first)
+    assert runner.pool_sizes == []
@@ -0,0 +1,110 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import event_log
+from event_log import EventLog, note, phase, sample_rate
+
+MODEL = SimpleNamespace(model_name="m", task="Test")
+
+
+def read_events(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+@pytest.fixture
+def log(tmp_path):
+    log = EventLog(str(tmp_path / "events.jsonl"))
+    yield log
+    log.close()
+
+
+def call(log, input_data="prompt", result="ok", error=None, duration=None):
+    started = log.start_call(MODEL, "run_model", input_data)
+    with phase("request"):
+        note(cache="miss")
+    if duration is not None and started is not None:
+        started[0]["_start"] -= duration
+    log.finish_call(started, result=result, error=error)
+
+
+def test_events_record_input_phases_and_output(log):
+    call(log, input_data=b"abc")
+    log.close()
+    (event,) = read_events(log.path)
+    assert event["model"] == "m" and event["cache"] == "miss"
+    assert event["input"]["bytes"] == 3 and "request" in event["phases"]
+    assert event["output"] == {"chars": 2}
+
+
+def test_one_bad_input_costs_only_its_own_description(log, monkeypatch):
+    def describe(value):
+        if value == "gone":
+            raise FileNotFoundError("gone")
+        return {"chars": len(value)}
+
+    monkeypatch.setattr(event_log, "describe_input", describe)
+    for input_data in ("first", "gone", "last"):
+        call(log, input_data=input_data)
+    log.close()
+    events = read_events(log.path)
+    assert [event["input"] for event in events] == [
+        {"chars": 5}, {"error": "FileNotFoundError: gone"}, {"chars": 4}]
+
+
+def test_unsampled_calls_keep_only_errors_and_slow_ones(log):
+    log.sample_rate = 0
+    call(log, input_data="ordinary")
+    call(log, input_data="failed", error=ValueError("bad"))
+    call(log, input_data="slow", duration=log.slow_seconds + 1)
+    log.close()
+    events = read_events(log.path)
+    assert [event.get("error") for event in events] == ["ValueError: bad", None]
+    assert events[1]["duration"] >= log.slow_seconds
+
+
+def test_context_sample_rate_overrides_the_log(log):
+    token = sample_rate.set(0)
+    try:
+        call(log)
+    finally:
+        sample_rate.reset(token)
+    call(log)
+    log.close()
+    assert [event["sample_rate"] for event in read_events(log.path)] == [1.0]
+
+
+def test_disabled_log_records_nothing(log):
+    log.enabled = False
+    call(log)
+    log.close()
+    assert log._thread is None
+
+
+def test_log_rotates_by_size_and_keeps_the_backups(log, tmp_path):
+    log.max_bytes = 600
+    log.backups = 2
+    for i in range(30):
+        call(log, input_data=f"prompt {i}")
+    log.close()
+    names = sorted(path.name for path in tmp_path.iterdir())
+    assert names == ["events.jsonl", "events.jsonl.1", "events.jsonl.2"]
+    for name in names:
+        assert (tmp_path / name).stat().st_size <= 600
+    newest = read_events(log.path)[-1]["input"]
+    assert newest == event_log.describe_input("prompt 29")
+
+
+def test_full_queue_drops_and_counts_events(tmp_path, monkeypatch):
+    log = EventLog(str(tmp_path / "events.jsonl"), queue_size=1)
+    monkeypatch.setattr(log, "_ensure_writer", lambda: None)
+    for _ in range(3):
+        call(log)
+    assert log.dropped == 2
+    log._write([log._queue.get_nowait()])
+    log._file.close()
+    events = read_events(log.path)
+    assert [event["event"] for event in events] == ["inference", "dropped"]
+    assert events[1]["count"] == 2
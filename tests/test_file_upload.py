@@ -0,0 +1,47 @@
+import asyncio
+import threading
+
+import pytest
+
+from cancellation import CancelToken
+from model_input import ModelInput
+from models import ObjectDetectionModel
+
+
+@pytest.fixture
+def model(monkeypatch):
+    model = ObjectDetectionModel("facebook/detr-resnet-50")
+    calls = []
+
+    def call_client_with_file(method, task, source, parse, cancel_token):
+        calls.append(("stream", source.content(), threading.current_thread() is threading.main_thread()))
+        return "streamed"
+
+    async def acall_client(method, *args, cancel_token, **kwargs):
+        calls.append(("async", args[0]))
+        return "sent"
+
+    monkeypatch.setattr(model, "_call_client_with_file", call_client_with_file)
+    monkeypatch.setattr(model, "_acall_client", acall_client)
+    model.calls = calls
+    return model
+
+
+def upload(model, source):
+    return asyncio.run(model._acall_client_with_file("object_detection", "object-detection", source, None,
+                                                     cancel_token=CancelToken()))
+
+
+def test_large_file_is_streamed_on_a_worker_thread(model, tmp_path):
+    path = tmp_path / "big.png"
+    path.write_bytes(b"\x89PNG\r\n\x1a\n" + bytes(model.STREAM_UPLOAD_THRESHOLD))
+    assert upload(model, ModelInput.from_path(str(path))) == "streamed"
+    assert model.calls == [("stream", str(path), False)]
+
+
+def test_small_file_uses_the_async_client(model, tmp_path):
+    path = tmp_path / "small.png"
+    path.write_bytes(b"\x89PNG\r\n\x1a\n" + bytes(100))
+    source = ModelInput.from_path(str(path))
+    assert upload(model, source) == "sent"
+    assert model.calls == [("async", source.data)]
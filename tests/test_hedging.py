@@ -0,0 +1,162 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import decorators
+import hedging
+import models
+from cancellation import CancelledError, CancelToken, DeadlineExceededError
+from decorators import acache_result, cache_result, clear_result_cache
+from hedging import LatencyTracker, Route, can_fall_back
+from models import AIModel
+from traffic import ReplayedError
+
+PRIMARY, SAME_MODEL, OTHER_MODEL = Route(None, None), Route("fal-ai", None), Route("hf-inference", "other")
+
+
+class HTTPError(Exception):
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.response = SimpleNamespace(status_code=status)
+
+
+@pytest.mark.parametrize("error, retry", [
+    (HTTPError(503), True),
+    (HTTPError(500), True),
+    (HTTPError(429), True),
+    (HTTPError(400), False),
+    (HTTPError(404), False),
+    (HTTPError(422), False),
+    (ConnectionResetError(), True),
+    (TimeoutError(), True),
+    (ValueError("bad input"), False),
+    (TypeError("our bug"), False),
+    (CancelledError(), False),
+    (DeadlineExceededError(), False),
+    (ReplayedError("ConnectError: refused", None, True), True),
+    (ReplayedError("ValueError: bad", None, False), False),
+    (ReplayedError("HTTPError: 503", 503), True),
+])
+def test_only_route_failures_fall_back(error, retry):
+    assert can_fall_back(error) is retry
+
+
+def test_transport_errors_of_the_hub_client_fall_back():
+    httpx2 = pytest.importorskip("httpx2")
+    assert can_fall_back(httpx2.ConnectError("refused"))
+    assert can_fall_back(httpx2.ReadTimeout("slow"))
+
+
+class RouteModel(AIModel):
+    """Answers per route as the test scripts: a delay and a result or error"""
+
+    task = "Routes"
+
+    def __init__(self, behaviour, routes=(SAME_MODEL,)):
+        super().__init__("primary")
+        self.behaviour = behaviour
+        self.fallback_routes = routes
+        self.started = []
+        self.cancelled = []
+
+    async def _acall_route(self, route, method, args, kwargs, record=True):
+        self.started.append(route)
+        delay, outcome = self.behaviour[route]
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled.append(route)
+            raise
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    def _create_client(self, timeout=None, route=PRIMARY):
+        delay, outcome = self.behaviour[route]
+        self.started.append(route)
+
+        def method(*args):
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+        return SimpleNamespace(close=lambda: None, method=method)
+
+    @acache_result
+    async def _arun(self, input_data, cancel_token):
+        return await self._acall_client("method", input_data, cancel_token=cancel_token)
+
+    @cache_result
+    def _run(self, input_data, cancel_token):
+        return self._call_client("method", input_data, cancel_token=cancel_token)
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(models, "LATENCIES", LatencyTracker())
+    monkeypatch.setattr(hedging, "HEDGE_DEFAULT_DELAY", 0.1)
+    monkeypatch.setattr(decorators, "CACHE_ENABLED", True)
+    clear_result_cache()
+    yield
+    clear_result_cache()
+
+
+def call(model, input_data="x"):
+    return asyncio.run(model._arun(input_data, cancel_token=CancelToken()))
+
+
+def test_failed_route_falls_back_to_the_next():
+    model = RouteModel({PRIMARY: (0, HTTPError(503)), SAME_MODEL: (0, "fallback")})
+    assert call(model) == "fallback"
+    assert model.started == [PRIMARY, SAME_MODEL]
+
+
+def test_errors_of_our_own_are_not_sent_to_other_routes():
+    model = RouteModel({PRIMARY: (0, TypeError("our bug")), SAME_MODEL: (0, "fallback")})
+    with pytest.raises(TypeError):
+        call(model)
+    assert model.started == [PRIMARY]
+
+
+def test_last_error_is_raised_when_every_route_fails():
+    model = RouteModel({PRIMARY: (0, HTTPError(503)), SAME_MODEL: (0, HTTPError(502))})
+    with pytest.raises(HTTPError, match="502"):
+        call(model)
+
+
+def test_slow_route_is_hedged_and_the_loser_cancelled():
+    model = RouteModel({PRIMARY: (5, "slow"), SAME_MODEL: (0, "hedged")})
+    model.hedge_requests = True
+    assert call(model) == "hedged"
+    assert model.started == [PRIMARY, SAME_MODEL]
+    assert model.cancelled == [PRIMARY]
+
+
+def test_without_hedging_a_slow_route_is_waited_for():
+    model = RouteModel({PRIMARY: (0.3, "slow"), SAME_MODEL: (0, "hedged")})
+    assert call(model) == "slow"
+    assert model.started == [PRIMARY]
+
+
+def test_answers_of_another_model_are_not_cached():
+    model = RouteModel({PRIMARY: (0, HTTPError(503)), OTHER_MODEL: (0, "other model")}, routes=(OTHER_MODEL,))
+    assert call(model) == "other model"
+    model.behaviour[PRIMARY] = (0, "primary")
+    assert call(model) == "primary"
+
+
+def test_answers_of_another_provider_for_the_same_model_are_cached():
+    model = RouteModel({PRIMARY: (0, HTTPError(503)), SAME_MODEL: (0, "same model")})
+    assert call(model) == "same model"
+    model.behaviour[PRIMARY] = (0, "primary")
+    assert call(model) == "same model"
+
+
+def test_sync_calls_fall_back_and_skip_caching_another_model():
+    model = RouteModel({PRIMARY: (0, HTTPError(503)), OTHER_MODEL: (0, "other model")}, routes=(OTHER_MODEL,))
+    assert model._run("x", cancel_token=CancelToken()) == "other model"
+    model.behaviour[PRIMARY] = (0, "primary")
+    assert model._run("x", cancel_token=CancelToken()) == "primary"
+    model.behaviour[PRIMARY] = (0, ValueError("bad input"))
+    with pytest.raises(ValueError):
+        model._run("y", cancel_token=CancelToken())
@@ -0,0 +1,96 @@
+import io
+import random
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+import decorators
+from image_hashes import BKTree, NearDuplicateIndex, clear_indexes, find_duplicates, fingerprint, hamming, phash
+from models import ObjectDetectionModel
+
+
+def photo(seed, size=(320, 240)):
+    """A busy picture of shapes on a gradient, different for each seed"""
+    rng = random.Random(seed)
+    gradient = np.linspace(0, 255, size[0], dtype=np.uint8)
+    image = Image.fromarray(np.tile(gradient, (size[1], 1))).convert("RGB")
+    draw = ImageDraw.Draw(image)
+    for _ in range(12):
+        x, y = rng.randrange(size[0]), rng.randrange(size[1])
+        colour = tuple(rng.randrange(256) for _ in range(3))
+        draw.ellipse((x, y, x + rng.randrange(20, 120), y + rng.randrange(20, 120)), fill=colour)
+    return image
+
+
+def encoded(image, format, **params):
+    buffer = io.BytesIO()
+    image.save(buffer, format=format, **params)
+    return buffer.getvalue()
+
+
+def test_phash_survives_reencoding_and_resizing():
+    original = photo(1)
+    copies = [
+        encoded(original, "JPEG", quality=60),
+        encoded(original.resize((160, 120)), "PNG"),
+        encoded(original.resize((640, 480)), "JPEG", quality=90),
+    ]
+    for copy in copies:
+        assert hamming(phash(original), fingerprint(copy)[0]) <= 4
+
+
+def test_different_pictures_hash_far_apart():
+    assert hamming(phash(photo(1)), phash(photo(2))) > 10
+
+
+def test_fingerprint_of_a_non_image_is_none():
+    assert fingerprint(b"not an image") is None
+
+
+def test_bk_tree_finds_exactly_the_hashes_within_the_distance():
+    rng = random.Random(3)
+    hashes = [rng.getrandbits(64) for _ in range(500)]
+    # Near neighbours of the query, two or three bits away
+    query = hashes[0]
+    hashes += [query ^ (1 << bit) ^ (1 << (bit + 7)) ^ (bit % 2 << 40) for bit in range(6)]
+    tree = BKTree()
+    for i, hash_value in enumerate(hashes):
+        tree.add(hash_value, i)
+    found = tree.search(query, 3)
+    assert sorted(i for _, i in found) == sorted(i for i, h in enumerate(hashes) if hamming(query, h) <= 3)
+    assert [distance for distance, _ in found] == sorted(distance for distance, _ in found)
+    assert len(tree) == len(hashes)
+
+
+def test_index_finds_the_closest_value_and_can_be_cleared():
+    index = NearDuplicateIndex(max_distance=2)
+    index.add(0b1111, "far")
+    index.add(0b0001, "near")
+    assert index.find(0b0000) == "near"
+    assert index.find(0b1111_0000_0000) is None
+    clear_indexes()
+    assert len(index) == 0 and index.find(0b0001) is None
+
+
+def test_index_drops_the_oldest_half_when_full():
+    index = NearDuplicateIndex(max_distance=0, max_entries=4)
+    for value in range(5):
+        index.add(value << 8, value)
+    assert len(index) == 3
+    assert index.find(0) is None and index.find(4 << 8) == 4
+
+
+def test_find_duplicates_groups_copies_of_the_same_picture():
+    first, second = photo(1), photo(2)
+    images = [encoded(first, "PNG"), encoded(second, "PNG"), encoded(first.resize((200, 150)), "JPEG"), b"junk"]
+    assert find_duplicates(images) == [[0, 2]]
+
+
+@pytest.mark.parametrize("enabled", [True, False])
+def test_detections_are_only_reused_with_the_cache_on(monkeypatch, enabled):
+    monkeypatch.setattr(decorators, "CACHE_ENABLED", enabled)
+    model = ObjectDetectionModel("facebook/detr-resnet-50")
+    image = fingerprint(encoded(photo(1), "PNG"))
+    model._remember_detections(image, [])
+    assert (model._reuse_detections(image) == []) is enabled
@@ -0,0 +1,91 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+from PIL import Image
+
+from image_results import IMAGE_STORE, ImageStore
+
+SIZE = (64, 48)
+
+
+def colour(i):
+    return (i, 255 - i, (i * 7) % 256)
+
+
+def image(i):
+    return Image.new("RGB", SIZE, colour(i))
+
+
+def test_store_stays_in_budget_and_reloads_spilled_images(monkeypatch, tmp_path):
+    budget = 5 * SIZE[0] * SIZE[1] * 4
+    monkeypatch.setattr(IMAGE_STORE, "budget", budget)
+    monkeypatch.setattr(IMAGE_STORE, "_directory", str(tmp_path))
+    results = []
+    for i in range(100):
+        results.append(IMAGE_STORE.add(image(i)))
+        assert IMAGE_STORE.resident_bytes <= budget
+        assert sum(result.nbytes for result in results if result.in_memory) <= budget
+    spilled = [result for result in results if not result.in_memory]
+    assert len(spilled) >= 95
+    for i, result in enumerate(results):
+        reloaded = result.open()
+        assert reloaded.size == SIZE and reloaded.mode == "RGB"
+        assert reloaded.getpixel((0, 0)) == colour(i)
+        assert result.thumbnail.size == SIZE
+
+
+def test_least_recently_opened_image_is_spilled_first(tmp_path):
+    store = ImageStore(budget=2 * SIZE[0] * SIZE[1] * 4, directory=str(tmp_path))
+    first, second = store.add(image(1)), store.add(image(2))
+    first.open()
+    store.add(image(3))
+    assert first.in_memory and not second.in_memory
+
+
+def test_spilled_image_saves_and_its_file_is_removed_with_the_handle(tmp_path):
+    store = ImageStore(budget=0, directory=str(tmp_path / "spill"))
+    (tmp_path / "spill").mkdir()
+    result = store.add(image(9))
+    assert not result.in_memory
+    result.save(tmp_path / "copy.png")
+    with Image.open(tmp_path / "copy.png") as copy:
+        assert copy.getpixel((0, 0)) == colour(9)
+    del result
+    assert list((tmp_path / "spill").iterdir()) == []
+
+
+# Generates 100 images of 1 MB of pixels each under an 8 MB budget in a
+# fresh interpreter, and reports how far the peak RSS rose above where it was
+# before the batch
+RSS_SCRIPT = """
+import json, resource, sys, tempfile
+from PIL import Image
+from image_results import IMAGE_STORE
+
+def peak():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+IMAGE_STORE.set_budget(int(sys.argv[1]))
+IMAGE_STORE._directory = tempfile.mkdtemp()
+# Load the PNG encoder before measuring
+IMAGE_STORE.add(Image.new("RGB", (512, 512))).spill(IMAGE_STORE.directory)
+before = peak()
+results = [IMAGE_STORE.add(Image.new("RGB", (512, 512), (i, 255 - i, i * 7 % 256))) for i in range(100)]
+print(json.dumps({"growth": peak() - before, "spilled": sum(not result.in_memory for result in results)}))
+"""
+
+
+@pytest.mark.skipif(sys.platform != "linux", reason="ru_maxrss is in kilobytes only on Linux")
+def test_peak_rss_of_a_100_image_batch_stays_near_the_budget():
+    budget = 8 * 1024 * 1024
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    done = subprocess.run([sys.executable, "-c", RSS_SCRIPT, str(budget)], cwd=root,
+                          capture_output=True, text=True, timeout=120, check=True)
+    report = json.loads(done.stdout)
+    assert report["spilled"] >= 90
+    # Without spilling the batch would add 100 MB; allow the budget again
+    # for thumbnails, encoder buffers and allocator slack
+    assert report["growth"] <= 2 * budget
@@ -0,0 +1,53 @@
+import random
+
+import numpy as np
+import pytest
+
+from loadtest import LatencyHistogram
+
+
+def histogram(values):
+    result = LatencyHistogram()
+    for value in values:
+        result.record(value)
+    return result
+
+
+def test_empty_histogram_has_no_percentiles():
+    empty = LatencyHistogram()
+    assert empty.percentile(50) is None and empty.mean is None
+
+
+@pytest.mark.parametrize("q", [1, 50, 90, 99, 99.9])
+def test_percentiles_are_within_one_percent(q):
+    rng = random.Random(1)
+    values = [rng.lognormvariate(-3, 1) for _ in range(20000)]
+    expected = np.percentile(values, q, method="inverted_cdf")
+    assert histogram(values).percentile(q) == pytest.approx(expected, rel=0.01)
+
+
+def test_small_values_are_exact():
+    assert histogram([0.000005] * 3 + [0.000100]).percentile(50) == pytest.approx(0.000005)
+
+
+def test_percentiles_never_exceed_the_maximum():
+    latencies = histogram([0.5, 0.5, 0.5])
+    assert latencies.percentile(100) == 0.5
+
+
+def test_values_above_an_hour_are_capped():
+    latencies = histogram([2 * LatencyHistogram.MAX_SECONDS])
+    assert latencies.percentile(50) <= LatencyHistogram.MAX_SECONDS * 1.01
+    assert latencies.max == 2 * LatencyHistogram.MAX_SECONDS
+
+
+def test_merge_matches_recording_everything_in_one():
+    rng = random.Random(2)
+    first, second = [rng.random() for _ in range(500)], [rng.random() * 3 for _ in range(500)]
+    merged = histogram(first)
+    merged.merge(histogram(second))
+    whole = histogram(first + second)
+    assert merged.counts == whole.counts
+    assert (merged.count, merged.min, merged.max) == (whole.count, whole.min, whole.max)
+    assert merged.mean == pytest.approx(whole.mean)
+    assert merged.to_dict()["percentiles"] == whole.to_dict()["percentiles"]
@@ -0,0 +1,86 @@
+import io
+import wave
+
+import numpy as np
+import pytest
+
+import local_whisper
+from local_whisper import MAX_CHUNK_SECONDS, SAMPLE_RATE, load_audio, speech_chunks
+
+RNG = np.random.default_rng(0)
+
+
+def tone(seconds, rate=SAMPLE_RATE):
+    """A loud warbling tone standing in for speech"""
+    t = np.arange(int(seconds * rate)) / rate
+    return (0.3 * np.sin(2 * np.pi * 220 * t) * (1 + 0.5 * np.sin(2 * np.pi * 3 * t))).astype(np.float32)
+
+
+def silence(seconds):
+    return RNG.normal(0, 0.001, int(seconds * SAMPLE_RATE)).astype(np.float32)
+
+
+def wav(samples, width=2, rate=SAMPLE_RATE, channels=1):
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as writer:
+        writer.setnchannels(channels)
+        writer.setsampwidth(width)
+        writer.setframerate(rate)
+        writer.writeframes(samples)
+    return buffer.getvalue()
+
+
+def seconds(chunks):
+    return [(start / SAMPLE_RATE, end / SAMPLE_RATE) for start, end in chunks]
+
+
+def test_noise_alone_has_no_speech():
+    assert speech_chunks(silence(5)) == []
+
+
+def test_unbroken_speech_is_one_chunk():
+    assert speech_chunks(tone(10)) == [(0, 10 * SAMPLE_RATE)]
+
+
+def test_chunks_cover_the_speech_and_skip_long_silence():
+    samples = np.concatenate([silence(1), tone(5), silence(0.1), tone(3), silence(40), tone(4), silence(1)])
+    (first_start, first_end), (second_start, second_end) = seconds(speech_chunks(samples))
+    # The short pause is bridged, the long one is not decoded
+    assert 0.7 <= first_start <= 1.0 and 9.1 <= first_end <= 9.4
+    assert 48.8 <= second_start <= 49.1 and 53.1 <= second_end <= 53.4
+
+
+def test_long_speech_is_split_into_chunks_of_at_most_the_maximum():
+    samples = np.concatenate([silence(1), tone(70), silence(1)])
+    chunks = speech_chunks(samples)
+    assert len(chunks) == 3
+    assert all(end - start <= MAX_CHUNK_SECONDS * SAMPLE_RATE for start, end in chunks)
+    # Consecutive chunks meet, so no speech is dropped at a cut
+    assert all(chunks[i][1] == chunks[i + 1][0] for i in range(len(chunks) - 1))
+
+
+def test_chunks_are_plain_ints():
+    assert all(type(bound) is int for chunk in speech_chunks(tone(3)) for bound in chunk)
+
+
+def test_load_audio_mixes_down_and_resamples_wav():
+    stereo = np.stack([tone(1, rate=44100)] * 2, axis=1)
+    samples = load_audio(wav((stereo * 32767).astype(np.int16).tobytes(), rate=44100, channels=2))
+    assert samples.dtype == np.float32
+    assert len(samples) == SAMPLE_RATE
+    assert np.abs(samples).max() == pytest.approx(0.45, abs=0.01)
+
+
+def test_unsupported_wav_width_falls_back_to_the_decoder(monkeypatch):
+    data = wav(bytes(3 * SAMPLE_RATE), width=3)
+    decoded = []
+    monkeypatch.setattr(local_whisper, "decode_audio",
+                        lambda source, sampling_rate: decoded.append(source.read()) or np.zeros(SAMPLE_RATE))
+    assert len(load_audio(data)) == SAMPLE_RATE
+    assert decoded == [data]
+
+
+def test_unsupported_wav_width_without_the_decoder_names_the_package(monkeypatch):
+    monkeypatch.setattr(local_whisper, "decode_audio", None)
+    with pytest.raises(RuntimeError, match="faster-whisper"):
+        load_audio(wav(bytes(3 * SAMPLE_RATE), width=3))
@@ -0,0 +1,105 @@
+import io
+import wave
+
+import pytest
+from PIL import Image
+
+import model_input
+from model_input import ModelInput, UnsupportedInputError, sniff_mime
+from models import AudioToTextModel, ObjectDetectionModel
+
+
+def png_bytes(size=(3, 2)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def wav_bytes(seconds=0.5, rate=8000):
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as audio:
+        audio.setnchannels(1)
+        audio.setsampwidth(2)
+        audio.setframerate(rate)
+        audio.writeframes(b"\x00\x00" * int(seconds * rate))
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("header, mime", [
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff\xe0", "image/jpeg"),
+    (b"GIF89a", "image/gif"),
+    (b"RIFF\x00\x00\x00\x00WEBP", "image/webp"),
+    (b"RIFF\x00\x00\x00\x00WAVE", "audio/wav"),
+    (b"fLaC", "audio/flac"),
+    (b"ID3\x04", "audio/mpeg"),
+    (b"\x00\x00\x00\x20ftypM4A ", "audio/mp4"),
+    (b"\x00\x01\x02\x03\x04\x05", None),
+    (b"", None),
+])
+def test_sniff_mime(header, mime):
+    assert sniff_mime(header) == mime
+
+
+def test_png_file(tmp_path):
+    path = tmp_path / "picture.txt"
+    path.write_bytes(png_bytes())
+    source = ModelInput.from_path(str(path))
+    assert source.mime == "image/png" and source.kind == "image"
+    assert source.check("image") is source
+    assert source.dimensions == (3, 2) and source.duration is None
+    # Small files are read by the open that sniffed them
+    assert source.content() == path.read_bytes()
+
+
+def test_png_bytes_hash_like_the_file(tmp_path):
+    data = png_bytes()
+    path = tmp_path / "picture.png"
+    path.write_bytes(data)
+    from_bytes = ModelInput.coerce(data)
+    assert from_bytes.path is None and from_bytes.kind == "image"
+    assert from_bytes.hash == ModelInput.from_path(str(path)).hash
+
+
+def test_wav_file(tmp_path):
+    path = tmp_path / "speech.wav"
+    path.write_bytes(wav_bytes())
+    source = ModelInput.coerce(path)
+    assert source.mime == "audio/wav" and source.kind == "audio"
+    assert source.duration == pytest.approx(0.5)
+    with pytest.raises(UnsupportedInputError):
+        source.check("image")
+
+
+def test_large_file_is_sniffed_but_not_read(tmp_path, monkeypatch):
+    monkeypatch.setattr(model_input, "WHOLE_READ_LIMIT", 16)
+    path = tmp_path / "speech.wav"
+    path.write_bytes(wav_bytes())
+    source = ModelInput.from_path(str(path))
+    assert source.mime == "audio/wav" and source.data is None
+    assert source.content() == str(path)
+    assert source.duration == pytest.approx(0.5)
+
+
+def test_unknown_binary_is_rejected(tmp_path):
+    path = tmp_path / "blob.png"
+    path.write_bytes(bytes(range(256)))
+    source = ModelInput.from_path(str(path))
+    assert source.mime is None and source.kind is None
+    with pytest.raises(UnsupportedInputError, match="unrecognised format"):
+        source.check("image")
+
+
+def test_missing_file(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        ModelInput.from_path(str(tmp_path / "missing.png"))
+
+
+def test_models_reject_bad_inputs_before_any_request(tmp_path):
+    path = tmp_path / "speech.wav"
+    path.write_bytes(wav_bytes())
+    with pytest.raises(UnsupportedInputError):
+        ObjectDetectionModel("detector").prepare_input(str(path))
+    with pytest.raises(FileNotFoundError):
+        AudioToTextModel("whisper").prepare_input(str(tmp_path / "missing.wav"))
+    assert AudioToTextModel("whisper").prepare_input(str(path)).kind == "audio"
@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+from async_runtime import AsyncRunner
+from models import AIModel
+from pipeline import Pipeline, Stage
+
+
+class EchoModel(AIModel):
+    task = "Echo"
+    input_type = "text"
+    renderer = "text"
+
+    def __init__(self, delay=0.0):
+        super().__init__("echo")
+        self.delay = delay
+
+    async def arun_model(self, input_data, cancel_token=None, timeout=None):
+        await asyncio.sleep(self.delay)
+        if input_data == "fail":
+            raise ValueError("bad input")
+        return f"{input_data}!"
+
+
+@pytest.fixture
+def runner():
+    runner = AsyncRunner()
+    yield runner
+    runner.stop()
+
+
+def test_run_feeds_each_result_to_the_next_stage(runner):
+    pipeline = Pipeline([EchoModel(), EchoModel()], runner)
+    assert pipeline.run("a") == ["a!", "a!!"]
+
+
+def test_map_returns_results_in_input_order_and_stops_failed_inputs(runner):
+    pipeline = Pipeline([Stage(EchoModel(), concurrency=2), EchoModel()], runner)
+    results = pipeline.map(["a", "fail", "b"])
+    assert [result.index for result in results] == [0, 1, 2]
+    assert results[0].results == ["a!", "a!!"]
+    assert isinstance(results[1].error, ValueError) and results[1].results == []
+    assert results[2].results == ["b!", "b!!"]
+
+
+def test_map_raises_when_the_inputs_fail(runner):
+    def inputs():
+        yield "a"
+        raise RuntimeError("broken inputs")
+
+    with pytest.raises(RuntimeError, match="broken inputs"):
+        Pipeline([EchoModel()], runner).map(inputs())
+
+
+def test_closing_amap_early_does_not_hang(runner):
+    pipeline = Pipeline([EchoModel(0.01), EchoModel(0.01)], runner)
+
+    async def first_then_close():
+        results = pipeline.amap([str(i) for i in range(50)])
+        first = await results.__anext__()
+        await asyncio.wait_for(results.aclose(), 5)
+        return first
+
+    assert runner.run(first_then_close(), timeout=10).error is None
+
+
+def test_cancelling_map_does_not_hang(runner):
+    pipeline = Pipeline([EchoModel(0.05)], runner)
+
+    async def cancel_soon():
+        task = asyncio.ensure_future(pipeline._map_all([str(i) for i in range(50)], None, None))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        await asyncio.wait_for(asyncio.gather(task, return_exceptions=True), 5)
+        return task.cancelled()
+
+    assert runner.run(cancel_soon(), timeout=10)
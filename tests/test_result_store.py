@@ -0,0 +1,133 @@
+import itertools
+
+import pytest
+
+from result_store import ResultStore, key_hash
+
+
+def nul_ending_key():
+    """A key whose digest ends in a NUL byte"""
+    for i in itertools.count():
+        key = f"key-{i}"
+        if key_hash(key).endswith(b"\0"):
+            return key
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ResultStore(str(tmp_path / "results"))
+    yield store
+    store.close()
+
+
+def reopen(store):
+    store.close()
+    return ResultStore(store.directory)
+
+
+def test_values_round_trip_by_kind(store):
+    store.put("text", "hello", model="m")
+    store.put("bytes", b"\x00\x01", model="m")
+    store.put("json", [{"label": "cat", "score": 0.5}], model="m")
+    assert store.get("text") == "hello"
+    assert store.get("bytes") == b"\x00\x01"
+    assert store.get("json") == [{"label": "cat", "score": 0.5}]
+    assert store.get("missing", "default") == "default"
+
+
+def test_reopen_keeps_every_key(store):
+    keys = [nul_ending_key()] + [f"other-{i}" for i in range(4)]
+    for key in keys:
+        store.put(key, key.upper(), model="m")
+    store = reopen(store)
+    try:
+        assert len(store) == 5
+        for key in keys:
+            assert store.get(key) == key.upper()
+        # Overwriting after a reopen replaces the entry rather than adding one
+        store.put(keys[0], "new", model="m")
+        assert len(store) == 5
+        assert store.get(keys[0]) == "new"
+        assert {digest for digest, _, _, _ in store.scan()} == {key_hash(key) for key in keys}
+    finally:
+        store.close()
+
+
+def test_overwrite_and_delete_survive_reopen(store):
+    store.put("a", "1")
+    store.put("a", "2")
+    store.put("b", "3")
+    assert store.delete("b")
+    assert not store.delete("b")
+    store = reopen(store)
+    try:
+        assert len(store) == 1
+        assert store.get("a") == "2"
+        assert "b" not in store
+    finally:
+        store.close()
+
+
+def test_compact_keeps_only_the_newest_live_values(store):
+    key = nul_ending_key()
+    store.put(key, "old")
+    store.put(key, "new")
+    store.put("gone", "x" * 1000)
+    store.delete("gone")
+    store.put("kept", "value", model="other")
+    reclaimed = store.compact()
+    assert reclaimed == len("old") + 1000
+    assert len(store) == 2
+    assert len(store.records()) == 2
+    assert store.get(key) == "new"
+    assert [model for _, model, _, _ in store.scan()] == ["", "other"]
+    store = reopen(store)
+    try:
+        assert len(store) == 2
+        assert store.get(key) == "new" and store.get("kept") == "value"
+    finally:
+        store.close()
+
+
+def test_index_grows_past_its_first_capacity(tmp_path, monkeypatch):
+    import result_store
+    monkeypatch.setattr(result_store, "_GROW_RECORDS", 4)
+    store = ResultStore(str(tmp_path / "small"))
+    for i in range(10):
+        store.put(f"k{i}", str(i))
+    assert store._capacity() >= 10
+    store = reopen(store)
+    try:
+        assert len(store) == 10
+        assert [store.get(f"k{i}") for i in range(10)] == [str(i) for i in range(10)]
+    finally:
+        store.close()
+
+
+def test_trim_drops_the_oldest_entries(store):
+    for i in range(10):
+        store.put(f"key-{i}", bytes(100), model="m")
+    store.put("key-0", bytes(100), model="m")
+    reclaimed = store.trim(450)
+    # key-0 was rewritten last, so it is among the newest four kept
+    assert [key in store for key in ("key-0", "key-7", "key-8", "key-9")] == [True] * 4
+    assert len(store) == 4 and "key-1" not in store and "key-6" not in store
+    assert reclaimed == 700
+    assert len(list(reopen(store).scan())) == 4
+
+
+def test_store_stays_under_its_limit(tmp_path):
+    store = ResultStore(str(tmp_path / "results"), max_bytes=1000)
+    for i in range(50):
+        store.put(f"key-{i}", bytes(90) + bytes([i]), model="m")
+        assert (tmp_path / "results" / "blobs.dat").stat().st_size <= 1000
+    assert store.get("key-49") == bytes(90) + bytes([49])
+    assert "key-0" not in store
+    store.close()
+
+
+def test_lowering_the_limit_trims_at_once(store):
+    for i in range(10):
+        store.put(f"key-{i}", bytes(100), model="m")
+    store.set_max_bytes(400)
+    assert len(store) == 3 and "key-9" in store
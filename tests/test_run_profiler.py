@@ -0,0 +1,61 @@
+import asyncio
+import threading
+
+from async_runtime import AsyncRunner
+from run_profiler import RunProfiler
+
+
+def tk_side_work():
+    return sum(i * i for i in range(20000))
+
+
+async def loop_side_work(started):
+    started.set()
+    total = 0
+    for i in range(20000):
+        total += i * i
+    await asyncio.sleep(0.05)
+    return total
+
+
+def profiled_functions(profiler):
+    return {name for _, _, name in profiler.stats().stats}
+
+
+def test_overlapping_phases_on_two_threads_are_both_profiled(tmp_path):
+    profiler = RunProfiler("test")
+    profiler.start()
+    runner = AsyncRunner()
+    try:
+        started = threading.Event()
+        with profiler.phase("input"):
+            # The model phase starts on the loop thread while input is still open here
+            future = runner.submit(profiler.profile_coroutine(loop_side_work(started)))
+            started.wait(5)
+            tk_side_work()
+        future.result(5)
+    finally:
+        runner.stop()
+        profiler.stop()
+
+    functions = profiled_functions(profiler)
+    assert "tk_side_work" in functions
+    assert "loop_side_work" in functions
+    assert sorted(name for name, _, _ in profiler.phases) == ["input", "model"]
+
+    paths = profiler.save(str(tmp_path))
+    assert "loop_side_work" in open(paths["txt"], encoding="utf-8").read()
+
+
+def test_nested_phases_on_one_thread():
+    profiler = RunProfiler("nested")
+    profiler.start()
+    try:
+        with profiler.phase("outer"):
+            with profiler.phase("inner"):
+                tk_side_work()
+            tk_side_work()
+    finally:
+        profiler.stop()
+    assert "tk_side_work" in profiled_functions(profiler)
+    assert [name for name, _, _ in profiler.phases] == ["inner", "outer"]
@@ -0,0 +1,125 @@
+import asyncio
+import json
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import models
+from models import AIModel, ModelSpec
+from server import InferenceRequestHandler, InferenceService
+
+
+class SleepModel(AIModel):
+    task = "Sleep"
+    input_type = "text"
+    renderer = "text"
+
+    def __init__(self, model_name):
+        super().__init__(model_name)
+        self.tokens = []
+
+    async def arun_model(self, input_data, cancel_token=None, timeout=None):
+        self.tokens.append(cancel_token)
+        for _ in range(200):
+            cancel_token.check()
+            await asyncio.sleep(0.01)
+        return input_data
+
+
+@pytest.fixture
+def server(monkeypatch):
+    spec = ModelSpec("sleep", SleepModel, "sleep", "Sleep", "Sleeps")
+    monkeypatch.setattr(models, "MODEL_REGISTRY", {"sleep": spec})
+    monkeypatch.setattr("server.MODEL_REGISTRY", models.MODEL_REGISTRY)
+    handler = type("Handler", (InferenceRequestHandler,),
+                   {"service": InferenceService(), "log_message": lambda self, *args: None})
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=httpd.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    httpd.spec = spec
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def request(server, path, body=None):
+    url = f"http://127.0.0.1:{server.server_address[1]}{path}"
+    data = None if body is None else json.dumps(body).encode("utf-8")
+    try:
+        with urllib.request.urlopen(url, data=data, timeout=10) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+@pytest.mark.parametrize("wait", ["soon", "-1", "nan"])
+def test_bad_wait_is_a_client_error(server, wait):
+    status, body = request(server, f"/jobs/x?wait={wait}")
+    assert status == 400 and "wait" in body["error"]
+
+
+@pytest.mark.parametrize("timeout", ["ten", 0, -5, True, None])
+def test_bad_timeout_is_a_client_error(server, timeout):
+    status, body = request(server, "/models/sleep/run", {"input": "hi", "timeout": timeout})
+    assert status == 400 and "timeout" in body["error"]
+
+
+def test_timeout_is_capped_at_max_wait(server):
+    handler = server.RequestHandlerClass
+    assert handler.seconds(handler, 1e9, "timeout", positive=True) == handler.MAX_WAIT
+
+
+def test_expired_run_cancels_its_job(server):
+    status, body = request(server, "/models/sleep/run", {"input": "hi", "timeout": 0.1})
+    assert status == 504
+    token = server.spec.load().tokens[0]
+    assert token.cancelled
+    status, body = request(server, f"/jobs/{body['id']}?wait=5")
+    assert body["status"] == "cancelled"
+
+
+def test_run_returns_the_result(server, monkeypatch):
+    monkeypatch.setattr(SleepModel, "arun_model", lambda self, input_data, **kwargs: asyncio.sleep(0, input_data))
+    status, body = request(server, "/models/sleep/run", {"input": "hi", "timeout": 5})
+    assert status == 200 and body["result"] == {"type": "text", "text": "hi"}
+
+
+@pytest.mark.parametrize("body", [[], "x", 3, {"input": "hi", "params": []}, {"input": "hi", "params": "x"},
+                                  {"input_base64": 5}])
+def test_malformed_bodies_are_client_errors(server, body):
+    status, reply = request(server, "/models/sleep/run", body)
+    assert status == 400 and reply["error"]
+
+
+def test_unhashable_model_is_not_found(server):
+    status, _ = request(server, "/jobs", {"model": ["sleep"], "input": "hi"})
+    assert status == 404
+
+
+@pytest.mark.parametrize("timeout", ["ten", 0, -5, True, None])
+def test_bad_timeout_in_params_is_a_client_error(server, timeout):
+    status, body = request(server, "/models/sleep/run", {"input": "hi", "params": {"timeout": timeout}})
+    assert status == 400 and "timeout" in body["error"]
+
+
+def test_timeout_in_params_bounds_the_wait(server):
+    status, _ = request(server, "/models/sleep/run", {"input": "hi", "params": {"timeout": 0.1}})
+    assert status == 504
+    assert server.spec.load().tokens[0].cancelled
+
+
+def test_results_are_serialized_off_the_event_loop(server, monkeypatch):
+    threads = []
+
+    def serialize(renderer, result):
+        threads.append(threading.current_thread())
+        return {"type": "text", "text": result}
+
+    monkeypatch.setattr("server.serialize_result", serialize)
+    monkeypatch.setattr(SleepModel, "arun_model", lambda self, input_data, **kwargs: asyncio.sleep(0, input_data))
+    status, _ = request(server, "/models/sleep/run", {"input": "hi"})
+    assert status == 200
+    assert threads and threads[0] is not server.RequestHandlerClass.service.runner._thread
@@ -0,0 +1,137 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from async_runtime import AsyncRunner
+from gui import AppGUI
+from models import TextToImageModel
+from speculation import Speculator
+
+
+class DraftModel(TextToImageModel):
+    """Records the prompts it is asked for and runs until told to stop"""
+
+    def __init__(self, delay=10.0):
+        super().__init__("drafts")
+        self.delay = delay
+        self.prompts = []
+        self.tokens = []
+
+    async def arun_model(self, input_data, cancel_token=None, timeout=None, **params):
+        self.prompts.append(input_data)
+        self.tokens.append(cancel_token)
+        deadline = time.monotonic() + self.delay
+        while time.monotonic() < deadline:
+            cancel_token.check()
+            await asyncio.sleep(0.01)
+        return f"draft of {input_data}"
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def runner():
+    runner = AsyncRunner()
+    yield runner
+    runner.stop()
+
+
+def test_finished_draft_is_not_requested_again(runner):
+    model = DraftModel(delay=0)
+    speculator = Speculator(runner, min_interval=0)
+    future = speculator.start(model, "a cat", mode="draft")
+    assert future.result(5) == "draft of a cat"
+    assert speculator.start(model, "a cat", mode="draft") is future
+    assert model.prompts == ["a cat"] and speculator.started == 1
+
+
+def test_min_interval_throttles_new_drafts(runner):
+    model = DraftModel(delay=0)
+    speculator = Speculator(runner, min_interval=60)
+    assert speculator.wait_time() == 0
+    speculator.start(model, "a cat").result(5)
+    assert 59 < speculator.wait_time() <= 60
+    assert speculator.start(model, "a dog") is None
+    speculator._last_start -= 60
+    assert speculator.start(model, "a dog").result(5) == "draft of a dog"
+    assert model.prompts == ["a cat", "a dog"]
+
+
+def test_new_prompt_cancels_the_stale_draft(runner):
+    model = DraftModel()
+    speculator = Speculator(runner, min_interval=0)
+    stale = speculator.start(model, "a ca")
+    wait_for(lambda: model.tokens)
+    # Still the prompt being drafted: keep it
+    speculator.cancel("a ca")
+    assert not stale.done()
+    speculator.cancel("a cat")
+    assert stale.cancelled() and model.tokens[0].cancelled
+    fresh = speculator.start(model, "a cat")
+    assert fresh is not stale and not fresh.done()
+    speculator.cancel()
+    assert speculator.started == 2 and speculator.cancelled == 2
+
+
+class FakeRoot:
+    def __init__(self):
+        self.calls = {}
+        self.next_id = 0
+
+    def after(self, ms, callback):
+        self.next_id += 1
+        self.calls[self.next_id] = (ms, callback)
+        return self.next_id
+
+    def after_cancel(self, call_id):
+        del self.calls[call_id]
+
+
+def fake_app(runner, prompt="a cat", min_interval=0):
+    app = SimpleNamespace(
+        root=FakeRoot(), pending_speculation=None, job_token=None, request_timeout=None,
+        selected_model=DraftModel(), speculator=Speculator(runner, min_interval),
+        speculate_var=SimpleNamespace(get=lambda: True),
+        progressive_var=SimpleNamespace(get=lambda: True),
+        input_image_path=SimpleNamespace(get=lambda: ""),
+        settings=SimpleNamespace(config={"speculation.delay": 0.8}),
+        get_input=lambda: app.prompt, prompt=prompt,
+        get_generation_params=lambda: {"mode": "final"})
+    app.draft_params = lambda params: AppGUI.draft_params(app, params)
+    app.schedule_speculation = lambda delay=None: AppGUI.schedule_speculation(app, delay)
+    app.speculate = lambda: AppGUI.speculate(app)
+    return app
+
+
+def test_typing_debounces_the_draft(runner):
+    app = fake_app(runner)
+    for prompt in ("a", "a c", "a cat"):
+        app.prompt = prompt
+        app.schedule_speculation()
+    # Only the last keystroke's timer is left, at the configured delay
+    ((ms, callback),) = app.root.calls.values()
+    assert ms == 800 and not app.speculator.started
+    callback()
+    assert app.speculator.prompt == "a cat"
+    assert app.speculator.params["mode"] == "draft"
+    wait_for(lambda: app.selected_model.prompts == ["a cat"])
+    app.speculator.cancel()
+
+
+def test_throttled_draft_is_retried_when_allowed(runner):
+    app = fake_app(runner, min_interval=60)
+    app.speculate()
+    wait_for(lambda: app.selected_model.prompts)
+    app.speculator.cancel()
+    app.prompt = "a dog"
+    app.speculate()
+    ((ms, _),) = app.root.calls.values()
+    assert 59000 < ms <= 60000
+    assert app.speculator.started == 1
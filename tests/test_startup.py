@@ -0,0 +1,53 @@
+import json
+import os
+import subprocess
+import sys
+import tkinter
+
+import pytest
+
+from startup_profiler import STARTUP_BUDGET
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Imports the GUI and every model spec in a fresh interpreter, the part of
+# startup that does not need a display
+IMPORT_SCRIPT = """
+import json
+from startup_profiler import StartupProfiler
+profiler = StartupProfiler()
+profiler.install()
+import gui
+profiler.mark("gui_imported")
+spec = next(iter(gui.MODEL_REGISTRY.values()), None)
+if spec is not None:
+    spec.load()
+profiler.mark("model_ready")
+profiler.uninstall()
+print(json.dumps(profiler.marks))
+"""
+
+
+def has_display():
+    try:
+        tkinter.Tk().destroy()
+    except tkinter.TclError:
+        return False
+    return True
+
+
+def test_imports_and_first_model_are_within_the_startup_budget():
+    done = subprocess.run([sys.executable, "-c", IMPORT_SCRIPT], cwd=ROOT,
+                          capture_output=True, text=True, timeout=60, check=True)
+    marks = json.loads(done.stdout.splitlines()[-1])
+    assert marks["model_ready"] <= STARTUP_BUDGET
+
+
+@pytest.mark.skipif(not has_display(), reason="needs a display")
+def test_profile_startup_is_within_budget(tmp_path):
+    output = tmp_path / "startup_profile.json"
+    done = subprocess.run([sys.executable, "main.py", "--profile-startup",
+                           "--profile-output", str(output)],
+                          cwd=ROOT, capture_output=True, text=True, timeout=60)
+    assert done.returncode == 0, done.stdout + done.stderr
+    assert json.loads(output.read_text())["within_budget"]
@@ -0,0 +1,76 @@
+import pytest
+from huggingface_hub import (AutomaticSpeechRecognitionOutput, ObjectDetectionBoundingBox,
+                             ObjectDetectionOutputElement)
+from PIL import Image
+
+from hedging import Route
+from model_input import ModelInput
+from traffic import PayloadStore, decode_value, encode_value, request_key
+
+
+@pytest.fixture
+def store(tmp_path):
+    return PayloadStore(str(tmp_path / "payloads"))
+
+
+def round_trip(value, store):
+    return decode_value(encode_value(value, store), store)
+
+
+@pytest.mark.parametrize("value", [None, True, 3, 2.5, "a prompt", [1, "two", None],
+                                   {"guidance_scale": 7.5, "steps": [1, 2]}])
+def test_plain_values_round_trip(store, value):
+    assert round_trip(value, store) == value
+
+
+def test_bytes_are_stored_once_by_hash(store, tmp_path):
+    first, second = encode_value(b"audio", store), encode_value(bytearray(b"audio"), store)
+    assert first == second
+    assert len(list((tmp_path / "payloads").iterdir())) == 1
+    assert round_trip(memoryview(b"audio"), store) == b"audio"
+
+
+def test_files_come_back_as_their_bytes(store, tmp_path):
+    path = tmp_path / "clip.wav"
+    path.write_bytes(b"RIFF....WAVE")
+    assert round_trip(str(path), store) == b"RIFF....WAVE"
+    assert round_trip(ModelInput.from_path(str(path)), store) == b"RIFF....WAVE"
+
+
+def test_images_round_trip(store):
+    image = Image.new("RGB", (7, 5), (10, 20, 30))
+    decoded = round_trip(image, store)
+    assert decoded.size == (7, 5) and decoded.getpixel((3, 2)) == (10, 20, 30)
+
+
+def test_hub_outputs_round_trip(store):
+    detections = [
+        ObjectDetectionOutputElement(box=ObjectDetectionBoundingBox(xmin=1, ymin=2, xmax=3, ymax=4),
+                                     label="cat", score=0.9),
+        ObjectDetectionOutputElement(box=ObjectDetectionBoundingBox(xmin=5, ymin=6, xmax=7, ymax=8),
+                                     label="dog", score=0.5),
+    ]
+    decoded = round_trip(detections, store)
+    assert [(d.label, d.score, d.box.xmax) for d in decoded] == [("cat", 0.9, 3), ("dog", 0.5, 7)]
+    assert isinstance(decoded[0].box, ObjectDetectionBoundingBox)
+
+    transcript = AutomaticSpeechRecognitionOutput(text="hello there", chunks=None)
+    decoded = round_trip(transcript, store)
+    assert isinstance(decoded, AutomaticSpeechRecognitionOutput) and decoded.text == "hello there"
+
+
+def test_unrecordable_values_are_rejected(store):
+    with pytest.raises(TypeError):
+        encode_value(object(), store)
+
+
+def test_request_key_is_stable_and_specific(tmp_path):
+    path = tmp_path / "photo.png"
+    path.write_bytes(b"\x89PNG data")
+    route = Route(None, None)
+    key = request_key("m", route, "object_detection", (str(path),), {"threshold": 0.5, "top": 3})
+    # The same request with the file read into memory and the keywords reordered
+    assert key == request_key("m", route, "object_detection", (b"\x89PNG data",), {"top": 3, "threshold": 0.5})
+    assert key != request_key("m", route, "object_detection", (b"\x89PNG data",), {"top": 4, "threshold": 0.5})
+    assert key != request_key("m", Route("hf-inference", None), "object_detection",
+                              (b"\x89PNG data",), {"top": 3, "threshold": 0.5})
@@ -0,0 +1,490 @@
+import asyncio
+import dataclasses
+import hashlib
+import importlib
+import inspect
+import io
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+from types import SimpleNamespace
+
+from hedging import can_fall_back
+
+# Recorded sessions, one JSONL file each, and the payloads they refer to,
+# stored once by content hash however many sessions use them
+TRAFFIC_DIR = "traffic"
+PAYLOAD_DIR = os.path.join(TRAFFIC_DIR, "payloads")
+# Written by --replay
+REPLAY_REPORT = "replay_report.json"
+# Percentiles compared between the recording and the replay
+REPLAY_PERCENTILES = (50, 90, 99)
+
+# Keyword arguments of a model call that belong to the caller, not the request
+_CALLER_ARGS = ("cancel_token", "timeout")
+
+
+class ReplayMissError(LookupError):
+    """Raised when a replayed session makes a request that was never recorded"""
+
+
+class ReplayedError(RuntimeError):
+    """A recorded request failure, raised again on replay
+
+    Carries the HTTP status the same way client errors do, and whether the
+    original could be retried elsewhere, so fallback routes are tried
+    exactly as they were.
+    """
+
+    def __init__(self, message, status_code=None, retryable=None):
+        super().__init__(message)
+        self.response = SimpleNamespace(status_code=status_code)
+        self.retryable = retryable
+
+
+class PayloadStore:
+    """Files named by the SHA-256 of their contents"""
+
+    def __init__(self, directory=PAYLOAD_DIR):
+        self.directory = directory
+
+    def put(self, data):
+        """Store data unless it is already there; returns its hash"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = os.path.join(self.directory, digest)
+        if not os.path.exists(path):
+            os.makedirs(self.directory, exist_ok=True)
+            temporary = f"{path}.{threading.get_ident()}.tmp"
+            with open(temporary, "wb") as f:
+                f.write(data)
+            os.replace(temporary, path)
+        return digest
+
+    def get(self, digest):
+        with open(os.path.join(self.directory, digest), "rb") as f:
+            return f.read()
+
+
+class _HashOnly:
+    """Stands in for a PayloadStore when only the hash of an encoding is needed"""
+
+    def put(self, data):
+        return hashlib.sha256(data).hexdigest()
+
+
+def encode_value(value, store):
+    """A JSON-safe form of a request argument, input or response
+
+    Text and numbers stay inline; bytes, files, images and Hub output types
+    go to the store and are referred to by hash.
+    """
+    from huggingface_hub.inference._generated.types.base import BaseInferenceType
+    from model_input import ModelInput
+
+    if isinstance(value, str) and os.path.isfile(value):
+        with open(value, "rb") as f:
+            return {"bytes": store.put(f.read())}
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, ModelInput):
+        value = value.content()
+        return encode_value(value, store)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return {"bytes": store.put(bytes(value))}
+    if isinstance(value, BaseInferenceType):
+        return {"hub": type(value).__name__, "data": store.put(json.dumps(value).encode("utf-8"))}
+    if isinstance(value, (list, tuple)):
+        if value and all(isinstance(item, BaseInferenceType) for item in value):
+            return {"hub": type(value[0]).__name__, "list": True,
+                    "data": store.put(json.dumps(list(value)).encode("utf-8"))}
+        return [encode_value(item, store) for item in value]
+    if isinstance(value, dict):
+        return {"dict": {key: encode_value(item, store) for key, item in value.items()}}
+    if hasattr(value, "save") and hasattr(value, "size"):
+        buffer = io.BytesIO()
+        value.save(buffer, format="PNG", compress_level=1)
+        return {"image": store.put(buffer.getvalue())}
+    if dataclasses.is_dataclass(value):
+        return {"dict": {key: encode_value(item, store) for key, item in dataclasses.asdict(value).items()}}
+    raise TypeError(f"Cannot record a {type(value).__name__}")
+
+def decode_value(encoded, store):
+    """The value encode_value() stored; a recorded file comes back as its bytes"""
+    if isinstance(encoded, list):
+        return [decode_value(item, store) for item in encoded]
+    if not isinstance(encoded, dict):
+        return encoded
+    if "dict" in encoded:
+        return {key: decode_value(item, store) for key, item in encoded["dict"].items()}
+    if "bytes" in encoded:
+        return store.get(encoded["bytes"])
+    if "image" in encoded:
+        from PIL import Image
+        image = Image.open(io.BytesIO(store.get(encoded["image"])))
+        image.load()
+        return image
+    import huggingface_hub
+    cls = getattr(huggingface_hub, encoded["hub"])
+    data = json.loads(store.get(encoded["data"]))
+    return cls.parse_obj_as_list(data) if encoded.get("list") else cls.parse_obj_as_instance(data)
+
+def request_key(model_name, route, method, args, kwargs):
+    """Hash identifying a client request, the same when recorded and replayed"""
+    encoded = [model_name, route.provider, route.model, method,
+               encode_value(list(args), _HashOnly()), encode_value(kwargs, _HashOnly())]
+    return hashlib.sha256(json.dumps(encoded, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class RecordingClient:
+    """Wraps an inference client and records each request it makes"""
+
+    def __init__(self, client, traffic, model, route):
+        self._client = client
+        self._traffic = traffic
+        self._model = model
+        self._route = route
+
+    def __getattr__(self, name):
+        attribute = getattr(self._client, name)
+        if name.startswith("_") or name == "close" or not callable(attribute):
+            return attribute
+        traffic, model, route = self._traffic, self._model, self._route
+
+        if inspect.iscoroutinefunction(attribute):
+            async def arecord(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    result = await attribute(*args, **kwargs)
+                except Exception as e:
+                    traffic.record_request(model, route, name, args, kwargs, time.perf_counter() - start, error=e)
+                    raise
+                traffic.record_request(model, route, name, args, kwargs, time.perf_counter() - start, result)
+                return result
+            return arecord
+
+        def record(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = attribute(*args, **kwargs)
+            except Exception as e:
+                traffic.record_request(model, route, name, args, kwargs, time.perf_counter() - start, error=e)
+                raise
+            traffic.record_request(model, route, name, args, kwargs, time.perf_counter() - start, result)
+            return result
+        return record
+
+
+class ReplayClient:
+    """Answers requests from a recording, taking as long as they originally took
+
+    Closing it, as a cancelled request does, ends a wait early the way a
+    closed connection would.
+    """
+
+    def __init__(self, traffic, model, route, asynchronous):
+        self._traffic = traffic
+        self._model = model
+        self._route = route
+        self._asynchronous = asynchronous
+        self._closed = threading.Event()
+        self.provider = route.provider
+        self.model = route.model or model.model_name
+
+    def close(self):
+        self._closed.set()
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        traffic, model, route = self._traffic, self._model, self._route
+
+        if self._asynchronous:
+            async def areplay(*args, **kwargs):
+                entry = traffic.lookup(model, route, name, args, kwargs)
+                await asyncio.sleep(entry["duration"] / traffic.speed)
+                return traffic.response(entry)
+            return areplay
+
+        def replay(*args, **kwargs):
+            entry = traffic.lookup(model, route, name, args, kwargs)
+            if self._closed.wait(entry["duration"] / traffic.speed):
+                raise ConnectionError("The replayed request was closed")
+            return traffic.response(entry)
+        return replay
+
+
+class Traffic:
+    """Records model traffic to a session file, or replays a recorded one
+
+    Recording keeps two kinds of entries. Calls are the model calls the
+    application made, with their inputs and when they started. Requests
+    are what the models sent to the inference clients, with the responses
+    and how long they took. Replaying serves the requests from the
+    recording, so everything above the client, such as caching, hedging
+    and the GUI, runs for real.
+    """
+
+    def __init__(self):
+        self.mode = None
+        self.path = None
+        self.speed = 1.0
+        self.store = PayloadStore()
+        self._lock = threading.Lock()
+        self._file = None
+        self._start = None
+        self._call_ids = itertools.count(1)
+        self._requests = {}
+        self.calls = []
+        self.served = 0
+        self.misses = 0
+
+    # Recording
+
+    def record(self, path=None, payloads=PAYLOAD_DIR):
+        """Start recording to path, by default a new file in traffic/"""
+        self.stop()
+        if path is None:
+            path = os.path.join(TRAFFIC_DIR, time.strftime("%Y%m%d-%H%M%S") + ".jsonl")
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.store = PayloadStore(payloads)
+        self._file = open(path, "a", encoding="utf-8")
+        self._start = time.monotonic()
+        self.path = path
+        self.mode = "record"
+        print(f"[LOG] Recording model traffic to {path}")
+        return path
+
+    def _write(self, entry):
+        line = json.dumps(entry) + "\n"
+        with self._lock:
+            if self._file is not None:
+                self._file.write(line)
+                self._file.flush()
+
+    def start_call(self, model, method, kind, input_data, kwargs):
+        """Begin recording a model call; returns a handle, or None when not recording"""
+        if self.mode != "record":
+            return None
+        try:
+            encoded = encode_value(input_data, self.store)
+            params = {key: encode_value(value, self.store)
+                      for key, value in kwargs.items() if key not in _CALLER_ARGS}
+        except (TypeError, OSError) as e:
+            print(f"[LOG] Not recording {method} call: {e}")
+            return None
+        return {
+            "entry": "call",
+            "id": next(self._call_ids),
+            "t": round(time.monotonic() - self._start, 6),
+            "module": type(model).__module__,
+            "class": type(model).__name__,
+            "model": model.model_name,
+            "method": method,
+            "kind": kind,
+            "input": encoded,
+            "params": params,
+            "_start": time.perf_counter(),
+        }
+
+    def finish_call(self, call, error=None):
+        if call is None:
+            return
+        call["duration"] = round(time.perf_counter() - call.pop("_start"), 6)
+        if error is not None:
+            call["error"] = f"{type(error).__name__}: {error}"[:500]
+        self._write(call)
+
+    def record_generator(self, call, generator):
+        """Pass a generator's items through, finishing the call when it ends"""
+        try:
+            yield from generator
+        except GeneratorExit:
+            self.finish_call(call)
+            raise
+        except BaseException as e:
+            self.finish_call(call, e)
+            raise
+        self.finish_call(call)
+
+    def record_request(self, model, route, method, args, kwargs, duration, result=None, error=None):
+        entry = {
+            "entry": "request",
+            "t": round(time.monotonic() - self._start - duration, 6),
+            "model": model.model_name,
+            "provider": route.provider,
+            "route_model": route.model,
+            "method": method,
+            "key": request_key(model.model_name, route, method, args, kwargs),
+            "duration": round(duration, 6),
+        }
+        try:
+            if error is not None:
+                status = getattr(getattr(error, "response", None), "status_code", None)
+                entry["error"] = {"type": type(error).__name__, "message": str(error)[:500], "status": status,
+                                  "retryable": can_fall_back(error)}
+            else:
+                entry["response"] = encode_value(result, self.store)
+        except (TypeError, OSError) as e:
+            print(f"[LOG] Not recording {method} response: {e}")
+            return
+        self._write(entry)
+
+    # Replaying
+
+    def replay(self, path, speed=1.0, payloads=PAYLOAD_DIR):
+        """Serve requests from the session at path, speed times faster than recorded"""
+        self.stop()
+        self.store = PayloadStore(payloads)
+        self.speed = speed
+        self._requests = {}
+        self.calls = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                entry = json.loads(line)
+                if entry["entry"] == "call":
+                    self.calls.append(entry)
+                else:
+                    self._requests.setdefault(entry["key"], deque()).append(entry)
+        self.calls.sort(key=lambda call: call["t"])
+        self.served = self.misses = 0
+        self.path = path
+        self.mode = "replay"
+
+    def lookup(self, model, route, method, args, kwargs):
+        """The recorded entry for a request; repeats beyond the recording get the last one"""
+        key = request_key(model.model_name, route, method, args, kwargs)
+        with self._lock:
+            entries = self._requests.get(key)
+            if not entries:
+                self.misses += 1
+                raise ReplayMissError(f"No recorded {method} request to {model.model_name} matches this one")
+            self.served += 1
+            return entries.popleft() if len(entries) > 1 else entries[0]
+
+    def response(self, entry):
+        """The recorded response, or the recorded failure raised again"""
+        if "error" in entry:
+            error = entry["error"]
+            raise ReplayedError(f"{error['type']}: {error['message']}", error["status"], error.get("retryable"))
+        return decode_value(entry["response"], self.store)
+
+    # Either mode
+
+    def wrap(self, client, model, route, asynchronous=False):
+        """The client a model should use: client itself unless recording or replaying"""
+        if self.mode == "record":
+            return RecordingClient(client, self, model, route)
+        if self.mode == "replay":
+            return ReplayClient(self, model, route, asynchronous)
+        return client
+
+    def stop(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        self.mode = None
+
+
+# The recorder or replayer every model's clients go through
+TRAFFIC = Traffic()
+
+
+def _model_for(call, models):
+    key = (call["module"], call["class"], call["model"])
+    if key not in models:
+        if call["module"] == "__main__":
+            raise ReplayMissError(f"{call['class']} was defined in a script and cannot be replayed")
+        cls = getattr(importlib.import_module(call["module"]), call["class"])
+        models[key] = cls(call["model"])
+    return models[key]
+
+async def _replay_calls(calls, speed, store):
+    """Make each recorded call at its recorded time; returns (call, latency, error) tuples"""
+    from models import load_plugins
+    load_plugins()
+    models = {}
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+
+    async def replay_one(call):
+        due = start + call["t"] / speed
+        await asyncio.sleep(max(due - loop.time(), 0))
+        try:
+            model = _model_for(call, models)
+            input_data = await asyncio.to_thread(decode_value, call["input"], store)
+            params = decode_value({"dict": call["params"]}, store)
+            method = getattr(model, call["method"])
+            if call["kind"] == "async":
+                await method(input_data, **params)
+            elif call["kind"] == "generator":
+                await asyncio.to_thread(lambda: list(method(input_data, **params)))
+            else:
+                await asyncio.to_thread(method, input_data, **params)
+            error = None
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"[:500]
+        # Measured from when the call was due, so queueing behind others counts
+        return call, loop.time() - due, error
+
+    return await asyncio.gather(*(replay_one(call) for call in calls))
+
+def _latency_summary(latencies):
+    from loadtest import LatencyHistogram
+    histogram = LatencyHistogram()
+    for seconds in latencies:
+        histogram.record(seconds)
+    summary = {"calls": histogram.count, "mean": round(histogram.mean, 4) if histogram.count else None}
+    for q in REPLAY_PERCENTILES:
+        summary[f"p{q}"] = round(histogram.percentile(q), 4) if histogram.count else None
+    return summary
+
+def replay_session(path, speed=1.0, output=REPLAY_REPORT, payloads=PAYLOAD_DIR, runner=None):
+    """Rerun a recorded session against its recorded responses and compare latencies
+
+    Calls are made on their recorded schedule (divided by speed), through
+    today's code, with every request answered from the recording after its
+    recorded delay. The report compares call latencies with the recording.
+    """
+    from async_runtime import get_runner
+
+    TRAFFIC.replay(path, speed, payloads)
+    try:
+        runner = runner or get_runner()
+        results = runner.run(_replay_calls(TRAFFIC.calls, speed, TRAFFIC.store))
+    finally:
+        TRAFFIC.stop()
+    report = {
+        "session": path,
+        "speed": speed,
+        "recorded": _latency_summary(call["duration"] / speed for call, _, _ in results),
+        "replayed": _latency_summary(latency for _, latency, _ in results),
+        "recorded_errors": sum(1 for call, _, _ in results if "error" in call),
+        "replayed_errors": sum(1 for _, _, error in results if error is not None),
+        "requests_served": TRAFFIC.served,
+        "request_misses": TRAFFIC.misses,
+        "calls": [{"id": call["id"], "method": f"{call['class']}.{call['method']}", "t": call["t"],
+                   "recorded": call["duration"], "replayed": round(latency, 6), "error": error}
+                  for call, latency, error in results],
+    }
+    print(format_replay_report(report))
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {output}")
+    return report
+
+def format_replay_report(report):
+    lines = [f"Replayed {report['recorded']['calls']} calls from {report['session']} at {report['speed']}x",
+             f"{'':<10}" + "".join(f"{name:>10}" for name in ("mean", *(f"p{q}" for q in REPLAY_PERCENTILES)))]
+    for label in ("recorded", "replayed"):
+        summary = report[label]
+        values = [summary["mean"], *(summary[f"p{q}"] for q in REPLAY_PERCENTILES)]
+        lines.append(f"{label:<10}" + "".join(f"{'-' if v is None else f'{v:.3f}s':>10}" for v in values))
+    lines.append(f"Errors: {report['recorded_errors']} recorded, {report['replayed_errors']} replayed. "
+                 f"Requests: {report['requests_served']} served, {report['request_misses']} not recorded.")
+    return "\n".join(lines)
@@ -0,0 +1,173 @@
+import io
+import json
+import wave
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+
+# Length of audio sent per request; Whisper works on 30 second windows
+CHUNK_SECONDS = 30.0
+
+Segment = namedtuple("Segment", ["start", "end", "text"])
+
+
+class TranscriptIndex:
+    """Time-ordered transcript segments with O(log n) lookups by time
+
+    Segments arrive in order as chunks finish, so appending keeps the start
+    and end lists sorted and bisect can answer seeks without a rescan.
+    Overlapping timestamps at chunk boundaries are clipped so segments never
+    overlap.
+    """
+
+    def __init__(self, segments=()):
+        self.segments = []
+        self._starts = []
+        self._ends = []
+        for segment in segments:
+            self.append(segment)
+
+    def __len__(self):
+        return len(self.segments)
+
+    def __iter__(self):
+        return iter(self.segments)
+
+    def append(self, segment):
+        """Add a segment after the existing ones and return it as stored"""
+        if self._ends:
+            if segment.start < self._starts[-1]:
+                raise ValueError(f"Segment at {segment.start:.3f}s is before the last segment")
+            if segment.start < self._ends[-1]:
+                segment = segment._replace(start=self._ends[-1])
+            if segment.end < segment.start:
+                segment = segment._replace(end=segment.start)
+        self.segments.append(segment)
+        self._starts.append(segment.start)
+        self._ends.append(segment.end)
+        return segment
+
+    def at(self, seconds):
+        """The segment being spoken at a time, or None in a pause"""
+        i = bisect_right(self._starts, seconds) - 1
+        if i >= 0 and seconds < self._ends[i]:
+            return self.segments[i]
+        return None
+
+    def between(self, start, end):
+        """Segments overlapping the interval [start, end)"""
+        first = bisect_right(self._ends, start)
+        last = bisect_left(self._starts, end)
+        return self.segments[first:last]
+
+    def text(self):
+        return " ".join(segment.text.strip() for segment in self.segments)
+
+
+def iter_audio_chunks(path, chunk_seconds=CHUNK_SECONDS):
+    """Yield (offset seconds, duration or None, audio) pieces of an audio file or its bytes
+
+    WAV files are split into chunk_seconds windows, each re-wrapped as a
+    small WAV file in memory, so only one window is held at a time. Other
+    formats would need a decoder to split, so they are yielded whole.
+    """
+    try:
+        source = wave.open(io.BytesIO(path) if isinstance(path, bytes) else path, "rb")
+    except (wave.Error, EOFError):
+        yield 0.0, None, path
+        return
+    with source:
+        params = source.getparams()
+        frames_per_chunk = max(1, int(chunk_seconds * params.framerate))
+        offset = 0
+        while offset < params.nframes:
+            frames = source.readframes(frames_per_chunk)
+            if not frames:
+                return
+            count = len(frames) // (params.sampwidth * params.nchannels)
+            buffer = io.BytesIO()
+            with wave.open(buffer, "wb") as chunk:
+                chunk.setparams(params)
+                chunk.writeframes(frames)
+            yield offset / params.framerate, count / params.framerate, buffer.getvalue()
+            offset += count
+
+
+def format_timestamp(seconds, decimal=","):
+    """Format seconds as HH:MM:SS,mmm (SRT) or HH:MM:SS.mmm (VTT)"""
+    millis = int(round(seconds * 1000))
+    hours, millis = divmod(millis, 3600000)
+    minutes, millis = divmod(millis, 60000)
+    secs, millis = divmod(millis, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}{decimal}{millis:03d}"
+
+
+class TranscriptWriter:
+    """Writes segments to a text stream as they arrive"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.count = 0
+        self.write_header()
+
+    def write_header(self):
+        pass
+
+    def write(self, segment):
+        self.count += 1
+        self.write_segment(segment)
+        # Flush per segment so a long job can be read while it runs
+        self.stream.flush()
+
+    def write_segment(self, segment):
+        raise NotImplementedError
+
+    def close(self):
+        self.stream.flush()
+
+
+class SrtWriter(TranscriptWriter):
+    def write_segment(self, segment):
+        self.stream.write(f"{self.count}\n{format_timestamp(segment.start)} --> "
+                          f"{format_timestamp(segment.end)}\n{segment.text.strip()}\n\n")
+
+
+class VttWriter(TranscriptWriter):
+    def write_header(self):
+        self.stream.write("WEBVTT\n\n")
+
+    def write_segment(self, segment):
+        self.stream.write(f"{format_timestamp(segment.start, '.')} --> "
+                          f"{format_timestamp(segment.end, '.')}\n{segment.text.strip()}\n\n")
+
+
+class JsonWriter(TranscriptWriter):
+    """A JSON array written one element at a time"""
+
+    def write_header(self):
+        self.stream.write("[")
+
+    def write_segment(self, segment):
+        separator = "\n" if self.count == 1 else ",\n"
+        self.stream.write(separator + json.dumps(segment._asdict()))
+
+    def close(self):
+        self.stream.write("\n]\n")
+        super().close()
+
+
+TRANSCRIPT_WRITERS = {"srt": SrtWriter, "vtt": VttWriter, "json": JsonWriter}
+
+
+def export_transcript(model, audio, output, fmt="srt", **kwargs):
+    """Transcribe audio into a subtitle file, writing each segment as it is ready
+
+    Returns the TranscriptIndex of all segments for seeking afterwards.
+    kwargs are passed to AudioToTextModel.transcribe_segments().
+    """
+    index = TranscriptIndex()
+    with open(output, "w", encoding="utf-8") as f:
+        writer = TRANSCRIPT_WRITERS[fmt](f)
+        for segment in model.transcribe_segments(audio, **kwargs):
+            writer.write(index.append(segment))
+        writer.close()
+    return index
@@ -0,0 +1,155 @@
+import asyncio
+import io
+import threading
+import time
+import wave
+
+from async_runtime import get_runner
+from cancellation import DeadlineExceededError
+
+# Readiness states shown on the model cards
+UNKNOWN = "unknown"
+WARMING = "warming"
+LOADING = "loading"
+READY = "ready"
+UNAVAILABLE = "unavailable"
+
+# Seconds a probe may take; a cold model that takes longer is still loading
+PROBE_TIMEOUT = 60
+# Seconds between probes while a model reports it is loading
+LOADING_RETRY = 10
+# Give up warming a model that has not loaded after this many seconds
+MAX_WARMUP = 600
+# Seconds between keep-alive probes; Hugging Face unloads idle models
+KEEPALIVE_INTERVAL = 300
+
+
+def tiny_png():
+    """A small blank PNG, the cheapest input an image model accepts"""
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new("RGB", (32, 32), "white").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+def silent_wav(seconds=0.5, rate=16000):
+    """A short silent mono WAV for speech models"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes(b"\0\0" * int(seconds * rate))
+    return buffer.getvalue()
+
+def loading_retry_after(error):
+    """Seconds to wait before probing again if error means the model is still
+    loading, or None if it is a real failure"""
+    if isinstance(error, (DeadlineExceededError, asyncio.TimeoutError, TimeoutError)):
+        return LOADING_RETRY
+    response = getattr(error, "response", None)
+    if getattr(response, "status_code", None) != 503:
+        return None
+    try:
+        estimated = float(response.json().get("estimated_time", LOADING_RETRY))
+    except (ValueError, AttributeError):
+        estimated = LOADING_RETRY
+    return min(max(estimated, 1), LOADING_RETRY * 3)
+
+
+class ModelWarmer:
+    """Probes models in the background so a user's first request finds them loaded
+
+    Each model has a readiness state (UNKNOWN, WARMING, LOADING, READY or
+    UNAVAILABLE) and a short detail message. The GUI polls states() the
+    same way it polls job futures, so no callbacks cross threads.
+    """
+
+    def __init__(self, runner=None):
+        self.runner = runner or get_runner()
+        self._states = {}
+        self._tasks = {}
+        self._last_ready = {}
+        self._lock = threading.Lock()
+
+    def states(self):
+        """{key: (state, detail)} for every model seen so far"""
+        with self._lock:
+            return dict(self._states)
+
+    def state(self, key):
+        with self._lock:
+            return self._states.get(key, (UNKNOWN, ""))
+
+    def warm(self, spec, keep_alive=False):
+        """Start probing spec's model unless it is already being warmed"""
+        with self._lock:
+            task = self._tasks.get(spec.key)
+            if task is not None and not task.done():
+                return
+            self._tasks[spec.key] = self.runner.submit(self._warm(spec, keep_alive))
+
+    def stop(self, key=None):
+        """Stop warming (and keeping alive) one model, or every model"""
+        with self._lock:
+            keys = list(self._tasks) if key is None else [key]
+            tasks = [self._tasks.pop(k) for k in keys if k in self._tasks]
+        for task in tasks:
+            task.cancel()
+
+    def note_ready(self, key):
+        """Record that a real request just succeeded, which keeps the model warm too"""
+        with self._lock:
+            self._last_ready[key] = time.monotonic()
+        self._set(key, READY, "")
+
+    def _set(self, key, state, detail):
+        with self._lock:
+            self._states[key] = (state, detail)
+
+    async def _warm(self, spec, keep_alive):
+        key = spec.key
+        started = time.monotonic()
+        try:
+            model = spec.load()
+            while True:
+                if self.state(key)[0] != READY:
+                    self._set(key, WARMING, "")
+                try:
+                    probed = await model.aprobe(PROBE_TIMEOUT)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    retry = loading_retry_after(e)
+                    if retry is None:
+                        self._set(key, UNAVAILABLE, f"{type(e).__name__}: {e}"[:200])
+                        return
+                    if time.monotonic() - started > MAX_WARMUP:
+                        self._set(key, UNAVAILABLE, "did not finish loading")
+                        return
+                    self._set(key, LOADING, f"about {retry:.0f}s")
+                    await asyncio.sleep(retry)
+                    continue
+                if not probed:
+                    # The model has no cheap request to probe with
+                    self._set(key, UNKNOWN, "")
+                    return
+                self.note_ready(key)
+                if not keep_alive:
+                    return
+                await self._sleep_until_stale(key)
+                started = time.monotonic()
+        except asyncio.CancelledError:
+            if self.state(key)[0] in (WARMING, LOADING):
+                self._set(key, UNKNOWN, "")
+            raise
+
+    async def _sleep_until_stale(self, key):
+        # Real requests keep the model loaded as well, so only probe after a
+        # full interval without either
+        while True:
+            with self._lock:
+                due = self._last_ready.get(key, 0) + KEEPALIVE_INTERVAL
+            wait = due - time.monotonic()
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)